@@ -3,30 +3,143 @@ Gerenciador de Agenda - Versão PostgreSQL
 Usa SQLAlchemy ORM para PostgreSQL
 """
 from datetime import datetime, timedelta, date, time
-from typing import List, Dict, Tuple, Optional
-from database import SessionLocal, Profissional, Procedimento, Agendamento, Feriado, HorarioFuncionamento, executar_com_retry
+from typing import Iterator, List, Dict, Tuple, Optional
+from database import (
+    Profissional, Procedimento, Agendamento, registrar_escrita, sessao_requisicao,
+    DATABASE_REPLICA_URL, JANELA_LEITURA_PROPRIA_SEGUNDOS
+)
+from resiliencia import com_retry, eh_transitorio
+from cache_manager import cache_disponibilidade, invalidar_agendamento, tag_dia, tag_mes
+from calendario import calendario, ANTECEDENCIA_MAXIMA_DIAS, DURACAO_PADRAO_MINUTOS
+from disponibilidade import cabe_no_dia, horarios_livres, para_minutos, para_time, rotulo
+from itertools import islice
+from sqlalchemy import bindparam, case, func, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from time import time_ns
+import base64
+import csv
+import heapq
+import io
+import json
 import logging
-import time
+import secrets
 
 logger = logging.getLogger(__name__)
 
-
-def com_retry(funcao):
-    """Decorator para executar funcoes com retry automático"""
-    def wrapper(*args, **kwargs):
-        max_tentativas = 3
-        for tentativa in range(max_tentativas):
-            try:
-                return funcao(*args, **kwargs)
-            except Exception as e:
-                if tentativa < max_tentativas - 1:
-                    tempo_espera = 2 ** tentativa
-                    logger.warning(f"Erro em {funcao.__name__} (tentativa {tentativa + 1}): {e}. Tentando novamente em {tempo_espera}s...")
-                    time.sleep(tempo_espera)
-                else:
-                    logger.error(f"Falha após {max_tentativas} tentativas em {funcao.__name__}: {e}")
-                    raise
-    return wrapper
+# Máximo de resultados na busca de próximos horários
+LIMITE_MAXIMO_BUSCA = 50
+
+# Quantidade de horários sugeridos quando a reserva conflita
+LIMITE_ALTERNATIVAS = 5
+
+# Lock transacional por profissional/dia: reservas de dias ou profissionais
+# diferentes seguem em paralelo, só a mesma agenda do dia é serializada
+SQL_LOCK_AGENDA_DIA = text("SELECT pg_advisory_xact_lock(:profissional_id, :dia)")
+
+# Status válidos de um agendamento
+STATUS_AGENDAMENTO = ('confirmado', 'cancelado', 'concluido')
+
+# Tamanho de página da listagem de agendamentos
+LIMITE_PAGINA_PADRAO = 50
+LIMITE_PAGINA_MAXIMO = 200
+
+# Exportação: linhas lidas por ida ao cursor do servidor e colunas do arquivo
+FORMATOS_EXPORTACAO = ('ndjson', 'csv')
+TAMANHO_LOTE_EXPORTACAO = 1000
+COLUNAS_EXPORTACAO = (
+    'id', 'codigo_agendamento', 'profissional_id', 'profissional_nome',
+    'procedimento_id', 'procedimento_nome', 'cliente_nome', 'cliente_telefone',
+    'cliente_email', 'data_agendamento', 'hora_inicio', 'hora_fim', 'status', 'criado_em'
+)
+
+# Com réplica, a invalidação do cache se repete ao fim da janela de leitura própria:
+# uma leitura da réplica ainda atrasada pode ter guardado de novo o estado antigo
+REPETIR_INVALIDACAO_SEGUNDOS = JANELA_LEITURA_PROPRIA_SEGUNDOS if DATABASE_REPLICA_URL else 0
+
+# Constraint de exclusão do schema.sql (rede de segurança para escritas fora deste caminho)
+CONSTRAINT_SEM_SOBREPOSICAO = 'agendamentos_sem_sobreposicao'
+
+# Consultas do caminho quente, montadas uma vez na importação. A cada chamada só os
+# parâmetros mudam: nada de reconstruir db.query(...).filter(...) e o SQL compilado
+# sai direto do cache de compilação do SQLAlchemy.
+CONSULTA_PROFISSIONAL = select(Profissional).where(Profissional.id == bindparam('prof_id'))
+
+CONSULTA_PROCEDIMENTOS_PROFISSIONAL = select(
+    Procedimento.codigo,
+    Procedimento.nome,
+    Procedimento.descricao,
+    Procedimento.duracao_minutos,
+    Procedimento.preco
+).where(
+    Procedimento.profissional_id == bindparam('prof_id'),
+    Procedimento.ativo == True
+)
+
+CONSULTA_INTERVALOS_OCUPADOS = select(
+    Agendamento.hora_inicio,
+    Agendamento.hora_fim,
+    Procedimento.duracao_minutos
+).outerjoin(
+    Procedimento, Procedimento.id == Agendamento.procedimento_id
+).where(
+    Agendamento.profissional_id == bindparam('prof_id'),
+    Agendamento.data_agendamento == bindparam('data'),
+    Agendamento.status == 'confirmado'
+)
+
+
+# Alfabeto dos códigos de agendamento (base36 maiúsculo)
+ALFABETO_CODIGO = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def _base36(numero: int, tamanho: int) -> str:
+    digitos = []
+    for _ in range(tamanho):
+        numero, resto = divmod(numero, 36)
+        digitos.append(ALFABETO_CODIGO[resto])
+    return ''.join(reversed(digitos))
+
+
+def gerar_codigo_agendamento() -> str:
+    """
+    Gera código de agendamento ordenável no tempo e sem colisão prática
+
+    Formato: 'AG' + milissegundos em base36 (9) + aleatório criptográfico (9) = 20 caracteres.
+    São 36^9 (~10^14) sufixos possíveis por milissegundo, então rajadas no mesmo
+    segundo não disputam o mesmo valor como o antigo AG + timestamp em segundos.
+    """
+    milissegundos = time_ns() // 1_000_000
+    return 'AG' + _base36(milissegundos, 9) + _base36(secrets.randbelow(36 ** 9), 9)
+
+
+def codificar_cursor(data: date, hora: time, agendamento_id: int) -> str:
+    """Cursor opaco da paginação por chave (data, hora, id) do último item da página"""
+    bruto = f"{data.isoformat()}|{hora.strftime('%H:%M:%S')}|{agendamento_id}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> Tuple[date, time, int]:
+    """
+    Inverte codificar_cursor
+
+    Raises:
+        ValueError: cursor malformado
+    """
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data_iso, hora_str, agendamento_id = bruto.split('|')
+        return date.fromisoformat(data_iso), time.fromisoformat(hora_str), int(agendamento_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor de paginação inválido') from e
+
+
+class HorarioIndisponivel(Exception):
+    """O horário pedido foi ocupado antes da reserva ser confirmada"""
+
+    def __init__(self, mensagem: str, alternativas: List[Dict]):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.alternativas = alternativas
 
 
 class AgendaManagerDB:
@@ -52,70 +165,54 @@ class AgendaManagerDB:
     @com_retry
     def obter_profissional(self, prof_id: int) -> Optional[Dict]:
         """Obtém detalhes de uma profissional"""
-        db = SessionLocal()
-        try:
-            prof = db.query(Profissional).filter(Profissional.id == prof_id).first()
-            return prof.to_dict() if prof else None
-        except Exception as e:
-            logger.error(f"Erro ao obter profissional {prof_id}: {e}")
-            raise
-        finally:
-            db.close()
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                prof = db.execute(CONSULTA_PROFISSIONAL, {'prof_id': prof_id}).scalars().first()
+                return prof.to_dict() if prof else None
+            except Exception as e:
+                logger.error(f"Erro ao obter profissional {prof_id}: {e}")
+                raise
 
     @com_retry
     def obter_profissionais_lista(self) -> List[Dict]:
         """Retorna lista de profissionais"""
-        db = SessionLocal()
-        try:
-            profs = db.query(Profissional).filter(Profissional.ativo == True).all()
-            return [p.to_dict() for p in profs]
-        except Exception as e:
-            logger.error(f"Erro ao obter lista de profissionais: {e}")
-            raise
-        finally:
-            db.close()
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                profs = db.query(Profissional).filter(Profissional.ativo == True).all()
+                return [p.to_dict() for p in profs]
+            except Exception as e:
+                logger.error(f"Erro ao obter lista de profissionais: {e}")
+                raise
 
     @com_retry
     def obter_procedimentos_profissional(self, prof_id: int) -> Dict:
         """Obtém procedimentos de uma profissional como dicionário"""
-        db = SessionLocal()
-        try:
-            procs = db.query(Procedimento).filter(
-                Procedimento.profissional_id == prof_id,
-                Procedimento.ativo == True
-            ).all()
-            
-            resultado = {}
-            for proc in procs:
-                resultado[proc.codigo] = {
-                    'nome': proc.nome,
-                    'descricao': proc.descricao,
-                    'duracao_minutos': proc.duracao_minutos,
-                    'preco': proc.preco
-                }
-            return resultado
-        except Exception as e:
-            logger.error(f"Erro ao obter procedimentos da profissional {prof_id}: {e}")
-            raise
-        finally:
-            db.close()
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                # Só colunas: executa pelo Core, sem montar objetos ORM nem identity map
+                linhas = db.connection().execute(CONSULTA_PROCEDIMENTOS_PROFISSIONAL, {'prof_id': prof_id})
+
+                resultado = {}
+                for proc in linhas:
+                    resultado[proc.codigo] = {
+                        'nome': proc.nome,
+                        'descricao': proc.descricao,
+                        'duracao_minutos': proc.duracao_minutos,
+                        'preco': proc.preco
+                    }
+                return resultado
+            except Exception as e:
+                logger.error(f"Erro ao obter procedimentos da profissional {prof_id}: {e}")
+                raise
 
     def eh_feriado(self, data_str: str) -> bool:
-        """Verifica se a data é um feriado (formato DD/MM)"""
+        """Verifica se a data é um feriado (formato DD/MM ou DD/MM/YYYY)"""
         try:
-            dia, mes = data_str.split('/')
-            db = SessionLocal()
-            try:
-                feriado = db.query(Feriado).filter(
-                    Feriado.data == date(2026, int(mes), int(dia))
-                ).first()
-                return feriado is not None
-            except Exception as e:
-                logger.error(f"Erro ao verificar feriado para {data_str}: {e}")
-                return False
-            finally:
-                db.close()
-        except ValueError as e:
+            partes = data_str.split('/')
+            dia, mes = int(partes[0]), int(partes[1])
+            ano = int(partes[2]) if len(partes) > 2 else date.today().year
+            return calendario.obter().eh_feriado(date(ano, mes, dia))
+        except (ValueError, IndexError) as e:
             logger.warning(f"Data com formato inválido: {data_str}")
             return False
         except Exception as e:
@@ -123,134 +220,416 @@ class AgendaManagerDB:
             return False
 
     @com_retry
-    def gerar_datas_disponiveis(self, prof_id: int, dias_futuros: int = 30) -> List[str]:
-        """Gera lista de datas disponíveis para agendamento"""
-        db = SessionLocal()
+    def gerar_datas_disponiveis(self, prof_id: int, dias_futuros: int = ANTECEDENCIA_MAXIMA_DIAS) -> List[str]:
+        """Gera lista de datas disponíveis para agendamento (sem consultas por dia)"""
         try:
-            prof = db.query(Profissional).filter(Profissional.id == prof_id).first()
-            if not prof:
+            snapshot = calendario.obter()
+            if prof_id not in snapshot.dias_uteis:
                 logger.warning(f"Profissional {prof_id} não encontrada")
                 return []
 
-            datas = []
-            hoje = date.today()
-
-            for i in range(dias_futuros):
-                data = hoje + timedelta(days=i)
-                data_str = data.strftime('%d/%m/%Y')
-
-                # Verificar se não é feriado
-                if self.eh_feriado(data_str):
-                    continue
-
-                # Verificar se é dia útil
-                dia_semana = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo'][data.weekday()]
-                
-                if prof.dias_uteis and dia_semana not in prof.dias_uteis:
-                    continue
-
-                datas.append(data_str)
-
-            return sorted(datas[:30])
+            datas = snapshot.datas_disponiveis(prof_id, date.today(), dias_futuros)
+            return [data.strftime('%d/%m/%Y') for data in datas]
         except Exception as e:
             logger.error(f"Erro ao gerar datas disponíveis para profissional {prof_id}: {e}")
             raise
-        finally:
-            db.close()
 
     @com_retry
     def gerar_horarios_disponiveis(self, prof_id: int, data_str: str, proc_id: int) -> List[str]:
-        """Gera horários disponíveis para um dia e procedimento específicos"""
-        db = SessionLocal()
+        """Gera horários onde o procedimento (mais o intervalo entre clientes) cabe sem conflito"""
         try:
-            prof = db.query(Profissional).filter(Profissional.id == prof_id).first()
-            if not prof:
-                logger.warning(f"Profissional {prof_id} não encontrada")
-                return []
+            dia, mes, ano = data_str.split('/')
+            data = date(int(ano), int(mes), int(dia))
+        except ValueError as e:
+            logger.warning(f"Data com formato inválido: {data_str}")
+            return []
+
+        snapshot = calendario.obter()
+        if prof_id not in snapshot.dias_uteis:
+            logger.warning(f"Profissional {prof_id} não encontrada")
+            return []
+
+        proc = snapshot.procedimento_da_profissional(prof_id, proc_id)
+        if proc:
+            duracao = proc.duracao_minutos
+        else:
+            logger.warning(f"Procedimento {proc_id} não encontrado para profissional {prof_id}, usando duração padrão")
+            duracao = DURACAO_PADRAO_MINUTOS
+
+        def calcular():
+            with sessao_requisicao(leitura=True) as db:
+                try:
+                    livres = self._horarios_livres_do_dia(db, snapshot, prof_id, data, duracao, datetime.now())
+                    return [rotulo(minuto) for minuto in livres]
+                except Exception as e:
+                    logger.error(f"Erro ao gerar horários para profissional {prof_id} em {data_str}: {e}")
+                    raise
 
-            try:
-                dia, mes, ano = data_str.split('/')
-                data = date(int(ano), int(mes), int(dia))
-            except ValueError as e:
-                logger.warning(f"Data com formato inválido: {data_str}")
-                return []
+        return cache_disponibilidade.obter_ou_calcular(
+            f'horarios:{prof_id}:{data.isoformat()}:{duracao}', calcular, tags=[tag_dia(prof_id, data)]
+        )
 
-            # Obter horário de funcionamento do dia
-            dia_semana = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo'][data.weekday()]
-            horario_func = db.query(HorarioFuncionamento).filter(
-                HorarioFuncionamento.dia_semana == dia_semana
-            ).first()
+    @com_retry
+    def buscar_proximos_horarios(self, procedimento_id: Optional[int] = None, codigo: Optional[str] = None,
+                                 data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                                 limite: int = 5) -> List[Dict]:
+        """
+        Primeiros horários livres para um procedimento entre todas as profissionais que o realizam
+
+        Cada profissional gera um fluxo ordenado de horários (um dia consultado por vez);
+        os fluxos são intercalados por uma fila de prioridade e a busca para ao atingir o limite.
+        """
+        snapshot = calendario.obter()
+        procedimentos = snapshot.procedimentos_equivalentes(procedimento_id=procedimento_id, codigo=codigo)
+        if not procedimentos:
+            return []
+
+        agora = datetime.now()
+        inicio = max(data_inicio or agora.date(), agora.date())
+        # Só sugere datas que validar_data aceita na reserva
+        ultimo_dia = agora.date() + timedelta(days=ANTECEDENCIA_MAXIMA_DIAS)
+        dias = (min(data_fim or ultimo_dia, ultimo_dia) - inicio).days + 1
+        if dias <= 0:
+            return []
+        limite = max(1, min(int(limite), LIMITE_MAXIMO_BUSCA))
+
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                def fluxo(proc):
+                    for data in snapshot.datas_disponiveis(proc.profissional_id, inicio, dias):
+                        for minuto in self._horarios_livres_do_dia(
+                            db, snapshot, proc.profissional_id, data, proc.duracao_minutos, agora
+                        ):
+                            yield data, minuto, proc.profissional_id, proc
+
+                resultado = []
+                for data, minuto, prof_id, proc in islice(heapq.merge(*(fluxo(p) for p in procedimentos)), limite):
+                    resultado.append({
+                        'profissional_id': prof_id,
+                        'profissional_nome': snapshot.nomes.get(prof_id),
+                        'procedimento_id': proc.id,
+                        'procedimento_nome': proc.nome,
+                        'data': data.strftime('%d/%m/%Y'),
+                        'hora': rotulo(minuto)
+                    })
+                return resultado
+            except Exception as e:
+                logger.error(f"Erro ao buscar próximos horários (procedimento {procedimento_id or codigo}): {e}")
+                raise
+
+    def _horarios_livres_do_dia(self, db, snapshot, prof_id: int, data: date,
+                                duracao: int, agora: datetime) -> List[int]:
+        """Inícios livres (em minutos) de um dia; só consulta o banco se o dia estiver aberto"""
+        if data < agora.date() or not snapshot.dia_disponivel(prof_id, data):
+            return []
+
+        horario_func = snapshot.horario_do_dia(data)
+        if not horario_func:
+            logger.warning(f"Horário de funcionamento não encontrado para {data.strftime('%d/%m/%Y')}")
+            return []
+
+        a_partir_de = agora.hour * 60 + agora.minute if data == agora.date() else None
+        return horarios_livres(
+            para_minutos(horario_func[0]),
+            para_minutos(horario_func[1]),
+            self._intervalos_ocupados(db, prof_id, data),
+            duracao,
+            snapshot.intervalos.get(prof_id, 0),
+            a_partir_de=a_partir_de
+        )
 
-            if not horario_func or not horario_func.hora_abertura or not horario_func.hora_fechamento:
-                logger.warning(f"Horário de funcionamento não encontrado para {dia_semana}")
-                return []
+    @staticmethod
+    def _intervalos_ocupados(db, prof_id: int, data: date) -> List[Tuple[int, int]]:
+        """Intervalos [inicio, fim) em minutos dos agendamentos confirmados do dia (uma consulta)"""
+        linhas = db.connection().execute(CONSULTA_INTERVALOS_OCUPADOS, {'prof_id': prof_id, 'data': data})
+
+        ocupados = []
+        for hora_inicio, hora_fim, duracao in linhas:
+            inicio = para_minutos(hora_inicio)
+            if hora_fim and hora_fim > hora_inicio:
+                fim = para_minutos(hora_fim)
+            else:
+                fim = inicio + (duracao or DURACAO_PADRAO_MINUTOS)
+            ocupados.append((inicio, fim))
+        return ocupados
 
-            # Obter agendamentos do dia
-            agendamentos_dia = db.query(Agendamento).filter(
-                Agendamento.profissional_id == prof_id,
-                Agendamento.data_agendamento == data,
-                Agendamento.status == 'confirmado'
-            ).all()
-
-            horas_ocupadas = set()
-            for agend in agendamentos_dia:
-                if agend.hora_inicio:
-                    horas_ocupadas.add(agend.hora_inicio.strftime('%H:%M'))
-
-            # Gerar horários disponíveis
-            hora_atual = datetime.combine(data, horario_func.hora_abertura)
-            hora_fim = datetime.combine(data, horario_func.hora_fechamento)
-
-            horarios = []
-            while hora_atual < hora_fim:
-                hora_str = hora_atual.strftime('%H:%M')
-                if hora_str not in horas_ocupadas:
-                    horarios.append(hora_str)
-                hora_atual += timedelta(minutes=30)
-
-            return horarios
-        except Exception as e:
-            logger.error(f"Erro ao gerar horários para profissional {prof_id} em {data_str}: {e}")
-            raise
-        finally:
-            db.close()
+    @com_retry
+    def obter_disponibilidade_mes(self, prof_id: int, mes: int, ano: int) -> Optional[Dict]:
+        """Mapa de calor do mês: minutos livres e ocupados por dia (uma consulta agregada)"""
+        snapshot = calendario.obter()
+        if prof_id not in snapshot.dias_uteis:
+            logger.warning(f"Profissional {prof_id} não encontrada")
+            return None
+
+        return cache_disponibilidade.obter_ou_calcular(
+            f'mes:{prof_id}:{ano:04d}-{mes:02d}',
+            lambda: self._calcular_disponibilidade_mes(snapshot, prof_id, mes, ano),
+            tags=[tag_mes(prof_id, ano, mes)]
+        )
+
+    def _calcular_disponibilidade_mes(self, snapshot, prof_id: int, mes: int, ano: int) -> Dict:
+        primeiro_dia = date(ano, mes, 1)
+        ultimo_dia = (primeiro_dia + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+        duracao = case(
+            (Agendamento.hora_fim > Agendamento.hora_inicio,
+             func.extract('epoch', Agendamento.hora_fim - Agendamento.hora_inicio) / 60),
+            else_=func.coalesce(Procedimento.duracao_minutos, DURACAO_PADRAO_MINUTOS)
+        )
+
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                ocupacao = {
+                    data: (int(total), int(minutos or 0))
+                    for data, total, minutos in db.query(
+                        Agendamento.data_agendamento,
+                        func.count(Agendamento.id),
+                        func.sum(duracao)
+                    ).outerjoin(
+                        Procedimento, Procedimento.id == Agendamento.procedimento_id
+                    ).filter(
+                        Agendamento.profissional_id == prof_id,
+                        Agendamento.data_agendamento >= primeiro_dia,
+                        Agendamento.data_agendamento <= ultimo_dia,
+                        Agendamento.status == 'confirmado'
+                    ).group_by(Agendamento.data_agendamento).all()
+                }
+            except Exception as e:
+                logger.error(f"Erro ao obter disponibilidade do mês {mes}/{ano} da profissional {prof_id}: {e}")
+                raise
+
+        intervalo = snapshot.intervalos.get(prof_id, 0)
+        dias = []
+        data = primeiro_dia
+        while data <= ultimo_dia:
+            horario_func = snapshot.horario_do_dia(data)
+            aberto = snapshot.dia_disponivel(prof_id, data) and horario_func is not None
+            minutos_abertos = para_minutos(horario_func[1]) - para_minutos(horario_func[0]) if aberto else 0
+
+            total, minutos = ocupacao.get(data, (0, 0))
+            # Cada atendimento também consome o intervalo entre clientes
+            minutos_ocupados = min(minutos_abertos, minutos + total * intervalo) if aberto else 0
+
+            dias.append({
+                'data': data.strftime('%d/%m/%Y'),
+                'disponivel': aberto,
+                'agendamentos': total,
+                'minutos_abertos': minutos_abertos,
+                'minutos_ocupados': minutos_ocupados,
+                'minutos_livres': minutos_abertos - minutos_ocupados
+            })
+            data += timedelta(days=1)
+
+        return {
+            'profissional_id': prof_id,
+            'mes': mes,
+            'ano': ano,
+            'dias': dias
+        }
 
     @com_retry
-    def obter_agendamentos_profissional(self, prof_id: int) -> Dict:
-        """Obtém agendamentos de uma profissional"""
-        db = SessionLocal()
-        try:
-            agendamentos = db.query(Agendamento).filter(
-                Agendamento.profissional_id == prof_id
-            ).all()
-
-            return {
-                'agendamentos': [
-                    {
-                        'id': a.id,
-                        'codigo_agendamento': a.codigo_agendamento,
-                        'cliente_nome': a.cliente_nome,
-                        'cliente_telefone': a.cliente_telefone,
-                        'procedimento_nome': a.procedimento.nome if a.procedimento else 'N/A',
-                        'procedimento_id': a.procedimento_id,
-                        'data': a.data_agendamento.strftime('%d/%m/%Y'),
-                        'hora': a.hora_inicio.strftime('%H:%M') if a.hora_inicio else None,
-                        'status': a.status
-                    }
-                    for a in agendamentos
-                ]
-            }
-        except Exception as e:
-            logger.error(f"Erro ao obter agendamentos da profissional {prof_id}: {e}")
-            raise
-        finally:
-            db.close()
+    def obter_agendamentos_profissional(self, prof_id: int, data_inicio: Optional[date] = None,
+                                        data_fim: Optional[date] = None,
+                                        status: Optional[List[str]] = None,
+                                        limite: Optional[int] = LIMITE_PAGINA_PADRAO,
+                                        cursor: Optional[str] = None) -> Dict:
+        """
+        Obtém uma página de agendamentos de uma profissional
+
+        Ordenação estável por (data, hora, id) com paginação por chave: a próxima
+        página continua depois do último item, sem OFFSET. O nome do procedimento
+        vem no mesmo SELECT (join), sem carregar objetos ORM.
+
+        Args:
+            data_inicio, data_fim: Intervalo inclusivo de datas (opcional)
+            status: Filtra pelos status informados (opcional)
+            limite: Itens por página (limitado a LIMITE_PAGINA_MAXIMO). None sem
+                cursor desliga a paginação: todos os agendamentos, no formato de
+                antes dela (sem 'proximo_cursor')
+            cursor: Valor de 'proximo_cursor' da página anterior
+
+        Returns:
+            {'agendamentos': [...], 'proximo_cursor': str ou None}
+
+        Raises:
+            ValueError: status ou cursor inválidos
+        """
+        paginar = limite is not None or cursor is not None
+        limite = max(1, min(int(LIMITE_PAGINA_PADRAO if limite is None else limite), LIMITE_PAGINA_MAXIMO))
+        self._validar_status(status)
+        posicao = decodificar_cursor(cursor) if cursor else None
+
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                consulta = self._consulta_agendamentos(db, data_inicio, data_fim, status).filter(
+                    Agendamento.profissional_id == prof_id
+                )
+                if not paginar:
+                    return {'agendamentos': [self._serializar_agendamento(linha) for linha in consulta.all()]}
+                if posicao:
+                    consulta = consulta.filter(
+                        tuple_(Agendamento.data_agendamento, Agendamento.hora_inicio, Agendamento.id) > posicao
+                    )
+
+                # Um item a mais indica se existe próxima página
+                linhas = consulta.limit(limite + 1).all()
+                pagina = linhas[:limite]
+
+                proximo_cursor = None
+                if len(linhas) > limite:
+                    ultima = pagina[-1]
+                    proximo_cursor = codificar_cursor(ultima.data_agendamento, ultima.hora_inicio, ultima.id)
+
+                return {
+                    'agendamentos': [self._serializar_agendamento(linha) for linha in pagina],
+                    'proximo_cursor': proximo_cursor
+                }
+            except Exception as e:
+                logger.error(f"Erro ao obter agendamentos da profissional {prof_id}: {e}")
+                raise
+
+    def exportar_agendamentos(self, formato: str = 'ndjson', prof_id: Optional[int] = None,
+                              data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                              status: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        Exporta agendamentos como NDJSON ou CSV, em fluxo
+
+        A leitura usa cursor do servidor (yield_per/stream_results): o banco entrega
+        TAMANHO_LOTE_EXPORTACAO linhas por vez, então a memória não cresce com o volume.
+        Os filtros são validados aqui; o gerador retornado só abre a sessão ao ser consumido.
+
+        Raises:
+            ValueError: formato ou status inválidos
+        """
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato inválido: {formato} (use {' ou '.join(FORMATOS_EXPORTACAO)})")
+        self._validar_status(status)
+        return self._gerar_exportacao(formato, prof_id, data_inicio, data_fim, status)
+
+    def _gerar_exportacao(self, formato, prof_id, data_inicio, data_fim, status) -> Iterator[str]:
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                consulta = db.query(
+                    Agendamento.id,
+                    Agendamento.codigo_agendamento,
+                    Agendamento.profissional_id,
+                    Profissional.nome.label('profissional_nome'),
+                    Agendamento.procedimento_id,
+                    Procedimento.nome.label('procedimento_nome'),
+                    Agendamento.cliente_nome,
+                    Agendamento.cliente_telefone,
+                    Agendamento.cliente_email,
+                    Agendamento.data_agendamento,
+                    Agendamento.hora_inicio,
+                    Agendamento.hora_fim,
+                    Agendamento.status,
+                    Agendamento.criado_em
+                ).outerjoin(
+                    Profissional, Profissional.id == Agendamento.profissional_id
+                ).outerjoin(
+                    Procedimento, Procedimento.id == Agendamento.procedimento_id
+                )
+
+                if prof_id is not None:
+                    consulta = consulta.filter(Agendamento.profissional_id == prof_id)
+                if data_inicio:
+                    consulta = consulta.filter(Agendamento.data_agendamento >= data_inicio)
+                if data_fim:
+                    consulta = consulta.filter(Agendamento.data_agendamento <= data_fim)
+                if status:
+                    consulta = consulta.filter(Agendamento.status.in_(status))
+
+                linhas = consulta.order_by(
+                    Agendamento.data_agendamento, Agendamento.hora_inicio, Agendamento.id
+                ).yield_per(TAMANHO_LOTE_EXPORTACAO)
+
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer) if formato == 'csv' else None
+                if escritor:
+                    escritor.writerow(COLUNAS_EXPORTACAO)
+
+                for i, linha in enumerate(linhas, 1):
+                    valores = [v.isoformat() if hasattr(v, 'isoformat') else v for v in linha]
+                    if escritor:
+                        escritor.writerow(valores)
+                    else:
+                        buffer.write(json.dumps(dict(zip(COLUNAS_EXPORTACAO, valores)), ensure_ascii=False))
+                        buffer.write('\n')
+
+                    # Entrega um bloco por lote lido do banco
+                    if i % TAMANHO_LOTE_EXPORTACAO == 0:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+
+                if buffer.tell():
+                    yield buffer.getvalue()
+            except Exception as e:
+                logger.error(f"Erro ao exportar agendamentos: {e}")
+                raise
+
+    @staticmethod
+    def _validar_status(status: Optional[List[str]]) -> None:
+        if status:
+            invalidos = set(status) - set(STATUS_AGENDAMENTO)
+            if invalidos:
+                raise ValueError(f"Status inválido: {', '.join(sorted(invalidos))}")
+
+    @staticmethod
+    def _consulta_agendamentos(db, data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                               status: Optional[List[str]] = None):
+        """SELECT projetado dos agendamentos com o nome do procedimento, em ordem (data, hora, id)"""
+        consulta = db.query(
+            Agendamento.id,
+            Agendamento.codigo_agendamento,
+            Agendamento.profissional_id,
+            Agendamento.cliente_nome,
+            Agendamento.cliente_telefone,
+            Agendamento.procedimento_id,
+            Procedimento.nome.label('procedimento_nome'),
+            Agendamento.data_agendamento,
+            Agendamento.hora_inicio,
+            Agendamento.status
+        ).outerjoin(
+            Procedimento, Procedimento.id == Agendamento.procedimento_id
+        )
+
+        if data_inicio:
+            consulta = consulta.filter(Agendamento.data_agendamento >= data_inicio)
+        if data_fim:
+            consulta = consulta.filter(Agendamento.data_agendamento <= data_fim)
+        if status:
+            consulta = consulta.filter(Agendamento.status.in_(status))
+
+        return consulta.order_by(Agendamento.data_agendamento, Agendamento.hora_inicio, Agendamento.id)
+
+    @staticmethod
+    def _serializar_agendamento(linha) -> Dict:
+        return {
+            'id': linha.id,
+            'codigo_agendamento': linha.codigo_agendamento,
+            'cliente_nome': linha.cliente_nome,
+            'cliente_telefone': linha.cliente_telefone,
+            'procedimento_nome': linha.procedimento_nome or 'N/A',
+            'procedimento_id': linha.procedimento_id,
+            'data': linha.data_agendamento.strftime('%d/%m/%Y'),
+            'hora': linha.hora_inicio.strftime('%H:%M') if linha.hora_inicio else None,
+            'status': linha.status
+        }
 
     @com_retry
     def criar_agendamento(self, prof_id: int, data_str: str, horario: str, 
                          cliente_nome: str, cliente_telefone: str, 
                          procedimento_id: int, procedimento_nome: str) -> Tuple[bool, str, Optional[str]]:
-        """Cria novo agendamento"""
+        """
+        Cria novo agendamento de forma atômica
+
+        A agenda da profissional no dia é travada (advisory lock da transação), os
+        intervalos ocupados são relidos e o horário só é gravado se ainda couber.
+
+        Raises:
+            HorarioIndisponivel: horário ocupado, com sugestões de alternativas
+        """
         
         # Validações
         if not self.validar_data(data_str):
@@ -262,95 +641,169 @@ class AgendaManagerDB:
         if not self.validar_cliente(cliente_nome):
             return False, "Nome deve ter entre 3-100 caracteres", None
 
-        db = SessionLocal()
         try:
             dia, mes, ano = data_str.split('/')
             data = date(int(ano), int(mes), int(dia))
             hora_parts = horario.split(':')
             hora = time(int(hora_parts[0]), int(hora_parts[1]))
-
-            # Gerar código
-            timestamp = datetime.now().strftime('%d%m%y%H%M%S')
-            codigo = f'AG{timestamp}'
-
-            # Criar agendamento
-            agendamento = Agendamento(
-                codigo_agendamento=codigo,
-                profissional_id=prof_id,
-                procedimento_id=procedimento_id,
-                cliente_nome=cliente_nome,
-                cliente_telefone=cliente_telefone,
-                data_agendamento=data,
-                hora_inicio=hora,
-                status='confirmado'
+        except (ValueError, IndexError):
+            return False, "Horário inválido", None
+
+        snapshot = calendario.obter()
+        proc = snapshot.procedimento_da_profissional(prof_id, procedimento_id)
+        if not proc or not proc.ativo:
+            return False, "Procedimento não encontrado para esta profissional", None
+
+        horario_func = snapshot.horario_do_dia(data)
+        if not snapshot.dia_disponivel(prof_id, data) or not horario_func:
+            return False, "Profissional não atende nesta data", None
+
+        abertura, fechamento = para_minutos(horario_func[0]), para_minutos(horario_func[1])
+        intervalo = snapshot.intervalos.get(prof_id, 0)
+        inicio = para_minutos(hora)
+        if inicio + proc.duracao_minutos > fechamento or inicio < abertura:
+            return False, "Horário fora do expediente", None
+
+        alternativas = None
+        with sessao_requisicao() as db:
+            try:
+                db.execute(SQL_LOCK_AGENDA_DIA, {'profissional_id': prof_id, 'dia': data.toordinal()})
+
+                ocupados = self._intervalos_ocupados(db, prof_id, data)
+                if not cabe_no_dia(abertura, fechamento, ocupados, inicio, proc.duracao_minutos, intervalo):
+                    db.rollback()
+                    alternativas = [
+                        {'profissional_id': prof_id, 'profissional_nome': snapshot.nomes.get(prof_id),
+                         'procedimento_id': proc.id, 'procedimento_nome': proc.nome,
+                         'data': data_str, 'hora': rotulo(minuto)}
+                        for minuto in horarios_livres(abertura, fechamento, ocupados, proc.duracao_minutos, intervalo)
+                    ][:LIMITE_ALTERNATIVAS]
+                else:
+                    codigo = gerar_codigo_agendamento()
+
+                    # Criar agendamento
+                    agendamento = Agendamento(
+                        codigo_agendamento=codigo,
+                        profissional_id=prof_id,
+                        procedimento_id=proc.id,
+                        cliente_nome=cliente_nome,
+                        cliente_telefone=cliente_telefone,
+                        data_agendamento=data,
+                        hora_inicio=hora,
+                        hora_fim=para_time(inicio + proc.duracao_minutos),
+                        status='confirmado'
+                    )
+
+                    db.add(agendamento)
+                    db.commit()
+                    registrar_escrita()
+                    invalidar_agendamento(prof_id, data, repetir_apos=REPETIR_INVALIDACAO_SEGUNDOS)
+                
+                    logger.info(f"Agendamento criado: {codigo}")
+                    return True, "Agendamento criado com sucesso", codigo
+            except IntegrityError as e:
+                db.rollback()
+                if CONSTRAINT_SEM_SOBREPOSICAO not in str(e.orig):
+                    logger.error(f"Erro ao criar agendamento: {e}")
+                    return False, f"Erro ao criar agendamento: {str(e)}", None
+                alternativas = []
+            except Exception as e:
+                db.rollback()
+                if eh_transitorio(e):
+                    # Conexão caiu ou failover: com_retry decide se tenta de novo
+                    raise
+                logger.error(f"Erro ao criar agendamento: {e}")
+                return False, f"Erro ao criar agendamento: {str(e)}", None
+
+        # Conflito: sugerir horários do mesmo dia ou, se não houver, os próximos de qualquer profissional
+        logger.info(f"Conflito de horário para profissional {prof_id} em {data_str} {horario}")
+        if not alternativas:
+            alternativas = self.buscar_proximos_horarios(
+                procedimento_id=proc.id, data_inicio=data, limite=LIMITE_ALTERNATIVAS
             )
-
-            db.add(agendamento)
-            db.commit()
-            
-            logger.info(f"Agendamento criado: {codigo}")
-            return True, "Agendamento criado com sucesso", codigo
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Erro ao criar agendamento: {e}")
-            return False, f"Erro ao criar agendamento: {str(e)}", None
-        finally:
-            db.close()
+        raise HorarioIndisponivel("Horário não está mais disponível", alternativas)
 
     @com_retry
     def cancelar_agendamento(self, agendamento_id: int) -> Tuple[bool, str]:
         """Cancela um agendamento"""
-        db = SessionLocal()
-        try:
-            agend = db.query(Agendamento).filter(Agendamento.id == agendamento_id).first()
-            if not agend:
-                return False, "Agendamento não encontrado"
-
-            agend.status = 'cancelado'
-            db.commit()
+        with sessao_requisicao() as db:
+            try:
+                agend = db.query(Agendamento).filter(Agendamento.id == agendamento_id).first()
+                if not agend:
+                    return False, "Agendamento não encontrado"
+
+                prof_id, data = agend.profissional_id, agend.data_agendamento
+                agend.status = 'cancelado'
+                db.commit()
+                registrar_escrita()
+                invalidar_agendamento(prof_id, data, repetir_apos=REPETIR_INVALIDACAO_SEGUNDOS)
             
-            logger.info(f"Agendamento {agendamento_id} cancelado")
-            return True, "Agendamento cancelado com sucesso"
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Erro ao cancelar agendamento {agendamento_id}: {e}")
-            return False, f"Erro ao cancelar: {str(e)}"
-        finally:
-            db.close()
+                logger.info(f"Agendamento {agendamento_id} cancelado")
+                return True, "Agendamento cancelado com sucesso"
+            except Exception as e:
+                db.rollback()
+                if eh_transitorio(e):
+                    raise
+                logger.error(f"Erro ao cancelar agendamento {agendamento_id}: {e}")
+                return False, f"Erro ao cancelar: {str(e)}"
 
     @com_retry
     def obter_dashboard(self) -> Dict:
-        """Obtém dados para dashboard"""
-        db = SessionLocal()
-        try:
-            profissionais = db.query(Profissional).filter(Profissional.ativo == True).all()
-            
-            dados = {
-                'profissionais': [],
-                'total_agendamentos': 0
-            }
+        """
+        Obtém dados para dashboard
 
-            for prof in profissionais:
-                agendamentos = db.query(Agendamento).filter(
-                    Agendamento.profissional_id == prof.id,
-                    Agendamento.status == 'confirmado'
-                ).all()
-
-                dados['profissionais'].append({
-                    'id': prof.id,
-                    'nome': prof.nome,
-                    'especialidade': prof.especialidade,
-                    'total_agendamentos': len(agendamentos),
-                    'ativo': prof.ativo
-                })
-                dados['total_agendamentos'] += len(agendamentos)
-
-            return dados
-        except Exception as e:
-            logger.error(f"Erro ao obter dashboard: {e}")
-            raise
-        finally:
-            db.close()
+        Uma única consulta agrega os agendamentos por profissional e status
+        (GROUP BY no banco, sem carregar as linhas na aplicação).
+        """
+        with sessao_requisicao(leitura=True) as db:
+            try:
+                contagens = db.query(
+                    Agendamento.profissional_id,
+                    Agendamento.status,
+                    func.count().label('total')
+                ).group_by(Agendamento.profissional_id, Agendamento.status).subquery()
+
+                linhas = db.query(
+                    Profissional.id, Profissional.nome, Profissional.especialidade, Profissional.ativo,
+                    contagens.c.status, contagens.c.total
+                ).outerjoin(
+                    contagens, contagens.c.profissional_id == Profissional.id
+                ).filter(
+                    Profissional.ativo == True
+                ).order_by(Profissional.id).all()
+
+                profissionais = {}
+                for prof_id, nome, especialidade, ativo, status, total in linhas:
+                    prof = profissionais.setdefault(prof_id, {
+                        'id': prof_id,
+                        'nome': nome,
+                        'especialidade': especialidade,
+                        'ativo': ativo,
+                        'total_agendamentos': 0,
+                        'confirmados': 0,
+                        'cancelados': 0,
+                        'por_status': {}
+                    })
+                    if status is None:
+                        continue
+                    prof['por_status'][status] = total
+                    prof['total_agendamentos'] += total
+                    if status == 'confirmado':
+                        prof['confirmados'] = total
+                    elif status == 'cancelado':
+                        prof['cancelados'] = total
+
+                return {
+                    'clinica': {
+                        'nome': self.config['clinica']['nome'],
+                        'horario_funcionamento': self.config['clinica']['horario_funcionamento']
+                    },
+                    'profissionais': list(profissionais.values()),
+                    'total_agendamentos': sum(p['total_agendamentos'] for p in profissionais.values())
+                }
+            except Exception as e:
+                logger.error(f"Erro ao obter dashboard: {e}")
+                raise
 
     @staticmethod
     def validar_data(data_str: str) -> bool:
@@ -364,8 +817,8 @@ class AgendaManagerDB:
             if data < date.today():
                 return False
                 
-            # Máximo 30 dias no futuro
-            if (data - date.today()).days > 30:
+            # Máximo ANTECEDENCIA_MAXIMA_DIAS no futuro
+            if (data - date.today()).days > ANTECEDENCIA_MAXIMA_DIAS:
                 return False
                 
             return True
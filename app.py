@@ -1,15 +1,28 @@
-from flask import Flask, render_template, request, jsonify, make_response
+from flask import Flask, Response, g, render_template, request, jsonify, make_response, stream_with_context
 from flask_cors import CORS
 from flask_compress import Compress
-from agenda_manager_db import AgendaManagerDB
+from agenda_manager_db import AgendaManagerDB, HorarioIndisponivel
 from whatsapp_integration import registrar_whatsapp
-from cache_manager import cache_profissionais, cache_procedimentos, cache_dashboard, limpar_todo_cache
+from cache_manager import (
+    cache_profissionais, cache_procedimentos, cache_dashboard, cache_idempotencia,
+    limpar_todo_cache, estatisticas_cache, estatisticas_coalescencia, TAG_AGENDAMENTOS, TAG_PROFISSIONAIS, TAG_PROCEDIMENTOS,
+    VENCIDO
+)
 from datetime import datetime, timedelta
-from database import verificar_conexao_banco
+from database import (
+    estatisticas_pool, registrar_escrita, ultima_escrita, JANELA_LEITURA_PROPRIA_SEGUNDOS,
+    fechar_sessoes_requisicao, iniciar_contagem_checkouts, checkouts_da_requisicao, contagem_checkouts
+)
+from respostas import RespostaPronta
+from monitor_banco import monitor_banco
+from resiliencia import BancoIndisponivel, PRAZO_REQUISICAO_SEGUNDOS, disjuntor, iniciar_prazo
 from logger_config import configurar_logging
 import logging
 import os
 from dotenv import load_dotenv
+from functools import wraps
+import hashlib
+import hmac
 import json
 
 # Carregar variáveis de ambiente
@@ -37,29 +50,46 @@ except Exception as e:
     logger.error(f"❌ Erro ao inicializar AgendaManagerDB: {e}", exc_info=True)
     agenda = None
 
+# Verificação do banco em segundo plano (o health check só lê o último resultado)
+monitor_banco.iniciar()
+
 # ============================================================
 # HEALTH CHECK
 # ============================================================
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    try:
-        db_ok = verificar_conexao_banco()
-        status = 'ok' if db_ok else 'database_error'
-        
-        return jsonify({
-            'status': status,
-            'timestamp': datetime.now().isoformat(),
-            'database': 'connected' if db_ok else 'disconnected'
-        }), 200 if db_ok else 503
-    except Exception as e:
-        logger.error(f"Health check error: {e}")
-        return jsonify({
-            'status': 'error',
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+    """
+    Health check a partir da última verificação do monitor em segundo plano
+
+    Não abre conexão: sondas frequentes do load balancer não custam nada ao banco.
+    """
+    monitor_banco.iniciar()  # no-op se já está rodando neste processo
+    resultado = monitor_banco.ultimo()
+    return jsonify({
+        'status': 'ok' if resultado.banco_ok else 'database_error',
+        'timestamp': datetime.now().isoformat(),
+        'database': 'connected' if resultado.banco_ok else 'disconnected',
+        'versao': '1.0.0',
+        'cache': 'ativado',
+        'verificacao': resultado.para_dict()
+    }), 200 if resultado.banco_ok else 503
+
+@app.route('/api/health/live', methods=['GET'])
+def health_live():
+    """Liveness: o processo responde (não depende do banco)"""
+    return jsonify({'status': 'ok'}), 200
+
+@app.route('/api/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: banco respondeu na última verificação recente e o pool tem folga"""
+    monitor_banco.iniciar()
+    resultado = monitor_banco.ultimo()
+    pronto = monitor_banco.pronto(resultado)
+    return jsonify({
+        'status': 'ready' if pronto else 'not_ready',
+        'verificacao': resultado.para_dict()
+    }), 200 if pronto else 503
 
 # ============================================================
 # ERROR HANDLERS
@@ -80,16 +110,142 @@ def validate_request():
     if request.method == 'POST' and request.is_json is False and request.data:
         return jsonify({'erro': 'Content-Type must be application/json'}), 400
 
+# Cookie com o momento da última escrita do cliente (read-your-writes com réplica)
+COOKIE_ULTIMA_ESCRITA = 'agenda_ultima_escrita'
+
+@app.before_request
+def restaurar_ultima_escrita():
+    """Recupera a última escrita do cliente; dentro da janela as leituras dele vão ao primário"""
+    try:
+        momento = float(request.cookies.get(COOKIE_ULTIMA_ESCRITA, 0))
+    except ValueError:
+        momento = 0.0
+    # Sempre redefine: a thread do worker é reaproveitada entre requisições
+    registrar_escrita(momento)
+    g.escrita_ao_iniciar = momento
+    iniciar_contagem_checkouts()
+    # Retries ao banco nunca ultrapassam o orçamento da requisição
+    iniciar_prazo()
+
+@app.after_request
+def propagar_ultima_escrita(resposta):
+    """Se a requisição escreveu no banco, entrega o cookie que abre a janela de leitura própria"""
+    momento = ultima_escrita()
+    if momento > g.get('escrita_ao_iniciar', 0.0):
+        resposta.set_cookie(
+            COOKIE_ULTIMA_ESCRITA, f'{momento:.3f}',
+            max_age=int(JANELA_LEITURA_PROPRIA_SEGUNDOS) + 1, httponly=True, samesite='Lax'
+        )
+    return resposta
+
+@app.after_request
+def medir_checkouts(resposta):
+    """Quantas conexões a requisição tirou do pool (sessão por requisição: no máximo 1 por banco)"""
+    checkouts = checkouts_da_requisicao()
+    contagem_checkouts.registrar(checkouts)
+    resposta.headers['X-DB-Checkouts'] = str(checkouts)
+    return resposta
+
+# Sessão do banco compartilhada pela requisição; devolve a conexão ao pool no fim
+app.teardown_appcontext(fechar_sessoes_requisicao)
+
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
 
-def adicionar_cache_headers(resposta, max_age=300):
-    """Adiciona headers de cache HTTP à resposta"""
+# Validade da reserva de uma Idempotency-Key em processamento: o prazo da requisição
+# mais uma margem (o registro da resposta concluída fica as 24h do cache_idempotencia)
+RESERVA_IDEMPOTENCIA_SEGUNDOS = PRAZO_REQUISICAO_SEGUNDOS + 10
+
+# Rotas administrativas (exportação, cache, pool) exigem "Authorization: Bearer <ADMIN_TOKEN>";
+# sem ADMIN_TOKEN configurado elas ficam fechadas
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+def requer_admin(rota):
+    """Decorator: 401 se o header Authorization não traz o token de admin"""
+    @wraps(rota)
+    def wrapper(*args, **kwargs):
+        esquema, _, token = request.headers.get('Authorization', '').partition(' ')
+        if not (ADMIN_TOKEN and esquema.lower() == 'bearer'
+                and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())):
+            resposta = jsonify({'erro': 'Acesso restrito a administradores'})
+            resposta.headers['WWW-Authenticate'] = 'Bearer'
+            return resposta, 401
+        return rota(*args, **kwargs)
+    return wrapper
+
+def resposta_erro(mensagem, erro):
+    """500 com a mensagem da rota, ou 503 + Retry-After quando o circuito do banco está aberto"""
+    if isinstance(erro, BancoIndisponivel):
+        resposta = jsonify({'erro': 'Banco de dados temporariamente indisponível. Tente novamente em instantes.'})
+        resposta.headers['Retry-After'] = str(erro.retry_after)
+        return resposta, 503
+    return jsonify({'erro': mensagem}), 500
+
+def adicionar_cache_headers(resposta, max_age=300, etag=None):
+    """Adiciona headers de cache HTTP à resposta (e ETag forte, se informado)"""
     resposta.headers['Cache-Control'] = f'public, max-age={max_age}'
-    resposta.headers['Expires'] = (datetime.now() + timedelta(seconds=max_age)).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    resposta.headers['Expires'] = (datetime.utcnow() + timedelta(seconds=max_age)).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    if etag:
+        resposta.set_etag(etag)
     return resposta
 
+def responder_json_cacheado(cache, chave, funcao, max_age=300, tags=()):
+    """
+    Serve JSON já serializado e comprimido guardado no cache
+
+    Em acerto de cache não há jsonify nem compressão: os bytes vão direto para o cliente.
+    Se o If-None-Match bater com o ETag, responde 304 sem corpo.
+    Retorna None quando funcao() não tem dados (a rota decide o 404).
+
+    Com o banco fora, pode servir uma cópia vencida (X-Cache: STALE + Warning 110);
+    ela não é guardada por caches HTTP para o cliente buscar de novo quando o banco voltar.
+    """
+    def calcular():
+        dados = funcao()
+        return RespostaPronta.de_dados(dados) if dados else None
+
+    pronta, estado = cache.obter_ou_calcular_com_estado(chave, calcular, tags=tags)
+    if pronta is None:
+        return None
+
+    if request.if_none_match.contains(pronta.etag):
+        resposta = adicionar_cache_headers(Response(status=304), max_age=max_age, etag=pronta.etag)
+        return marcar_estado_cache(resposta, estado)
+
+    corpo, codificacao = pronta.escolher_codificacao(request.accept_encodings)
+    resposta = Response(corpo, status=200, mimetype='application/json')
+    if codificacao:
+        # Com Content-Encoding definido o Flask-Compress não comprime de novo
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    resposta = adicionar_cache_headers(resposta, max_age=max_age, etag=pronta.etag)
+    return marcar_estado_cache(resposta, estado)
+
+def marcar_estado_cache(resposta, estado):
+    """Informa a origem da resposta (HIT, MISS ou STALE) e marca cópias vencidas"""
+    resposta.headers['X-Cache'] = estado
+    if estado == VENCIDO:
+        resposta.headers['Warning'] = '110 - "Response is Stale"'
+        resposta.headers['Cache-Control'] = 'no-store'
+        resposta.headers.pop('Expires', None)
+    return resposta
+
+def ler_filtros_agendamentos():
+    """
+    Lê data_inicio, data_fim (DD/MM/YYYY) e status (separados por vírgula) da query string
+
+    Raises:
+        ValueError: data em formato inválido
+    """
+    try:
+        data_inicio = datetime.strptime(request.args['data_inicio'], '%d/%m/%Y').date() if request.args.get('data_inicio') else None
+        data_fim = datetime.strptime(request.args['data_fim'], '%d/%m/%Y').date() if request.args.get('data_fim') else None
+    except ValueError:
+        raise ValueError('Datas devem estar no formato DD/MM/YYYY')
+    status = [s.strip() for s in request.args.get('status', '').split(',') if s.strip()]
+    return data_inicio, data_fim, status or None
+
 # ============================================================
 # ROTAS API - PROFISSIONAIS
 # ============================================================
@@ -98,24 +254,18 @@ def adicionar_cache_headers(resposta, max_age=300):
 def get_profissionais():
     """Retorna lista de profissionais com cache"""
     try:
-        # Tentar obter do cache primeiro
-        dados_em_cache = cache_profissionais.obter('lista_profissionais')
-        if dados_em_cache:
-            resposta = make_response(jsonify(dados_em_cache))
-            return adicionar_cache_headers(resposta, max_age=300), 200
-        
-        # Se não estiver em cache, buscar do banco
         if not agenda:
             return jsonify({'erro': 'Sistema não inicializado'}), 503
             
-        profissionais = agenda.obter_profissionais_lista()
-        cache_profissionais.definir('lista_profissionais', profissionais)
-        
-        resposta = make_response(jsonify(profissionais))
-        return adicionar_cache_headers(resposta, max_age=300), 200
+        # Cache com coalescência: numa expiração só uma requisição vai ao banco
+        resposta = responder_json_cacheado(
+            cache_profissionais, 'lista_profissionais', agenda.obter_profissionais_lista,
+            max_age=300, tags=[TAG_PROFISSIONAIS]
+        )
+        return resposta or (jsonify([]), 200)
     except Exception as e:
         logger.error(f"Erro ao obter profissionais: {e}")
-        return jsonify({'erro': 'Erro ao carregar profissionais. Tente novamente.'}), 500
+        return resposta_erro('Erro ao carregar profissionais. Tente novamente.', e)
 
 @app.route('/api/profissionais/<int:prof_id>', methods=['GET'])
 def get_profissional(prof_id):
@@ -130,7 +280,7 @@ def get_profissional(prof_id):
         return jsonify(prof), 200
     except Exception as e:
         logger.error(f"Erro ao obter profissional {prof_id}: {e}")
-        return jsonify({'erro': 'Erro ao carregar profissional'}), 500
+        return resposta_erro('Erro ao carregar profissional', e)
 
 # ============================================================
 # ROTAS API - PROCEDIMENTOS
@@ -140,27 +290,20 @@ def get_profissional(prof_id):
 def get_procedimentos(prof_id):
     """Retorna procedimentos de uma profissional com cache"""
     try:
-        # Tentar obter do cache
-        cache_key = f'procedimentos_{prof_id}'
-        dados_em_cache = cache_procedimentos.obter(cache_key)
-        if dados_em_cache:
-            resposta = make_response(jsonify(dados_em_cache))
-            return adicionar_cache_headers(resposta, max_age=300), 200
-        
-        # Se não estiver em cache, buscar do banco
         if not agenda:
             return jsonify({'erro': 'Sistema não inicializado'}), 503
             
-        procedimentos = agenda.obter_procedimentos_profissional(prof_id)
-        if not procedimentos:
+        resposta = responder_json_cacheado(
+            cache_procedimentos, f'procedimentos_{prof_id}',
+            lambda: agenda.obter_procedimentos_profissional(prof_id),
+            max_age=300, tags=[TAG_PROCEDIMENTOS]
+        )
+        if resposta is None:
             return jsonify({'erro': 'Profissional ou procedimentos não encontrados'}), 404
-        
-        cache_procedimentos.definir(cache_key, procedimentos)
-        resposta = make_response(jsonify(procedimentos))
-        return adicionar_cache_headers(resposta, max_age=300), 200
+        return resposta
     except Exception as e:
         logger.error(f"Erro ao obter procedimentos da profissional {prof_id}: {e}")
-        return jsonify({'erro': 'Erro ao carregar procedimentos'}), 500
+        return resposta_erro('Erro ao carregar procedimentos', e)
 
 # ============================================================
 # ROTAS API - DISPONIBILIDADE
@@ -178,7 +321,7 @@ def get_datas_disponiveis(prof_id):
         return jsonify({'datas': datas}), 200
     except Exception as e:
         logger.error(f"Erro ao obter datas disponíveis para profissional {prof_id}: {e}")
-        return jsonify({'erro': 'Erro ao carregar datas disponíveis'}), 500
+        return resposta_erro('Erro ao carregar datas disponíveis', e)
 
 @app.route('/api/profissionais/<int:prof_id>/horarios', methods=['GET'])
 def get_horarios(prof_id):
@@ -197,7 +340,7 @@ def get_horarios(prof_id):
         return jsonify({'horarios': horarios}), 200
     except Exception as e:
         logger.error(f"Erro ao obter horários para profissional {prof_id}: {e}")
-        return jsonify({'erro': 'Erro ao carregar horários'}), 500
+        return resposta_erro('Erro ao carregar horários', e)
     procedimento_id = request.args.get('procedimento_id', type=int)
     
     if not data or not procedimento_id:
@@ -207,13 +350,107 @@ def get_horarios(prof_id):
     return jsonify({'horarios': horarios}), 200
 
 
+@app.route('/api/disponibilidade/proximos', methods=['GET'])
+def get_proximos_horarios():
+    """Retorna os próximos horários livres de um procedimento entre todas as profissionais"""
+    try:
+        if not agenda:
+            return jsonify({'erro': 'Sistema não inicializado'}), 503
+            
+        procedimento_id = request.args.get('procedimento_id', type=int)
+        codigo = request.args.get('codigo')
+        limite = request.args.get('limite', 5, type=int)
+        
+        if not procedimento_id and not codigo:
+            return jsonify({'erro': 'Informe procedimento_id ou codigo'}), 400
+        
+        try:
+            data_inicio = datetime.strptime(request.args['data_inicio'], '%d/%m/%Y').date() if request.args.get('data_inicio') else None
+            data_fim = datetime.strptime(request.args['data_fim'], '%d/%m/%Y').date() if request.args.get('data_fim') else None
+        except ValueError:
+            return jsonify({'erro': 'Datas devem estar no formato DD/MM/YYYY'}), 400
+        
+        horarios = agenda.buscar_proximos_horarios(
+            procedimento_id=procedimento_id,
+            codigo=codigo,
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            limite=limite
+        )
+        return jsonify({'horarios': horarios}), 200
+    except Exception as e:
+        logger.error(f"Erro ao buscar próximos horários: {e}")
+        return resposta_erro('Erro ao buscar próximos horários', e)
+
+
 # ============================================================
 # ROTAS API - AGENDAMENTOS
 # ============================================================
 
 @app.route('/api/agendamentos', methods=['POST'])
 def criar_agendamento():
-    """Cria um novo agendamento"""
+    """Cria um novo agendamento (aceita header Idempotency-Key para reenvios seguros)"""
+    chave = request.headers.get('Idempotency-Key')
+    if not chave:
+        return _processar_agendamento()
+    
+    if len(chave) > 255:
+        return jsonify({'erro': 'Idempotency-Key muito longa (máximo 255 caracteres)'}), 400
+    
+    dados = request.get_json(silent=True) or {}
+    impressao = hashlib.sha256(json.dumps(dados, sort_keys=True, default=str).encode()).hexdigest()
+    
+    # Reservar a chave atomicamente (entre workers: o cache de idempotência é compartilhado).
+    # A reserva vale só RESERVA_IDEMPOTENCIA_SEGUNDOS: se o worker morrer no meio, a chave
+    # não fica presa; só o registro concluído guarda o TTL de 24h do cache
+    marcador = {'estado': 'em_andamento', 'impressao': impressao}
+    for _ in range(2):
+        if cache_idempotencia.definir_se_ausente(chave, marcador, ttl=RESERVA_IDEMPOTENCIA_SEGUNDOS):
+            registro = None
+            break
+        registro = cache_idempotencia.obter(chave)
+        if registro is not None:
+            break
+        # A reserva de outra requisição expirou ou foi liberada entre as duas chamadas
+    else:
+        return resposta_em_andamento()
+    
+    if registro is not None:
+        if registro['impressao'] != impressao:
+            return jsonify({'erro': 'Idempotency-Key já usada com outros dados'}), 422
+        if registro['estado'] == 'em_andamento':
+            return resposta_em_andamento()
+        
+        # Reenvio: devolver a resposta original sem tocar no banco
+        resposta = make_response(jsonify(registro['corpo']), registro['status'])
+        resposta.headers['Idempotent-Replayed'] = 'true'
+        return resposta
+    
+    concluido = False
+    try:
+        resposta, status = _processar_agendamento()
+        if status == 201:
+            cache_idempotencia.definir(chave, {
+                'estado': 'concluido',
+                'impressao': impressao,
+                'status': status,
+                'corpo': resposta.get_json()
+            })
+            concluido = True
+        return resposta, status
+    finally:
+        # Falhas liberam a chave para que o cliente possa tentar de novo
+        if not concluido:
+            cache_idempotencia.limpar(chave)
+
+def resposta_em_andamento():
+    """409 + Retry-After: outra requisição com a mesma Idempotency-Key está em processamento"""
+    resposta = make_response(jsonify({'erro': 'Requisição com esta Idempotency-Key ainda em processamento'}), 409)
+    resposta.headers['Retry-After'] = '1'
+    return resposta
+
+def _processar_agendamento():
+    """Valida o payload e cria o agendamento; retorna (resposta, status)"""
     try:
         if not agenda:
             return jsonify({'erro': 'Sistema não inicializado'}), 503
@@ -247,23 +484,24 @@ def criar_agendamento():
         if campos_faltando:
             return jsonify({'erro': f'Campos obrigatórios: {", ".join(campos_faltando)}'}), 400
         
-        sucesso, mensagem, agendamento_id = agenda.criar_agendamento(
-            prof_id=prof_id,
-            data_str=data,
-            horario=hora,
-            cliente_nome=cliente_nome.strip(),
-            cliente_telefone=cliente_telefone.strip(),
-            procedimento_id=procedimento_id,
-            procedimento_nome=procedimento_nome
-        )
+        try:
+            sucesso, mensagem, agendamento_id = agenda.criar_agendamento(
+                prof_id=prof_id,
+                data_str=data,
+                horario=hora,
+                cliente_nome=cliente_nome.strip(),
+                cliente_telefone=cliente_telefone.strip(),
+                procedimento_id=procedimento_id,
+                procedimento_nome=procedimento_nome
+            )
+        except HorarioIndisponivel as e:
+            logger.info(f"Conflito ao criar agendamento: {e.mensagem}")
+            return jsonify({'erro': e.mensagem, 'alternativas': e.alternativas}), 409
         
         if not sucesso:
             logger.warning(f"Falha ao criar agendamento: {mensagem}")
             return jsonify({'erro': mensagem}), 400
         
-        # Limpar cache após criar agendamento
-        limpar_todo_cache()
-        
         logger.info(f"Agendamento criado: {agendamento_id}")
         return jsonify({
             'sucesso': True,
@@ -272,20 +510,80 @@ def criar_agendamento():
         }), 201
     except Exception as e:
         logger.error(f"Erro ao criar agendamento: {str(e)}")
-        return jsonify({'erro': 'Erro ao processar agendamento. Tente novamente.'}), 500
+        return resposta_erro('Erro ao processar agendamento. Tente novamente.', e)
 
 @app.route('/api/profissionais/<int:prof_id>/agendamentos', methods=['GET'])
 def get_agendamentos(prof_id):
-    """Retorna agendamentos de uma profissional"""
+    """
+    Retorna agendamentos de uma profissional, paginados
+
+    Query params: data_inicio, data_fim (DD/MM/YYYY), status (separados por vírgula),
+    limite e cursor (o 'proximo_cursor' da página anterior).
+    Sem limite nem cursor responde como antes da paginação: {'agendamentos': [todos]}.
+    """
     try:
         if not agenda:
             return jsonify({'erro': 'Sistema não inicializado'}), 503
             
-        result = agenda.obter_agendamentos_profissional(prof_id)
+        limite = request.args.get('limite')
+        if limite is not None and not limite.isdigit():
+            return jsonify({'erro': 'limite inválido'}), 400
+        try:
+            data_inicio, data_fim, status = ler_filtros_agendamentos()
+            result = agenda.obter_agendamentos_profissional(
+                prof_id,
+                data_inicio=data_inicio,
+                data_fim=data_fim,
+                status=status,
+                limite=int(limite) if limite is not None else None,
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
         return jsonify(result), 200
     except Exception as e:
         logger.error(f"Erro ao obter agendamentos da profissional {prof_id}: {e}")
-        return jsonify({'erro': 'Erro ao carregar agendamentos'}), 500
+        return resposta_erro('Erro ao carregar agendamentos', e)
+
+@app.route('/api/agendamentos/exportar', methods=['GET'])
+@requer_admin
+def exportar_agendamentos():
+    """
+    Exporta agendamentos em fluxo (NDJSON ou CSV) para conciliação
+
+    Query params: formato (ndjson|csv), profissional_id, data_inicio, data_fim, status.
+    O corpo é gerado enquanto o banco entrega as linhas; nada é montado inteiro em memória.
+    Rota de admin (requer_admin).
+    """
+    try:
+        if not agenda:
+            return jsonify({'erro': 'Sistema não inicializado'}), 503
+            
+        formato = request.args.get('formato', 'ndjson').lower()
+        # type=int devolveria None para valor inválido, exportando todas as profissionais
+        prof_id = request.args.get('profissional_id')
+        if prof_id is not None and not prof_id.isdigit():
+            return jsonify({'erro': 'profissional_id inválido'}), 400
+        try:
+            data_inicio, data_fim, status = ler_filtros_agendamentos()
+            linhas = agenda.exportar_agendamentos(
+                formato,
+                prof_id=int(prof_id) if prof_id is not None else None,
+                data_inicio=data_inicio,
+                data_fim=data_fim,
+                status=status
+            )
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
+        
+        mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+        resposta = Response(stream_with_context(linhas), mimetype=mimetype)
+        resposta.headers['Content-Disposition'] = f'attachment; filename=agendamentos.{formato}'
+        resposta.headers['Cache-Control'] = 'no-store'
+        return resposta
+    except Exception as e:
+        logger.error(f"Erro ao exportar agendamentos: {e}")
+        return resposta_erro('Erro ao exportar agendamentos', e)
 
 @app.route('/api/agendamentos/<agendamento_id>', methods=['GET'])
 def get_agendamento(agendamento_id):
@@ -309,13 +607,10 @@ def deletar_agendamento(agendamento_id):
         if not sucesso:
             return jsonify({'erro': mensagem}), 404
         
-        # Limpar cache após cancelar agendamento
-        limpar_todo_cache()
-        
         return jsonify({'sucesso': True, 'mensagem': mensagem}), 200
     except Exception as e:
         logger.error(f"Erro ao cancelar agendamento {agendamento_id}: {e}")
-        return jsonify({'erro': 'Erro ao cancelar agendamento'}), 500
+        return resposta_erro('Erro ao cancelar agendamento', e)
 
 # ============================================================
 # ROTAS API - DASHBOARD
@@ -328,65 +623,35 @@ def get_dashboard():
         if not agenda:
             return jsonify({'erro': 'Sistema não inicializado'}), 503
             
-        # Tentar obter do cache (mais curto porque é mais dinâmico)
-        dados_em_cache = cache_dashboard.obter('dashboard')
-        if dados_em_cache:
-            resposta = make_response(jsonify(dados_em_cache))
-            return adicionar_cache_headers(resposta, max_age=60), 200
-        
-        # Se não estiver em cache, buscar do banco
-        from database import SessionLocal, Agendamento
-        db = SessionLocal()
-        try:
-            profissionais_list = agenda.obter_profissionais_lista()
-            
-            profissionais_data = []
-            total_geral = 0
-            
-            for prof in profissionais_list:
-                agendamentos = db.query(Agendamento).filter(
-                    Agendamento.profissional_id == prof['id']
-                ).all()
-                
-                confirmados = len([a for a in agendamentos if a.status == 'confirmado'])
-                cancelados = len([a for a in agendamentos if a.status == 'cancelado'])
-                
-                profissionais_data.append({
-                    'id': prof['id'],
-                    'nome': prof['nome'],
-                    'especialidade': prof['especialidade'],
-                    'total_agendamentos': len(agendamentos),
-                    'confirmados': confirmados,
-                    'cancelados': cancelados
-                })
-                total_geral += len(agendamentos)
-            
-            dashboard_data = {
-                'clinica': {
-                    'nome': agenda.config['clinica']['nome'],
-                    'horario_funcionamento': agenda.config['clinica']['horario_funcionamento']
-                },
-                'profissionais': profissionais_data,
-                'total_agendamentos': total_geral
-            }
-            
-            cache_dashboard.definir('dashboard', dashboard_data)
-            resposta = make_response(jsonify(dashboard_data))
-            return adicionar_cache_headers(resposta, max_age=60), 200
-        finally:
-            db.close()
+        # Cache mais curto porque é mais dinâmico; recálculo coalescido entre requisições
+        return responder_json_cacheado(
+            cache_dashboard, 'dashboard', agenda.obter_dashboard,
+            max_age=60, tags=[TAG_AGENDAMENTOS, TAG_PROFISSIONAIS]
+        )
     except Exception as e:
         logger.error(f"Erro ao obter dashboard: {e}")
-        return jsonify({'erro': 'Erro ao carregar dashboard'}), 500
+        return resposta_erro('Erro ao carregar dashboard', e)
 
 @app.route('/api/profissionais/<int:prof_id>/mes', methods=['GET'])
 def get_mes(prof_id):
-    """Retorna disponibilidade de um mês"""
-    mes = request.args.get('mes', type=int, default=datetime.now().month)
-    ano = request.args.get('ano', type=int, default=datetime.now().year)
-    
-    disponibilidade = agenda.obter_disponibilidade_mes(prof_id, mes, ano)
-    return jsonify(disponibilidade), 200
+    """Retorna disponibilidade de um mês (mapa de calor por dia)"""
+    try:
+        if not agenda:
+            return jsonify({'erro': 'Sistema não inicializado'}), 503
+            
+        mes = request.args.get('mes', type=int, default=datetime.now().month)
+        ano = request.args.get('ano', type=int, default=datetime.now().year)
+        
+        if not 1 <= mes <= 12 or not 2000 <= ano <= 2100:
+            return jsonify({'erro': 'Parâmetros mes e ano inválidos'}), 400
+        
+        disponibilidade = agenda.obter_disponibilidade_mes(prof_id, mes, ano)
+        if disponibilidade is None:
+            return jsonify({'erro': 'Profissional não encontrada'}), 404
+        return jsonify(disponibilidade), 200
+    except Exception as e:
+        logger.error(f"Erro ao obter disponibilidade do mês para profissional {prof_id}: {e}")
+        return resposta_erro('Erro ao carregar disponibilidade do mês', e)
 
 # ============================================================
 # ROTAS FRONTEND
@@ -409,17 +674,8 @@ def agenda_page(prof_id):
 # HEALTH CHECK
 # ============================================================
 
-@app.route('/api/health', methods=['GET'])
-def health():
-    """Health check da API"""
-    return jsonify({
-        'status': 'ok',
-        'timestamp': datetime.now().isoformat(),
-        'versao': '1.0.0',
-        'cache': 'ativado'
-    }), 200
-
 @app.route('/api/cache/limpar', methods=['POST'])
+@requer_admin
 def limpar_cache_endpoint():
     """Limpa o cache da API (admin)"""
     limpar_todo_cache()
@@ -428,6 +684,23 @@ def limpar_cache_endpoint():
         'mensagem': 'Cache limpado com sucesso'
     }), 200
 
+@app.route('/api/cache/estatisticas', methods=['GET'])
+@requer_admin
+def estatisticas_cache_endpoint():
+    """Acertos, falhas e despejos de cada cache, e requisições coalescidas (admin)"""
+    return jsonify({
+        'caches': estatisticas_cache(),
+        'coalescencia': estatisticas_coalescencia()
+    }), 200
+
+@app.route('/api/banco/pool', methods=['GET'])
+@requer_admin
+def estatisticas_pool_endpoint():
+    """Dimensionamento e métricas do pool de conexões: espera no checkout, overflow e timeouts (admin)"""
+    dados = estatisticas_pool()
+    dados['disjuntor'] = disjuntor.estatisticas()
+    return jsonify(dados), 200
+
 # ============================================================
 # ERROR HANDLERS
 # ============================================================
@@ -445,13 +718,16 @@ if __name__ == '__main__':
     print("🚀 Iniciando API de Agenda - Marcia Rocha Beauty")
     print("=" * 70)
     print("✅ Endpoints disponíveis:")
+    print("   - GET  /api/health (e /api/health/live, /api/health/ready)")
     print("   - GET  /api/profissionais")
     print("   - GET  /api/profissionais/<id>")
     print("   - GET  /api/profissionais/<id>/procedimentos")
     print("   - GET  /api/profissionais/<id>/datas-disponiveis")
     print("   - GET  /api/profissionais/<id>/horarios?data=DD/MM/YYYY&procedimento_id=X")
+    print("   - GET  /api/disponibilidade/proximos?codigo=101&limite=5")
     print("   - POST /api/agendamentos")
     print("   - GET  /api/profissionais/<id>/agendamentos")
+    print("   - GET  /api/agendamentos/exportar?formato=csv")
     print("   - GET  /api/agendamentos/<id>")
     print("   - DEL  /api/agendamentos/<id>")
     print("   - GET  /api/dashboard")
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+"""
+Benchmarks de desempenho da Agenda App
+Execute: python benchmark.py <cenario> [opções]
+
+Cenários:
+    codigos   Rajada de geração de códigos de agendamento (colisões em UNIQUE)
+    dashboard Consulta agregada do dashboard com 10k a 1M agendamentos
+    replica   Roteamento primário/réplica e janela de leitura própria
+    consultas Custo por chamada das consultas quentes (db.query x select pré-construído)
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+
+class Benchmark:
+    """Executa cenários de carga e imprime um resumo"""
+
+    def print_header(self, msg):
+        print(f"\n{'='*60}")
+        print(f"  {msg}")
+        print(f"{'='*60}")
+
+    def resultado(self, descricao, condicao, detalhes=""):
+        print(f"{'✅' if condicao else '❌'} {descricao}")
+        if detalhes:
+            print(f"   {detalhes}")
+        return condicao
+
+    # --------------------------------------------------------
+    # Códigos de agendamento
+    # --------------------------------------------------------
+
+    def bench_codigos(self, taxa=200, segundos=10, threads=8, banco=False):
+        """Gera códigos em rajada (taxa/s) e conta violações de unicidade"""
+        from agenda_manager_db import gerar_codigo_agendamento
+
+        self.print_header(f"🔑 Códigos de Agendamento ({taxa}/s por {segundos}s, {threads} threads)")
+
+        def codigo_legado():
+            return 'AG' + datetime.now().strftime('%d%m%y%H%M%S')
+
+        for nome, gerador in (('legado (AG + segundos)', codigo_legado), ('atual', gerar_codigo_agendamento)):
+            codigos = self._rajada(gerador, taxa, segundos, threads)
+            colisoes = len(codigos) - len(set(codigos))
+            print(f"  {nome}: {len(codigos)} códigos, {colisoes} colisões, "
+                  f"tamanho máx {max(len(c) for c in codigos)}")
+
+        codigos = self._rajada(gerar_codigo_agendamento, taxa, segundos, threads)
+        self.resultado("Zero colisões em memória", len(codigos) == len(set(codigos)))
+        self.resultado("Códigos cabem em VARCHAR(20)", max(len(c) for c in codigos) <= 20)
+
+        if banco:
+            violacoes = self._inserir_codigos(codigos)
+            self.resultado(
+                "Zero violações de UNIQUE no banco (sem retries)",
+                violacoes == 0,
+                f"{len(codigos)} inserções, {violacoes} violações"
+            )
+
+    @staticmethod
+    def _rajada(gerador, taxa, segundos, threads):
+        """Dispara `taxa` gerações por segundo divididas entre as threads"""
+        codigos = []
+        lock = threading.Lock()
+        por_thread = taxa // threads
+        fim = time.monotonic() + segundos
+
+        def trabalhador():
+            locais = []
+            while time.monotonic() < fim:
+                inicio = time.monotonic()
+                locais.extend(gerador() for _ in range(por_thread))
+                time.sleep(max(0.0, 1.0 - (time.monotonic() - inicio)))
+            with lock:
+                codigos.extend(locais)
+
+        workers = [threading.Thread(target=trabalhador) for _ in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return codigos
+
+    @staticmethod
+    def _inserir_codigos(codigos):
+        """Insere os códigos numa tabela temporária com UNIQUE e conta violações"""
+        from sqlalchemy import text
+        from sqlalchemy.exc import IntegrityError
+        from database import engine
+
+        violacoes = 0
+        with engine.connect() as conn:
+            conn.execute(text("CREATE TEMP TABLE bench_codigos (codigo VARCHAR(20) UNIQUE NOT NULL)"))
+            for codigo in codigos:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text("INSERT INTO bench_codigos VALUES (:c)"), {'c': codigo})
+                except IntegrityError:
+                    violacoes += 1
+            conn.rollback()
+        return violacoes
+
+    # --------------------------------------------------------
+    # Dashboard
+    # --------------------------------------------------------
+
+    def bench_dashboard(self, tamanhos=(10_000, 100_000, 1_000_000), repeticoes=5, legado_ate=100_000):
+        """
+        Mede obter_dashboard com N agendamentos sintéticos no DATABASE_URL
+
+        As linhas de carga usam código 'BENCH...' e são removidas ao final.
+        """
+        from sqlalchemy import text
+        from agenda_manager_db import AgendaManagerDB
+        from database import engine
+
+        self.print_header(f"📊 Dashboard ({', '.join(f'{n:,}' for n in tamanhos)} agendamentos)")
+        agenda = AgendaManagerDB()
+
+        try:
+            for n in sorted(tamanhos):
+                self._semear_agendamentos(engine, n)
+
+                agenda.obter_dashboard()  # aquece cache de planos e buffers
+                atual = self._cronometrar(agenda.obter_dashboard, repeticoes)
+                linha = f"  {n:>9,} linhas: agregado {atual * 1000:8.1f} ms"
+
+                if n <= legado_ate:
+                    legado = self._cronometrar(lambda: self._dashboard_legado(engine), max(1, repeticoes // 2))
+                    linha += f" | N+1 legado {legado * 1000:8.1f} ms"
+                print(linha)
+
+                total = agenda.obter_dashboard()['total_agendamentos']
+                self.resultado(f"Contagem confere com {n:,} linhas de carga", total >= n, f"total {total:,}")
+        finally:
+            with engine.begin() as conn:
+                conn.execute(text("DELETE FROM agendamentos WHERE codigo_agendamento LIKE 'BENCH%'"))
+
+    @staticmethod
+    def _semear_agendamentos(engine, n):
+        """Completa a carga sintética até n linhas (uma data distinta por linha, sem sobreposição)"""
+        from sqlalchemy import text
+
+        with engine.begin() as conn:
+            existentes = conn.execute(text(
+                "SELECT count(*) FROM agendamentos WHERE codigo_agendamento LIKE 'BENCH%'"
+            )).scalar()
+            pares = conn.execute(text(
+                "SELECT profissional_id, min(id) FROM procedimentos GROUP BY profissional_id ORDER BY profissional_id"
+            )).all()
+            if not pares:
+                raise RuntimeError("Cadastre profissionais e procedimentos antes (python setup_db.py)")
+
+            conn.execute(text("""
+                INSERT INTO agendamentos (codigo_agendamento, profissional_id, procedimento_id, cliente_nome,
+                                          cliente_telefone, data_agendamento, hora_inicio, hora_fim, status)
+                SELECT 'BENCH' || i,
+                       (:profs)[1 + i % :qtd],
+                       (:procs)[1 + i % :qtd],
+                       'Carga ' || i,
+                       '00000000000',
+                       DATE '1900-01-01' + i,
+                       TIME '10:00',
+                       TIME '10:30',
+                       (ARRAY['confirmado', 'cancelado', 'concluido'])[1 + i % 3]
+                FROM generate_series(:inicio, :fim) AS i
+            """), {
+                'profs': [p for p, _ in pares],
+                'procs': [proc for _, proc in pares],
+                'qtd': len(pares),
+                'inicio': existentes + 1,
+                'fim': n,
+            })
+            conn.execute(text("ANALYZE agendamentos"))
+
+    @staticmethod
+    def _dashboard_legado(engine):
+        """Reproduz o padrão anterior: todas as linhas de cada profissional contadas em Python"""
+        from sqlalchemy import text
+
+        with engine.connect() as conn:
+            for (prof_id,) in conn.execute(text("SELECT id FROM profissionais WHERE ativo")).all():
+                linhas = conn.execute(
+                    text("SELECT * FROM agendamentos WHERE profissional_id = :p"), {'p': prof_id}
+                ).mappings().all()
+                sum(1 for a in linhas if a['status'] == 'confirmado')
+                sum(1 for a in linhas if a['status'] == 'cancelado')
+
+    # --------------------------------------------------------
+    # Réplica de leitura
+    # --------------------------------------------------------
+
+    def bench_replica(self):
+        """
+        Confere para onde sessao_requisicao(leitura=True) aponta antes, durante e depois da janela de leitura própria
+
+        Requer DATABASE_URL (primário) e DATABASE_REPLICA_URL (standby em recovery),
+        por exemplo duas instâncias locais com streaming replication.
+        """
+        from sqlalchemy import text
+        import database
+
+        self.print_header("🪞 Réplica de Leitura")
+
+        def em_recovery():
+            with database.sessao_requisicao(leitura=True) as db:
+                return db.execute(text("SELECT pg_is_in_recovery()")).scalar()
+
+        database.registrar_escrita(0.0)
+        self.resultado("Leitura sem escrita recente vai para a réplica", em_recovery() is True)
+
+        database.registrar_escrita()
+        self.resultado("Leitura logo após escrita vai para o primário", em_recovery() is False)
+
+        time.sleep(database.JANELA_LEITURA_PROPRIA_SEGUNDOS + 0.1)
+        self.resultado("Após a janela, volta para a réplica", em_recovery() is True)
+
+        with database.engine_replica.connect() as conn:
+            atraso = conn.execute(text(
+                "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+            )).scalar()
+        if atraso is not None:
+            self.resultado(
+                "Atraso da réplica cabe na janela de leitura própria",
+                float(atraso) < database.JANELA_LEITURA_PROPRIA_SEGUNDOS,
+                f"atraso {float(atraso):.2f}s (sem escritas recentes o valor cresce)"
+            )
+
+    # --------------------------------------------------------
+    # Consultas pré-construídas
+    # --------------------------------------------------------
+
+    def bench_consultas(self, repeticoes=2000):
+        """
+        Custo por chamada das consultas do caminho quente no DATABASE_URL
+
+        Compara o padrão antigo (db.query(...).filter(...) montado a cada chamada)
+        com as consultas pré-construídas do AgendaManagerDB executadas pelo Core.
+        Use um banco local: a latência de rede esconderia o custo em Python.
+        """
+        from sqlalchemy import func, select
+        import agenda_manager_db as agenda
+        from database import Agendamento, Procedimento, Profissional, SessionLocal
+
+        self.print_header(f"⚙️  Consultas Pré-construídas ({repeticoes} chamadas cada)")
+
+        with SessionLocal() as db:
+            prof_id = db.execute(select(func.min(Profissional.id))).scalar()
+            if prof_id is None:
+                self.resultado("Há profissionais cadastradas", False, "Rode setup_db.py antes")
+                return
+            data = db.execute(
+                select(func.max(Agendamento.data_agendamento)).where(Agendamento.profissional_id == prof_id)
+            ).scalar() or datetime.now().date()
+
+            def profissional_legado():
+                return db.query(Profissional).filter(Profissional.id == prof_id).first()
+
+            def profissional_atual():
+                return db.execute(agenda.CONSULTA_PROFISSIONAL, {'prof_id': prof_id}).scalars().first()
+
+            def procedimentos_legado():
+                return db.query(Procedimento).filter(
+                    Procedimento.profissional_id == prof_id,
+                    Procedimento.ativo == True
+                ).all()
+
+            def procedimentos_atual():
+                return db.connection().execute(agenda.CONSULTA_PROCEDIMENTOS_PROFISSIONAL, {'prof_id': prof_id}).all()
+
+            def ocupados_legado():
+                return db.query(
+                    Agendamento.hora_inicio, Agendamento.hora_fim, Procedimento.duracao_minutos
+                ).outerjoin(
+                    Procedimento, Procedimento.id == Agendamento.procedimento_id
+                ).filter(
+                    Agendamento.profissional_id == prof_id,
+                    Agendamento.data_agendamento == data,
+                    Agendamento.status == 'confirmado'
+                ).all()
+
+            def ocupados_atual():
+                return db.connection().execute(
+                    agenda.CONSULTA_INTERVALOS_OCUPADOS, {'prof_id': prof_id, 'data': data}
+                ).all()
+
+            casos = (
+                ('obter_profissional', profissional_legado, profissional_atual),
+                ('obter_procedimentos_profissional', procedimentos_legado, procedimentos_atual),
+                ('_intervalos_ocupados', ocupados_legado, ocupados_atual),
+            )
+            for nome, legado, atual in casos:
+                # Aquecimento: preenche o cache de compilação dos dois lados
+                legado()
+                atual()
+                t_legado = self._cronometrar(legado, repeticoes)
+                t_atual = self._cronometrar(atual, repeticoes)
+                self.resultado(
+                    f"{nome}: pré-construída não é mais lenta",
+                    t_atual <= t_legado * 1.05,
+                    f"legado {t_legado * 1e6:.0f}µs, atual {t_atual * 1e6:.0f}µs "
+                    f"({(1 - t_atual / t_legado) * 100:.0f}% menos por chamada)"
+                )
+
+    @staticmethod
+    def _cronometrar(funcao, repeticoes):
+        """Mediana do tempo de execução em segundos"""
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+        return sorted(tempos)[len(tempos) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks da Agenda App")
+    sub = parser.add_subparsers(dest='cenario', required=True)
+
+    p = sub.add_parser('codigos', help='Rajada de códigos de agendamento')
+    p.add_argument('--taxa', type=int, default=200, help='Códigos por segundo')
+    p.add_argument('--segundos', type=int, default=10)
+    p.add_argument('--threads', type=int, default=8)
+    p.add_argument('--banco', action='store_true', help='Também insere no DATABASE_URL (tabela temporária)')
+
+    p = sub.add_parser('dashboard', help='Consulta agregada do dashboard em volume')
+    p.add_argument('--tamanhos', default='10000,100000,1000000', help='Quantidades de agendamentos (vírgula)')
+    p.add_argument('--repeticoes', type=int, default=5)
+    p.add_argument('--legado-ate', type=int, default=100_000, help='Mede o N+1 antigo só até este volume')
+
+    sub.add_parser('replica', help='Roteamento primário/réplica (requer DATABASE_REPLICA_URL)')
+
+    p = sub.add_parser('consultas', help='Custo por chamada das consultas quentes')
+    p.add_argument('--repeticoes', type=int, default=2000)
+
+    args = parser.parse_args()
+    bench = Benchmark()
+
+    if args.cenario == 'codigos':
+        if args.banco and not os.getenv('DATABASE_URL'):
+            print("❌ DATABASE_URL não configurada")
+            sys.exit(1)
+        bench.bench_codigos(args.taxa, args.segundos, args.threads, args.banco)
+    elif args.cenario == 'dashboard':
+        if not os.getenv('DATABASE_URL'):
+            print("❌ DATABASE_URL não configurada")
+            sys.exit(1)
+        tamanhos = [int(t) for t in args.tamanhos.split(',') if t.strip()]
+        bench.bench_dashboard(tamanhos, args.repeticoes, args.legado_ate)
+    elif args.cenario == 'replica':
+        if not os.getenv('DATABASE_URL') or not os.getenv('DATABASE_REPLICA_URL'):
+            print("❌ Configure DATABASE_URL e DATABASE_REPLICA_URL")
+            sys.exit(1)
+        bench.bench_replica()
+    elif args.cenario == 'consultas':
+        if not os.getenv('DATABASE_URL'):
+            print("❌ DATABASE_URL não configurada")
+            sys.exit(1)
+        bench.bench_consultas(args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
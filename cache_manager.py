@@ -1,45 +1,611 @@
 """
-Cache em memória com TTL (Time To Live)
+Cache em memória com TTL (Time To Live) e limite de itens (LRU)
 Melhora performance diminuindo queries ao banco
 """
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
 import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
 from functools import wraps
-from typing import Any, Callable, Dict, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-class CacheSimples:
-    def __init__(self, ttl_segundos: int = 300):
-        self.cache: Dict[str, Tuple[Any, float]] = {}
+from resiliencia import BancoIndisponivel, eh_transitorio
+
+logger = logging.getLogger(__name__)
+
+# A cada N escritas, varre entradas expiradas que nunca mais foram lidas
+INTERVALO_VARREDURA_ESCRITAS = 100
+
+# Backend: 'memoria' (um cache por processo) ou 'sqlite' (compartilhado entre workers)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memoria').lower()
+CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'agenda_cache.sqlite3'))
+
+# Tempo extra que entradas vencidas ficam guardadas para o modo degradado (stale-if-error)
+CACHE_GRACA_SEGUNDOS = int(os.getenv('CACHE_GRACA_SEGUNDOS', str(6 * 3600)))
+
+# Estado de uma consulta em obter_ou_calcular_com_estado (vai no header X-Cache)
+ACERTO = 'HIT'
+FALHA = 'MISS'
+VENCIDO = 'STALE'
+
+# Tags de invalidação
+TAG_AGENDAMENTOS = 'agendamentos'       # contadores que mudam a cada reserva/cancelamento
+TAG_PROFISSIONAIS = 'profissionais'
+TAG_PROCEDIMENTOS = 'procedimentos'
+
+
+def tag_dia(prof_id: int, data: date) -> str:
+    """Tag da disponibilidade de uma profissional em um dia"""
+    return f'disponibilidade:{prof_id}:{data.isoformat()}'
+
+
+def tag_mes(prof_id: int, ano: int, mes: int) -> str:
+    """Tag do mapa mensal de uma profissional"""
+    return f'disponibilidade:{prof_id}:{ano:04d}-{mes:02d}'
+
+
+class SingleFlight:
+    """
+    Coalescência de requisições: só uma thread calcula cada chave por vez
+
+    As demais que chegam enquanto o cálculo está em andamento esperam e recebem
+    o mesmo resultado (ou a mesma exceção), em vez de repetir a consulta ao banco.
+    """
+
+    class _Chamada:
+        __slots__ = ('evento', 'resultado', 'erro')
+
+        def __init__(self):
+            self.evento = threading.Event()
+            self.resultado = None
+            self.erro = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo: Dict[str, 'SingleFlight._Chamada'] = {}
+        self.execucoes = 0
+        self.coalescidas = 0
+
+    def executar(self, chave: str, funcao: Callable[[], Any]) -> Any:
+        with self._lock:
+            chamada = self._em_voo.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = self._em_voo[chave] = SingleFlight._Chamada()
+                self.execucoes += 1
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            chamada.evento.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = funcao()
+            return chamada.resultado
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_voo[chave]
+            chamada.evento.set()
+
+    def em_andamento(self, chave: str) -> bool:
+        with self._lock:
+            return chave in self._em_voo
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            return {
+                'execucoes': self.execucoes,
+                'coalescidas': self.coalescidas,
+                'em_andamento': len(self._em_voo)
+            }
+
+
+# Instância única: a chave inclui o nome do cache
+voos = SingleFlight()
+
+
+class BackendCache(ABC):
+    """
+    Interface comum dos backends de cache (memória do processo ou compartilhado)
+
+    ttl_segundos é o TTL rígido: depois dele a entrada some e quem pede espera o recálculo.
+    ttl_suave (opcional, menor) habilita stale-while-revalidate em obter_ou_calcular:
+    passado o TTL suave o valor ainda é servido na hora e uma thread o atualiza.
+    graca_segundos (opcional) mantém a entrada guardada depois do TTL rígido para
+    stale-if-error: se o recálculo falhar por banco indisponível, o valor vencido é servido.
+    """
+
+    def __init__(self, ttl_segundos: int = 300, max_itens: int = 1000, nome: str = 'cache',
+                 ttl_suave: Optional[int] = None, graca_segundos: int = 0):
         self.ttl = ttl_segundos
-    
+        self.ttl_suave = ttl_suave if ttl_suave is not None else ttl_segundos
+        self.graca = graca_segundos
+        self.max_itens = max_itens
+        self.nome = nome
+        self._lock_contadores = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.expiracoes = 0
+        self.despejos = 0
+        self.atualizacoes_segundo_plano = 0
+        self.vencidos_servidos = 0
+
     def obter(self, chave: str) -> Any:
         """Obtém valor do cache se ainda estiver válido"""
-        if chave not in self.cache:
-            return None
-        
-        valor, timestamp = self.cache[chave]
-        tempo_decorrido = time.time() - timestamp
-        
-        if tempo_decorrido > self.ttl:
-            del self.cache[chave]
-            return None
-        
-        return valor
-    
-    def definir(self, chave: str, valor: Any) -> None:
-        """Define valor do cache com timestamp atual"""
-        self.cache[chave] = (valor, time.time())
-    
+        return self._consultar(chave)[0]
+
+    @abstractmethod
+    def _consultar(self, chave: str, contar: bool = True) -> Tuple[Any, bool]:
+        """
+        (valor, passou_do_ttl_suave); valor é None se ausente ou além do TTL rígido
+
+        contar=False não mexe em acertos/falhas (releitura interna da mesma consulta)
+        """
+
+    @abstractmethod
+    def _consultar_vencido(self, chave: str) -> Any:
+        """Valor guardado mesmo além do TTL rígido, se ainda dentro da graça (None se não houver)"""
+
+    @abstractmethod
+    def definir(self, chave: str, valor: Any, tags: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        """Define valor do cache (ttl, se informado, substitui o TTL do cache só para esta entrada)"""
+
+    @abstractmethod
+    def definir_se_ausente(self, chave: str, valor: Any, tags: Iterable[str] = (),
+                           ttl: Optional[float] = None) -> bool:
+        """Define o valor só se a chave não existir (ou estiver expirada); atômico entre workers"""
+
+    def _prazos(self, agora: float, ttl: Optional[float]) -> Tuple[float, float, float]:
+        """(expira_em, vence_em, descarta_em) de uma entrada gravada agora"""
+        ttl = self.ttl if ttl is None else ttl
+        return agora + ttl, agora + min(self.ttl_suave, ttl), agora + ttl + self.graca
+
+    @abstractmethod
+    def limpar(self, chave: str = None) -> None:
+        """Limpa cache - especifica chave ou limpa tudo"""
+
+    @abstractmethod
+    def invalidar_tag(self, tag: str) -> int:
+        """Remove todas as entradas marcadas com a tag; retorna quantas saíram"""
+
+    def obter_ou_calcular(self, chave: str, funcao: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """Obtém do cache ou calcula uma única vez, mesmo com várias requisições simultâneas"""
+        return self.obter_ou_calcular_com_estado(chave, funcao, tags)[0]
+
+    def obter_ou_calcular_com_estado(self, chave: str, funcao: Callable[[], Any],
+                                     tags: Iterable[str] = ()) -> Tuple[Any, str]:
+        """
+        Como obter_ou_calcular, informando a origem do valor: ACERTO, FALHA (recalculado) ou VENCIDO
+
+        VENCIDO é o modo degradado: o recálculo falhou porque o banco está fora (circuito
+        aberto ou erro transitório) e havia uma entrada vencida dentro da graça.
+        """
+        valor, vencido = self._consultar(chave)
+        if valor is not None:
+            if vencido:
+                self._atualizar_em_segundo_plano(chave, funcao, tags)
+            return valor, ACERTO
+
+        def calcular():
+            # Outra thread pode ter preenchido a chave entre a consulta e o executar();
+            # a falha desta consulta já foi contada acima
+            valor = self._consultar(chave, contar=False)[0]
+            if valor is None:
+                valor = funcao()
+                if valor is not None:
+                    self.definir(chave, valor, tags)
+            return valor
+
+        try:
+            return voos.executar(f'{self.nome}:{chave}', calcular), FALHA
+        except Exception as e:
+            if not self.graca or not (isinstance(e, BancoIndisponivel) or eh_transitorio(e)):
+                raise
+            antigo = self._consultar_vencido(chave)
+            if antigo is None:
+                raise
+            self._contar(vencidos=1)
+            logger.warning(f"Banco indisponível, servindo {self.nome}:{chave} vencido do cache: {e}")
+            return antigo, VENCIDO
+
+    def _atualizar_em_segundo_plano(self, chave: str, funcao: Callable[[], Any], tags: Iterable[str]) -> None:
+        """Dispara (no máximo uma) thread que recalcula a entrada vencida"""
+        chave_voo = f'{self.nome}:{chave}'
+        if voos.em_andamento(chave_voo):
+            return
+
+        def atualizar():
+            valor = funcao()
+            if valor is not None:
+                self.definir(chave, valor, tags)
+            return valor
+
+        def executar():
+            try:
+                voos.executar(chave_voo, atualizar)
+                self._contar(atualizacoes=1)
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar cache {chave_voo} em segundo plano: {e}")
+
+        threading.Thread(target=executar, name=f'swr-{chave_voo}', daemon=True).start()
+
+    @abstractmethod
+    def _resumo(self) -> Tuple[int, int]:
+        """(itens, tags) atualmente armazenados"""
+
+    def _contar(self, acertos: int = 0, falhas: int = 0, expiracoes: int = 0, despejos: int = 0,
+                atualizacoes: int = 0, vencidos: int = 0) -> None:
+        with self._lock_contadores:
+            self.vencidos_servidos += vencidos
+            self.acertos += acertos
+            self.falhas += falhas
+            self.expiracoes += expiracoes
+            self.despejos += despejos
+            self.atualizacoes_segundo_plano += atualizacoes
+
+    def estatisticas(self) -> Dict:
+        """Contadores de uso do cache (por processo)"""
+        itens, tags = self._resumo()
+        consultas = self.acertos + self.falhas
+        return {
+            'nome': self.nome,
+            'backend': self.__class__.__name__,
+            'itens': itens,
+            'max_itens': self.max_itens,
+            'ttl_segundos': self.ttl,
+            'ttl_suave_segundos': self.ttl_suave,
+            'graca_segundos': self.graca,
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'expiracoes': self.expiracoes,
+            'despejos': self.despejos,
+            'atualizacoes_segundo_plano': self.atualizacoes_segundo_plano,
+            'vencidos_servidos': self.vencidos_servidos,
+            'tags': tags,
+            'taxa_acerto': round(self.acertos / consultas, 4) if consultas else 0.0
+        }
+
+
+class CacheLRU(BackendCache):
+    """Cache limitado e thread-safe com expiração por TTL e despejo LRU (memória do processo)"""
+
+    def __init__(self, ttl_segundos: int = 300, max_itens: int = 1000, nome: str = 'cache',
+                 ttl_suave: Optional[int] = None, graca_segundos: int = 0):
+        super().__init__(ttl_segundos, max_itens, nome, ttl_suave, graca_segundos)
+        # chave -> (valor, expira_em, tags, vence_em, descarta_em)
+        self._itens: 'OrderedDict[str, Tuple[Any, float, Tuple[str, ...], float, float]]' = OrderedDict()
+        self._por_tag: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self._escritas = 0
+
+    def _consultar(self, chave: str, contar: bool = True) -> Tuple[Any, bool]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self._contar(falhas=int(contar))
+                return None, False
+
+            valor, expira_em, _, vence_em, descarta_em = item
+            agora = time.monotonic()
+            if agora >= expira_em:
+                # Dentro da graça a entrada fica guardada só para o modo degradado
+                if agora >= descarta_em:
+                    self._remover(chave)
+                    self._contar(expiracoes=1)
+                self._contar(falhas=int(contar))
+                return None, False
+
+            self._itens.move_to_end(chave)
+            self._contar(acertos=int(contar))
+            return valor, agora >= vence_em
+
+    def _consultar_vencido(self, chave: str) -> Any:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or time.monotonic() >= item[4]:
+                return None
+            return item[0]
+
+    def definir(self, chave: str, valor: Any, tags: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        """Define valor do cache, despejando os menos usados se passar do limite"""
+        tags = tuple(tags)
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            expira_em, vence_em, descarta_em = self._prazos(time.monotonic(), ttl)
+            self._itens[chave] = (valor, expira_em, tags, vence_em, descarta_em)
+            for tag in tags:
+                self._por_tag.setdefault(tag, set()).add(chave)
+
+            self._escritas += 1
+            if self._escritas % INTERVALO_VARREDURA_ESCRITAS == 0:
+                self._remover_expirados()
+
+            while len(self._itens) > self.max_itens:
+                self._remover(next(iter(self._itens)))
+                self._contar(despejos=1)
+
+    def definir_se_ausente(self, chave: str, valor: Any, tags: Iterable[str] = (),
+                           ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and time.monotonic() < item[1]:
+                return False
+            self.definir(chave, valor, tags, ttl)
+            return True
+
     def limpar(self, chave: str = None) -> None:
         """Limpa cache - especifica chave ou limpa tudo"""
-        if chave:
-            self.cache.pop(chave, None)
-        else:
-            self.cache.clear()
+        with self._lock:
+            if chave:
+                self._remover(chave)
+            else:
+                self._itens.clear()
+                self._por_tag.clear()
+
+    def invalidar_tag(self, tag: str) -> int:
+        """Remove todas as entradas marcadas com a tag; retorna quantas saíram"""
+        with self._lock:
+            chaves = self._por_tag.pop(tag, set())
+            for chave in chaves:
+                self._remover(chave)
+            return len(chaves)
+
+    def _resumo(self) -> Tuple[int, int]:
+        with self._lock:
+            self._remover_expirados()
+            return len(self._itens), len(self._por_tag)
+
+    def _remover(self, chave: str) -> None:
+        """Remove a entrada e sua referência no índice de tags"""
+        item = self._itens.pop(chave, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            chaves = self._por_tag.get(tag)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._por_tag[tag]
+
+    def _remover_expirados(self) -> None:
+        agora = time.monotonic()
+        expirados = [chave for chave, item in self._itens.items() if agora >= item[4]]
+        for chave in expirados:
+            self._remover(chave)
+        self._contar(expiracoes=len(expirados))
+
+
+class CacheSQLite(BackendCache):
+    """
+    Cache compartilhado entre workers do gunicorn num arquivo SQLite em modo WAL
+
+    Todos os processos da máquina leem e invalidam as mesmas entradas, então uma
+    reserva atendida por um worker derruba a disponibilidade em cache de todos.
+    Valores são serializados com pickle (o arquivo é local e só a aplicação escreve nele).
+    """
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            chave TEXT NOT NULL,
+            valor BLOB NOT NULL,
+            expira_em REAL NOT NULL,
+            vence_em REAL NOT NULL,
+            descarta_em REAL NOT NULL,
+            acessado_em REAL NOT NULL,
+            PRIMARY KEY (namespace, chave)
+        )""",
+        """CREATE TABLE IF NOT EXISTS cache_tags (
+            namespace TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            chave TEXT NOT NULL,
+            PRIMARY KEY (namespace, tag, chave)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_cache_acesso ON cache (namespace, acessado_em)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_tags_chave ON cache_tags (namespace, chave)",
+    )
+
+    def __init__(self, caminho: str, ttl_segundos: int = 300, max_itens: int = 1000, nome: str = 'cache',
+                 ttl_suave: Optional[int] = None, graca_segundos: int = 0):
+        super().__init__(ttl_segundos, max_itens, nome, ttl_suave, graca_segundos)
+        self.caminho = caminho
+        self._local = threading.local()
+        self._escritas = 0
+        with self._transacao() as conn:
+            # Arquivo criado por versão anterior (sem vence_em/descarta_em): é só cache, recria
+            colunas = {linha[1] for linha in conn.execute('PRAGMA table_info(cache)')}
+            if colunas and not {'vence_em', 'descarta_em'} <= colunas:
+                conn.execute('DROP TABLE cache')
+                conn.execute('DROP TABLE IF EXISTS cache_tags')
+            for comando in self.SCHEMA:
+                conn.execute(comando)
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transacao(self):
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _consultar(self, chave: str, contar: bool = True) -> Tuple[Any, bool]:
+        conn = self._conexao()
+        linha = conn.execute(
+            'SELECT valor, expira_em, vence_em, descarta_em, acessado_em FROM cache WHERE namespace = ? AND chave = ?',
+            (self.nome, chave)
+        ).fetchone()
+        if linha is None:
+            self._contar(falhas=int(contar))
+            return None, False
+
+        valor, expira_em, vence_em, descarta_em, acessado_em = linha
+        agora = time.time()
+        if agora >= expira_em:
+            # Dentro da graça a entrada fica guardada só para o modo degradado
+            if agora >= descarta_em:
+                with self._transacao() as conn:
+                    self._remover(conn, [chave])
+                self._contar(expiracoes=1)
+            self._contar(falhas=int(contar))
+            return None, False
+
+        # LRU aproximado: só regrava o acesso quando ficou velho (evita uma escrita por leitura)
+        if agora - acessado_em > self.ttl / 10:
+            conn.execute(
+                'UPDATE cache SET acessado_em = ? WHERE namespace = ? AND chave = ?',
+                (agora, self.nome, chave)
+            )
+        self._contar(acertos=int(contar))
+        return pickle.loads(valor), agora >= vence_em
+
+    def _consultar_vencido(self, chave: str) -> Any:
+        linha = self._conexao().execute(
+            'SELECT valor FROM cache WHERE namespace = ? AND chave = ? AND descarta_em > ?',
+            (self.nome, chave, time.time())
+        ).fetchone()
+        return pickle.loads(linha[0]) if linha else None
+
+    def definir(self, chave: str, valor: Any, tags: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        """Define valor do cache, despejando os menos usados se passar do limite"""
+        with self._transacao() as conn:
+            self._gravar(conn, chave, valor, tags, ttl)
+
+    def definir_se_ausente(self, chave: str, valor: Any, tags: Iterable[str] = (),
+                           ttl: Optional[float] = None) -> bool:
+        with self._transacao() as conn:
+            linha = conn.execute(
+                'SELECT expira_em FROM cache WHERE namespace = ? AND chave = ?',
+                (self.nome, chave)
+            ).fetchone()
+            if linha is not None and time.time() < linha[0]:
+                return False
+            self._gravar(conn, chave, valor, tags, ttl)
+            return True
+
+    def limpar(self, chave: str = None) -> None:
+        """Limpa cache - especifica chave ou limpa tudo"""
+        with self._transacao() as conn:
+            if chave:
+                self._remover(conn, [chave])
+            else:
+                conn.execute('DELETE FROM cache WHERE namespace = ?', (self.nome,))
+                conn.execute('DELETE FROM cache_tags WHERE namespace = ?', (self.nome,))
+
+    def invalidar_tag(self, tag: str) -> int:
+        """Remove todas as entradas marcadas com a tag; retorna quantas saíram"""
+        with self._transacao() as conn:
+            chaves = [c for (c,) in conn.execute(
+                'SELECT chave FROM cache_tags WHERE namespace = ? AND tag = ?', (self.nome, tag)
+            )]
+            self._remover(conn, chaves)
+            return len(chaves)
+
+    def _resumo(self) -> Tuple[int, int]:
+        with self._transacao() as conn:
+            self._remover_expirados(conn)
+            itens = conn.execute('SELECT count(*) FROM cache WHERE namespace = ?', (self.nome,)).fetchone()[0]
+            tags = conn.execute(
+                'SELECT count(DISTINCT tag) FROM cache_tags WHERE namespace = ?', (self.nome,)
+            ).fetchone()[0]
+            return itens, tags
+
+    def _gravar(self, conn, chave: str, valor: Any, tags: Iterable[str], ttl: Optional[float] = None) -> None:
+        agora = time.time()
+        conn.execute('DELETE FROM cache_tags WHERE namespace = ? AND chave = ?', (self.nome, chave))
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (namespace, chave, valor, expira_em, vence_em, descarta_em, acessado_em) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.nome, chave, pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL), *self._prazos(agora, ttl), agora)
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO cache_tags (namespace, tag, chave) VALUES (?, ?, ?)',
+            [(self.nome, tag, chave) for tag in tags]
+        )
+
+        self._escritas += 1
+        if self._escritas % INTERVALO_VARREDURA_ESCRITAS == 0:
+            self._remover_expirados(conn)
+            excedente = conn.execute(
+                'SELECT count(*) FROM cache WHERE namespace = ?', (self.nome,)
+            ).fetchone()[0] - self.max_itens
+            if excedente > 0:
+                antigas = [c for (c,) in conn.execute(
+                    'SELECT chave FROM cache WHERE namespace = ? ORDER BY acessado_em LIMIT ?',
+                    (self.nome, excedente)
+                )]
+                self._remover(conn, antigas)
+                self._contar(despejos=len(antigas))
+
+    def _remover(self, conn, chaves: List[str]) -> None:
+        conn.executemany('DELETE FROM cache WHERE namespace = ? AND chave = ?', [(self.nome, c) for c in chaves])
+        conn.executemany('DELETE FROM cache_tags WHERE namespace = ? AND chave = ?', [(self.nome, c) for c in chaves])
+
+    def _remover_expirados(self, conn) -> None:
+        expiradas = [c for (c,) in conn.execute(
+            'SELECT chave FROM cache WHERE namespace = ? AND descarta_em <= ?', (self.nome, time.time())
+        )]
+        self._remover(conn, expiradas)
+        self._contar(expiracoes=len(expiradas))
+
+
+def criar_cache(nome: str, ttl_segundos: int, max_itens: int, ttl_suave: Optional[int] = None,
+                graca_segundos: int = 0, backend: Optional[str] = None) -> BackendCache:
+    """Cria o cache no backend informado ou, por padrão, no configurado em CACHE_BACKEND (memoria | sqlite)"""
+    if (backend or CACHE_BACKEND) == 'sqlite':
+        return CacheSQLite(CACHE_SQLITE_PATH, ttl_segundos=ttl_segundos, max_itens=max_itens,
+                           nome=nome, ttl_suave=ttl_suave, graca_segundos=graca_segundos)
+    return CacheLRU(ttl_segundos=ttl_segundos, max_itens=max_itens, nome=nome, ttl_suave=ttl_suave,
+                    graca_segundos=graca_segundos)
+
+
+# Compatibilidade com o nome antigo
+CacheSimples = CacheLRU
 
 # Instâncias de cache para diferentes dados
-cache_profissionais = CacheSimples(ttl_segundos=300)  # 5 minutos
-cache_procedimentos = CacheSimples(ttl_segundos=300)   # 5 minutos
-cache_dashboard = CacheSimples(ttl_segundos=60)        # 1 minuto (mais dinâmico)
+# (ttl_suave = quando começa a atualizar em segundo plano; ttl_segundos = quando bloqueia;
+#  graca_segundos = por quanto tempo o valor vencido ainda serve se o banco cair)
+cache_profissionais = criar_cache('profissionais', ttl_segundos=3600, max_itens=500, ttl_suave=300,
+                                  graca_segundos=CACHE_GRACA_SEGUNDOS)                                # 5 min / 1 h
+cache_procedimentos = criar_cache('procedimentos', ttl_segundos=3600, max_itens=500, ttl_suave=300,
+                                  graca_segundos=CACHE_GRACA_SEGUNDOS)                                # 5 min / 1 h
+cache_dashboard = criar_cache('dashboard', ttl_segundos=600, max_itens=50, ttl_suave=60,
+                              graca_segundos=CACHE_GRACA_SEGUNDOS)                                    # 1 min / 10 min
+cache_disponibilidade = criar_cache('disponibilidade', ttl_segundos=60, max_itens=2000)    # 1 minuto (horários e mapa do mês)
+# Idempotência sempre no SQLite, compartilhado entre os workers do gunicorn da máquina: no backend em
+# memória um reenvio que caísse em outro worker não veria a chave e duplicaria a reserva
+cache_idempotencia = criar_cache('idempotencia', ttl_segundos=86400, max_itens=10000,
+                                 backend='sqlite')                                           # 24 horas (POST /api/agendamentos)
+
+CACHES: List[BackendCache] = [
+    cache_profissionais, cache_procedimentos, cache_dashboard, cache_disponibilidade, cache_idempotencia
+]
 
 def cache_decorator(tempo_ttl: int = 300):
     """Decorator para cachear resultado de funções"""
@@ -48,17 +614,17 @@ def cache_decorator(tempo_ttl: int = 300):
         def wrapper(*args, **kwargs):
             # Criar chave única baseada em função, args e kwargs
             chave = f"{func.__name__}_{str(args)}_{str(kwargs)}"
-            
+
             # Tentar obter do cache simples
             resultado_em_cache = cache_profissionais.obter(chave)
             if resultado_em_cache is not None:
                 return resultado_em_cache
-            
+
             # Se não estiver em cache, executar função
             resultado = func(*args, **kwargs)
             cache_profissionais.definir(chave, resultado)
             return resultado
-        
+
         return wrapper
     return decorator
 
@@ -77,3 +643,35 @@ def limpar_todo_cache():
     cache_profissionais.limpar()
     cache_procedimentos.limpar()
     cache_dashboard.limpar()
+    cache_disponibilidade.limpar()
+
+def invalidar_tags(*tags: str) -> int:
+    """Invalida as tags em todas as instâncias de cache"""
+    return sum(cache.invalidar_tag(tag) for cache in CACHES for tag in tags)
+
+def invalidar_agendamento(prof_id: int, data: date, repetir_apos: float = 0) -> int:
+    """
+    Invalida só o que uma reserva/cancelamento muda: contadores e a agenda do dia/mês da profissional
+
+    repetir_apos: com réplica de leitura, outro cliente pode ler a réplica atrasada logo
+    após a escrita e devolver ao cache o estado antigo; a invalidação é repetida depois
+    desse intervalo (a janela de leitura própria, que cobre o atraso da réplica)
+    """
+    tags = (TAG_AGENDAMENTOS, tag_dia(prof_id, data), tag_mes(prof_id, data.year, data.month))
+    if repetir_apos > 0:
+        _agendar_repeticao(repetir_apos, lambda: invalidar_tags(*tags))
+    return invalidar_tags(*tags)
+
+def _agendar_repeticao(atraso: float, funcao: Callable[[], Any]) -> None:
+    """Roda funcao() depois de `atraso` segundos numa thread daemon"""
+    repeticao = threading.Timer(atraso, funcao)
+    repeticao.daemon = True
+    repeticao.start()
+
+def estatisticas_cache() -> List[Dict]:
+    """Estatísticas de todas as instâncias de cache"""
+    return [cache.estatisticas() for cache in CACHES]
+
+def estatisticas_coalescencia() -> Dict:
+    """Quantas requisições foram atendidas por um cálculo já em andamento"""
+    return voos.estatisticas()
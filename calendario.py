@@ -0,0 +1,234 @@
+"""
+Snapshot do Calendário em Memória
+Carrega feriados, horário de funcionamento e dias úteis uma vez por processo
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, time as hora, timedelta
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy import text
+from database import sessao_requisicao, Feriado, HorarioFuncionamento, Profissional, Procedimento
+
+logger = logging.getLogger(__name__)
+
+DIAS_SEMANA = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo']
+
+# Limite de dias consultáveis por requisição (evita horizontes gigantes via query string)
+HORIZONTE_MAXIMO_DIAS = 90
+
+# Antecedência máxima de uma reserva (validar_data) e, portanto, de qualquer busca por horários
+ANTECEDENCIA_MAXIMA_DIAS = 30
+
+# Intervalo mínimo entre verificações de versão no banco
+INTERVALO_VERIFICACAO_SEGUNDOS = 30
+
+# Duração assumida quando o procedimento não informa (mesmo default da tabela)
+DURACAO_PADRAO_MINUTOS = 30
+
+# Uma única consulta resume o conteúdo das tabelas de calendário;
+# qualquer edição do admin muda o hash e força a recarga do snapshot
+SQL_VERSAO = text("""
+    SELECT md5(
+        coalesce((SELECT string_agg(f::text, ',' ORDER BY f.id) FROM feriados f), '') || '#' ||
+        coalesce((SELECT string_agg(h::text, ',' ORDER BY h.id) FROM horario_funcionamento h), '') || '#' ||
+        coalesce((SELECT string_agg(concat_ws('|', p.id, p.nome, p.ativo, p.dias_uteis, p.intervalo_entre_clientes),
+                                    ',' ORDER BY p.id) FROM profissionais p), '') || '#' ||
+        coalesce((SELECT string_agg(concat_ws('|', pr.id, pr.profissional_id, pr.codigo, pr.nome,
+                                              pr.duracao_minutos, pr.ativo),
+                                    ',' ORDER BY pr.id) FROM procedimentos pr), '')
+    )
+""")
+
+
+def limitar_horizonte(dias_futuros: int) -> int:
+    """Restringe o horizonte pedido ao intervalo [1, HORIZONTE_MAXIMO_DIAS]"""
+    return max(1, min(int(dias_futuros), HORIZONTE_MAXIMO_DIAS))
+
+
+class ProcedimentoCalendario(NamedTuple):
+    id: int
+    profissional_id: int
+    codigo: str
+    nome: str
+    duracao_minutos: int
+    ativo: bool
+
+
+@dataclass(frozen=True)
+class SnapshotCalendario:
+    """Fotografia imutável do calendário; consultas não tocam no banco"""
+
+    versao: str
+    feriados: FrozenSet[date]
+    horarios: Dict[str, Optional[Tuple[hora, hora]]]  # dia_semana -> (abertura, fechamento) ou None se fechado
+    dias_uteis: Dict[int, Optional[FrozenSet[str]]]   # profissional_id -> dias de trabalho (None = todos)
+    intervalos: Dict[int, int]                         # profissional_id -> intervalo entre clientes
+    procedimentos: Dict[int, ProcedimentoCalendario]   # procedimento_id -> dados usados na agenda
+    nomes: Dict[int, str]                              # profissional_id -> nome
+    ativos: FrozenSet[int]                             # profissionais ativas
+
+    def eh_feriado(self, data: date) -> bool:
+        return data in self.feriados
+
+    def horario_do_dia(self, data: date) -> Optional[Tuple[hora, hora]]:
+        """Horário de funcionamento do dia da semana (None se fechado ou não configurado)"""
+        return self.horarios.get(DIAS_SEMANA[data.weekday()])
+
+    def procedimento_da_profissional(self, prof_id: int,
+                                     referencia: Union[int, str]) -> Optional[ProcedimentoCalendario]:
+        """Resolve o procedimento pelo id ou, como fallback, pelo código (o chatbot envia o código)"""
+        try:
+            proc = self.procedimentos.get(int(referencia))
+        except (TypeError, ValueError):
+            proc = None
+        if proc and proc.profissional_id == prof_id:
+            return proc
+
+        codigo = str(referencia)
+        for proc in self.procedimentos.values():
+            if proc.profissional_id == prof_id and proc.codigo == codigo:
+                return proc
+        return None
+
+    def procedimentos_equivalentes(self, procedimento_id: Optional[int] = None,
+                                   codigo: Optional[str] = None) -> List[ProcedimentoCalendario]:
+        """Procedimentos ativos de profissionais ativas que atendem ao pedido (mesmo nome ou código)"""
+        if procedimento_id is not None:
+            referencia = self.procedimentos.get(procedimento_id)
+            if not referencia:
+                return []
+            nome = referencia.nome.strip().lower()
+            criterio = lambda proc: proc.nome.strip().lower() == nome
+        elif codigo:
+            criterio = lambda proc: proc.codigo == codigo
+        else:
+            return []
+
+        return [
+            proc for proc in self.procedimentos.values()
+            if proc.ativo and proc.profissional_id in self.ativos and criterio(proc)
+        ]
+
+    def dia_disponivel(self, prof_id: int, data: date) -> bool:
+        """Verifica feriado, dia útil da profissional e fechamento da clínica"""
+        if data in self.feriados:
+            return False
+
+        dia_semana = DIAS_SEMANA[data.weekday()]
+        dias = self.dias_uteis.get(prof_id)
+        if dias and dia_semana not in dias:
+            return False
+
+        # Só descarta o dia se ele estiver explicitamente fechado na tabela
+        if dia_semana in self.horarios and self.horarios[dia_semana] is None:
+            return False
+
+        return True
+
+    def datas_disponiveis(self, prof_id: int, inicio: date, dias_futuros: int) -> List[date]:
+        """Lista as datas disponíveis no horizonte, em ordem cronológica"""
+        return [
+            data
+            for data in (inicio + timedelta(days=i) for i in range(limitar_horizonte(dias_futuros)))
+            if self.dia_disponivel(prof_id, data)
+        ]
+
+
+class CalendarioClinica:
+    """Mantém o snapshot do calendário e recarrega quando o banco muda"""
+
+    def __init__(self, intervalo_verificacao: int = INTERVALO_VERIFICACAO_SEGUNDOS):
+        self.intervalo_verificacao = intervalo_verificacao
+        self._snapshot: Optional[SnapshotCalendario] = None
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+
+    def obter(self) -> SnapshotCalendario:
+        """Retorna o snapshot atual, verificando a versão no máximo a cada intervalo"""
+        agora = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and agora - self._verificado_em < self.intervalo_verificacao:
+            return snapshot
+
+        with self._lock:
+            # Outra thread pode ter atualizado enquanto esperávamos o lock
+            if self._snapshot is not None and agora - self._verificado_em < self.intervalo_verificacao:
+                return self._snapshot
+
+            try:
+                # Dentro de uma requisição reaproveita a sessão dela (mesma conexão)
+                with sessao_requisicao() as db:
+                    versao = db.execute(SQL_VERSAO).scalar() or ''
+                    if self._snapshot is None or self._snapshot.versao != versao:
+                        self._snapshot = self._carregar(db, versao)
+                        logger.info(f"Snapshot do calendário carregado (versão {versao[:8]})")
+                self._verificado_em = time.monotonic()
+                return self._snapshot
+            except Exception as e:
+                # Banco indisponível: continua servindo o último snapshot conhecido
+                if self._snapshot is not None:
+                    logger.warning(f"Erro ao verificar versão do calendário, usando snapshot anterior: {e}")
+                    return self._snapshot
+                raise
+
+    def invalidar(self) -> None:
+        """Força nova verificação de versão na próxima consulta"""
+        self._verificado_em = 0.0
+
+    @staticmethod
+    def _carregar(db, versao: str) -> SnapshotCalendario:
+        feriados = frozenset(d for (d,) in db.query(Feriado.data).all())
+
+        horarios = {}
+        for h in db.query(HorarioFuncionamento).all():
+            if h.ativo is not False and h.hora_abertura and h.hora_fechamento:
+                horarios[h.dia_semana] = (h.hora_abertura, h.hora_fechamento)
+            else:
+                horarios[h.dia_semana] = None
+
+        dias_uteis = {}
+        intervalos = {}
+        nomes = {}
+        ativos = set()
+        for prof_id, nome, ativo, dias, intervalo in db.query(
+            Profissional.id, Profissional.nome, Profissional.ativo,
+            Profissional.dias_uteis, Profissional.intervalo_entre_clientes
+        ).all():
+            dias_uteis[prof_id] = frozenset(dias) if dias else None
+            intervalos[prof_id] = intervalo or 0
+            nomes[prof_id] = nome
+            if ativo is not False:
+                ativos.add(prof_id)
+
+        procedimentos = {
+            proc_id: ProcedimentoCalendario(
+                id=proc_id,
+                profissional_id=prof_id,
+                codigo=codigo,
+                nome=nome,
+                duracao_minutos=duracao or DURACAO_PADRAO_MINUTOS,
+                ativo=ativo is not False,
+            )
+            for proc_id, prof_id, codigo, nome, duracao, ativo in db.query(
+                Procedimento.id, Procedimento.profissional_id, Procedimento.codigo,
+                Procedimento.nome, Procedimento.duracao_minutos, Procedimento.ativo
+            ).all()
+        }
+
+        return SnapshotCalendario(
+            versao=versao,
+            feriados=feriados,
+            horarios=horarios,
+            dias_uteis=dias_uteis,
+            intervalos=intervalos,
+            procedimentos=procedimentos,
+            nomes=nomes,
+            ativos=frozenset(ativos),
+        )
+
+
+# Instância única por processo
+calendario = CalendarioClinica()
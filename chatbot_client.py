@@ -4,16 +4,26 @@ Cliente para Chatbot integrado com a API da Agenda App
 
 import requests
 import logging
+import time
+import uuid
 from typing import Tuple, List, Dict, Optional, Any
 
 logger = logging.getLogger(__name__)
 
+# Tempo máximo de cada chamada HTTP (conexão, leitura) em segundos
+TIMEOUT_PADRAO = (3.05, 15)
+
+# Reenvios quando o servidor responde 409 "ainda em processamento" para a mesma Idempotency-Key
+MAX_ESPERAS_EM_ANDAMENTO = 5
+ESPERA_MAXIMA_SEGUNDOS = 5
+
 
 class ChatbotAPIClient:
     """Cliente HTTP para chamar endpoints da Agenda App"""
     
-    def __init__(self, base_url: str = "http://localhost:5001"):
+    def __init__(self, base_url: str = "http://localhost:5001", timeout=TIMEOUT_PADRAO):
         self.base_url = base_url
+        self.timeout = timeout
         self.session = requests.Session()
     
     def obter_profissionais(self) -> Tuple[bool, Optional[List[Dict]], str]:
@@ -24,7 +34,7 @@ class ChatbotAPIClient:
             (sucesso, profissionais, mensagem)
         """
         try:
-            response = self.session.get(f"{self.base_url}/api/profissionais")
+            response = self.session.get(f"{self.base_url}/api/profissionais", timeout=self.timeout)
             if response.status_code == 200:
                 profs = response.json()
                 return True, profs, "Profissionais obtidas com sucesso"
@@ -43,7 +53,8 @@ class ChatbotAPIClient:
         """
         try:
             response = self.session.get(
-                f"{self.base_url}/api/profissionais/{prof_id}/procedimentos"
+                f"{self.base_url}/api/profissionais/{prof_id}/procedimentos",
+                timeout=self.timeout
             )
             if response.status_code == 200:
                 procs = response.json()
@@ -66,7 +77,8 @@ class ChatbotAPIClient:
         try:
             response = self.session.get(
                 f"{self.base_url}/api/profissionais/{prof_id}/datas-disponiveis",
-                params={"dias_futuros": dias_futuros}
+                params={"dias_futuros": dias_futuros},
+                timeout=self.timeout
             )
             if response.status_code == 200:
                 data = response.json()
@@ -95,7 +107,8 @@ class ChatbotAPIClient:
         try:
             response = self.session.get(
                 f"{self.base_url}/api/profissionais/{prof_id}/horarios",
-                params={"data": data, "procedimento_id": proc_id}
+                params={"data": data, "procedimento_id": proc_id},
+                timeout=self.timeout
             )
             if response.status_code == 200:
                 data_resp = response.json()
@@ -107,6 +120,41 @@ class ChatbotAPIClient:
             logger.error(f"Erro ao obter horários: {e}")
             return False, None, str(e)
     
+    def buscar_proximos_horarios(
+        self, procedimento_id: Optional[int] = None, codigo: Optional[str] = None, limite: int = 5
+    ) -> Tuple[bool, Optional[List[Dict]], str]:
+        """
+        Busca os próximos horários livres de um procedimento em qualquer profissional
+        
+        Args:
+            procedimento_id: ID do procedimento (ou use codigo)
+            codigo: Código do procedimento (ex: '101')
+            limite: Quantidade máxima de horários
+        
+        Returns:
+            (sucesso, horarios, mensagem)
+        """
+        try:
+            params = {"limite": limite}
+            if procedimento_id:
+                params["procedimento_id"] = procedimento_id
+            if codigo:
+                params["codigo"] = codigo
+            
+            response = self.session.get(
+                f"{self.base_url}/api/disponibilidade/proximos",
+                params=params,
+                timeout=self.timeout
+            )
+            if response.status_code == 200:
+                horarios = response.json().get('horarios', [])
+                return True, horarios, "Horários obtidos com sucesso"
+            else:
+                return False, None, f"Erro ao buscar horários: {response.status_code}"
+        except Exception as e:
+            logger.error(f"Erro ao buscar próximos horários: {e}")
+            return False, None, str(e)
+    
     def criar_agendamento(
         self,
         prof_id: int,
@@ -117,6 +165,8 @@ class ChatbotAPIClient:
         procedimento_id: int,
         procedimento_nome: str,
         cliente_email: Optional[str] = None,
+        chave_idempotencia: Optional[str] = None,
+        tentativas: int = 2,
     ) -> Tuple[bool, Optional[str], str]:
         """
         Cria um novo agendamento
@@ -130,6 +180,11 @@ class ChatbotAPIClient:
             procedimento_id: ID do procedimento
             procedimento_nome: Nome do procedimento
             cliente_email: Email do cliente (opcional)
+            chave_idempotencia: Idempotency-Key (gerada se omitida); reenvios
+                com a mesma chave não criam agendamento duplicado
+            tentativas: Envios em caso de timeout ou erro de conexão; um 409
+                "ainda em processamento" (primeiro envio não terminou) espera o
+                Retry-After e reenvia com a mesma chave
         
         Returns:
             (sucesso, agendamento_id, mensagem)
@@ -147,10 +202,37 @@ class ChatbotAPIClient:
             if cliente_email:
                 payload["cliente_email"] = cliente_email
             
-            response = self.session.post(
-                f"{self.base_url}/api/agendamentos",
-                json=payload
-            )
+            headers = {"Idempotency-Key": chave_idempotencia or str(uuid.uuid4())}
+            falhas = esperas = 0
+            while True:
+                try:
+                    response = self.session.post(
+                        f"{self.base_url}/api/agendamentos",
+                        json=payload,
+                        headers=headers,
+                        timeout=self.timeout
+                    )
+                except (requests.Timeout, requests.ConnectionError):
+                    falhas += 1
+                    if falhas >= tentativas:
+                        raise
+                    logger.warning("Timeout ao criar agendamento, reenviando com a mesma Idempotency-Key")
+                    continue
+
+                # 409 com Retry-After: o envio anterior com esta chave ainda está em processamento
+                # (o 409 de horário ocupado não tem Retry-After e segue como erro)
+                if response.status_code == 409 and 'Retry-After' in response.headers \
+                        and esperas < MAX_ESPERAS_EM_ANDAMENTO:
+                    esperas += 1
+                    try:
+                        espera = float(response.headers['Retry-After'])
+                    except ValueError:
+                        espera = 1.0
+                    espera = min(ESPERA_MAXIMA_SEGUNDOS, espera * esperas)
+                    logger.info(f"Agendamento ainda em processamento, nova consulta em {espera:.1f}s")
+                    time.sleep(espera)
+                    continue
+                break
             
             if response.status_code == 201:
                 data_resp = response.json()
@@ -20,9 +20,10 @@ class ConfigProducao:
     SQLALCHEMY_ECHO = False  # Não fazer log de SQL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    # Pool de Conexões (ajustado para produção)
-    DATABASE_POOL_SIZE = 50          # Mais conexões
-    DATABASE_MAX_OVERFLOW = 50       # Mais conexões extras
+    # Pool de Conexões (ajustado para produção; valores por worker, ver database.dimensionar_pool)
+    DATABASE_MAX_CONEXOES = int(os.getenv('DATABASE_MAX_CONEXOES', '80'))  # Somando todos os workers
+    DATABASE_POOL_SIZE = 50          # Teto do pool base (na prática, threads do worker)
+    DATABASE_MAX_OVERFLOW = 50       # Teto de conexões extras
     DATABASE_POOL_TIMEOUT = 30       # Esperar 30s
     DATABASE_POOL_RECYCLE = 3600     # Reciclar a cada 1h
     
@@ -68,6 +69,7 @@ class ConfigDesenvolvimento:
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     
     # Pool de Conexões (menor para dev)
+    DATABASE_MAX_CONEXOES = int(os.getenv('DATABASE_MAX_CONEXOES', '20'))
     DATABASE_POOL_SIZE = 5
     DATABASE_MAX_OVERFLOW = 10
     DATABASE_POOL_TIMEOUT = 10
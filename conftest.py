@@ -0,0 +1,3 @@
+# test_stability.py e test_planos.py são scripts (servidor rodando / Postgres local),
+# executados com python; o pytest só coleta os testes unitários
+collect_ignore = ['test_stability.py', 'test_planos.py']
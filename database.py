@@ -3,11 +3,20 @@ Database Models - SQLAlchemy ORM para Marcia Rocha Beauty
 Conecta ao Neon PostgreSQL
 """
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Date, Time, Boolean, ForeignKey, ARRAY
+from sqlalchemy import event, exc, text, create_engine, Column, Integer, String, Text, DateTime, Date, Time, Boolean, ForeignKey, ARRAY
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+from flask import g, has_app_context
 from dotenv import load_dotenv
+from config import config
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -17,27 +26,280 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL não está configurada. Configure a variável de ambiente DATABASE_URL")
 
-# Criar engine com otimizações
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=20,                          # Aumentado para mais conexões simultâneas
-    max_overflow=30,                       # Aumentado para picos de tráfego
-    pool_pre_ping=True,                    # Verifica conexão antes de usar
-    pool_recycle=3600,                     # Recicla conexões a cada 1 hora
-    pool_timeout=30,                       # Timeout ao obter conexão
-    echo=False,
-    connect_args={
-        'connect_timeout': 10,             # Timeout de 10 segundos
-        'keepalives': 1,                   # Ativa keep-alive
-        'keepalives_idle': 30,             # Envia keep-alive a cada 30s de inatividade
-        'keepalives_interval': 10,         # Intervalo entre keep-alives
-        'keepalives_count': 5              # Número de keep-alives antes de dar up
+# Réplica de leitura opcional (streaming replication); sem ela tudo vai para o primário
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+
+# PgBouncer em modo transação na frente do banco: sem pool local
+MODO_PGBOUNCER = os.getenv('DATABASE_PGBOUNCER', '0').lower() in ('1', 'true', 'sim')
+
+# Após uma escrita, o mesmo cliente lê do primário por esta janela (cobre o atraso da réplica)
+JANELA_LEITURA_PROPRIA_SEGUNDOS = float(os.getenv('JANELA_LEITURA_PROPRIA_SEGUNDOS', '5'))
+
+
+class _MetricasCheckout:
+    """Mede o checkout de conexões do pool: espera, timeouts e pico de uso"""
+
+    AMOSTRAS_ESPERA = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metricas_lock = threading.Lock()
+        self._esperas = deque(maxlen=self.AMOSTRAS_ESPERA)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.em_uso_pico = 0
+        self.overflow_pico = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except exc.TimeoutError:
+            with self._metricas_lock:
+                self.timeouts += 1
+            raise
+        espera = time.perf_counter() - inicio
+
+        with self._metricas_lock:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+            self._esperas.append(espera)
+            if isinstance(self, QueuePool):
+                self.em_uso_pico = max(self.em_uso_pico, self.checkedout())
+                self.overflow_pico = max(self.overflow_pico, self.overflow())
+        return conexao
+
+    def metricas(self) -> dict:
+        with self._metricas_lock:
+            esperas = sorted(self._esperas)
+            dados = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'espera_media_ms': round(self.espera_total / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                'espera_p95_ms': round(esperas[int(len(esperas) * 0.95)] * 1000, 2) if esperas else 0.0,
+                'espera_max_ms': round(self.espera_max * 1000, 2),
+            }
+            if isinstance(self, QueuePool):
+                dados.update({
+                    'tamanho': self.size(),
+                    'em_uso': self.checkedout(),
+                    'ociosas': self.checkedin(),
+                    'overflow_atual': max(0, self.overflow()),
+                    'max_overflow': self._max_overflow,
+                    'em_uso_pico': self.em_uso_pico,
+                    'overflow_pico': self.overflow_pico,
+                })
+            return dados
+
+
+class PoolMonitorado(_MetricasCheckout, QueuePool):
+    """QueuePool com métricas de checkout"""
+
+
+class NullPoolMonitorado(_MetricasCheckout, NullPool):
+    """NullPool (uma conexão nova por checkout, modo PgBouncer) com métricas de checkout"""
+
+
+# Workers/threads do gunicorn quando as variáveis não estão definidas (mesmos padrões do Procfile)
+WORKERS_PADRAO = 4
+THREADS_PADRAO = 2
+
+
+def dimensionar_pool(cfg=config) -> dict:
+    """
+    Calcula pool_size/max_overflow por processo a partir do orçamento de conexões
+
+    Cada worker do gunicorn tem seu próprio pool; o total (workers x (pool + overflow))
+    não pode passar de DATABASE_MAX_CONEXOES. O pool base cobre as threads do worker,
+    limitado por DATABASE_POOL_SIZE; o restante do orçamento vira overflow.
+    """
+    workers = max(1, int(os.getenv('WEB_CONCURRENCY', WORKERS_PADRAO)))
+    threads = max(1, int(os.getenv('GUNICORN_THREADS', THREADS_PADRAO)))
+    orcamento = getattr(cfg, 'DATABASE_MAX_CONEXOES', 100)
+    por_worker = max(1, orcamento // workers)
+
+    pool_size = max(1, min(getattr(cfg, 'DATABASE_POOL_SIZE', 5), threads, por_worker))
+    max_overflow = max(0, min(getattr(cfg, 'DATABASE_MAX_OVERFLOW', 10), por_worker - pool_size))
+    return {
+        'workers': workers,
+        'threads': threads,
+        'orcamento_total': orcamento,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
     }
-)
 
-# SessionLocal para criar sessões
+
+def criar_engine(url, cfg=config):
+    """
+    Cria engine com pool dimensionado pela configuração
+
+    Com DATABASE_PGBOUNCER=1 (ex.: endpoint "-pooler" do Neon) o pool local é
+    desligado (NullPool): quem reaproveita conexões é o PgBouncer, e o app não
+    segura conexões ociosas que contam no limite do servidor.
+
+    Os connect_args de timeout e keep-alive são do libpq (psycopg2) e só vão para
+    URLs PostgreSQL; o SQLite (testes e benchmarks locais) recusaria esses argumentos.
+    """
+    opcoes = dict(echo=False)
+    if make_url(url).get_backend_name() == 'postgresql':
+        opcoes['connect_args'] = {
+            'connect_timeout': 10,             # Timeout de 10 segundos
+            'keepalives': 1,                   # Ativa keep-alive
+            'keepalives_idle': 30,             # Envia keep-alive a cada 30s de inatividade
+            'keepalives_interval': 10,         # Intervalo entre keep-alives
+            'keepalives_count': 5              # Número de keep-alives antes de dar up
+        }
+
+    if MODO_PGBOUNCER:
+        return create_engine(url, poolclass=NullPoolMonitorado, **opcoes)
+
+    tamanho = dimensionar_pool(cfg)
+    return create_engine(
+        url,
+        poolclass=PoolMonitorado,
+        pool_size=tamanho['pool_size'],
+        max_overflow=tamanho['max_overflow'],
+        pool_pre_ping=True,                    # Verifica conexão antes de usar
+        pool_recycle=getattr(cfg, 'DATABASE_POOL_RECYCLE', 3600),
+        pool_timeout=getattr(cfg, 'DATABASE_POOL_TIMEOUT', 30),
+        **opcoes
+    )
+
+
+def estatisticas_pool() -> dict:
+    """Configuração e métricas dos pools (primário e réplica)"""
+    dados = {
+        'modo': 'pgbouncer' if MODO_PGBOUNCER else 'pool_local',
+        'dimensionamento': dimensionar_pool(),
+        'primario': engine.pool.metricas(),
+        'checkouts_por_requisicao': contagem_checkouts.resumo(),
+    }
+    if engine_replica is not engine:
+        dados['replica'] = engine_replica.pool.metricas()
+    return dados
+
+
+engine = criar_engine(DATABASE_URL)
+engine_replica = criar_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else engine
+
+# SessionLocal para criar sessões (primário: escritas e leituras que precisam do dado mais recente)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessões somente leitura na réplica
+SessionReplica = sessionmaker(autocommit=False, autoflush=False, bind=engine_replica)
+
+# Momento (epoch) da última escrita do cliente atual; definido por requisição em app.py
+_ultima_escrita: ContextVar[float] = ContextVar('ultima_escrita', default=0.0)
+
+
+def registrar_escrita(momento=None):
+    """Marca que o cliente atual escreveu: as próximas leituras dele vão para o primário"""
+    _ultima_escrita.set(time.time() if momento is None else momento)
+
+
+def ultima_escrita() -> float:
+    """Epoch da última escrita do cliente atual (0 se nenhuma)"""
+    return _ultima_escrita.get()
+
+
+def _usar_replica() -> bool:
+    """Leituras vão para a réplica, exceto sem réplica ou na janela de leitura própria (read-your-writes)"""
+    return engine_replica is not engine and time.time() - _ultima_escrita.get() >= JANELA_LEITURA_PROPRIA_SEGUNDOS
+
+
+@contextmanager
+def sessao_requisicao(leitura=False):
+    """
+    Sessão compartilhada pela requisição Flask atual
+
+    Dentro de uma requisição todos os métodos reutilizam a mesma sessão (guardada em
+    flask.g) e portanto a mesma conexão do pool; ela é fechada no teardown do app
+    context (fechar_sessoes_requisicao). Fora de uma requisição (scripts, threads de
+    segundo plano) abre uma sessão própria e a fecha ao sair.
+
+    Em erro a transação é desfeita para que a sessão continue utilizável na requisição.
+    """
+    replica = leitura and _usar_replica()
+
+    if not has_app_context():
+        db = SessionReplica() if replica else SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    chave = '_sessao_replica' if replica else '_sessao_primario'
+    db = g.get(chave)
+    if db is None:
+        db = SessionReplica() if replica else SessionLocal()
+        setattr(g, chave, db)
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+
+
+def fechar_sessoes_requisicao(erro=None):
+    """Fecha as sessões da requisição (registrado em app.teardown_appcontext)"""
+    for chave in ('_sessao_primario', '_sessao_replica'):
+        db = g.pop(chave, None)
+        if db is not None:
+            db.close()
+
+
+# Checkouts de conexão feitos pela requisição atual (todas as engines)
+_checkouts_requisicao: ContextVar[int] = ContextVar('checkouts_requisicao', default=0)
+
+
+@event.listens_for(Pool, 'checkout')
+def _contar_checkout(dbapi_connection, connection_record, connection_proxy):
+    _checkouts_requisicao.set(_checkouts_requisicao.get() + 1)
+
+
+class _ContagemCheckouts:
+    """Distribuição de checkouts por requisição (esperado: no máximo 1 por engine)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.total = 0
+        self.maximo = 0
+        self.acima_de_um = 0
+
+    def registrar(self, checkouts: int) -> None:
+        with self._lock:
+            self.requisicoes += 1
+            self.total += checkouts
+            self.maximo = max(self.maximo, checkouts)
+            if checkouts > 1:
+                self.acima_de_um += 1
+
+    def resumo(self) -> dict:
+        with self._lock:
+            return {
+                'requisicoes': self.requisicoes,
+                'media': round(self.total / self.requisicoes, 3) if self.requisicoes else 0.0,
+                'maximo': self.maximo,
+                'requisicoes_acima_de_um': self.acima_de_um,
+            }
+
+
+contagem_checkouts = _ContagemCheckouts()
+
+
+def iniciar_contagem_checkouts() -> None:
+    """Zera o contador da requisição (a thread do worker é reaproveitada)"""
+    _checkouts_requisicao.set(0)
+
+
+def checkouts_da_requisicao() -> int:
+    return _checkouts_requisicao.get()
+
 # Base para declarar modelos
 Base = declarative_base()
 
@@ -102,6 +364,8 @@ class Procedimento(Base):
 
 
 class Agendamento(Base):
+    # Particionada por mês de data_agendamento (migrations/002): no banco a PK é
+    # (id, data_agendamento); id continua único por vir de uma única sequência
     __tablename__ = "agendamentos"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -169,6 +433,7 @@ class MensagemWhatsApp(Base):
     mensagem_enviada = Column(Text)
     mensagem_recebida = Column(Text)
     tipo = Column(String(50))  # texto, agendamento, cancelamento, menu
+    # Sem FK no banco desde a partição de agendamentos; aqui só orienta o ORM
     agendamento_id = Column(Integer, ForeignKey('agendamentos.id', ondelete='SET NULL'))
     criado_em = Column(DateTime, default=datetime.utcnow, index=True)
 
@@ -185,12 +450,21 @@ def get_db():
         db.close()
 
 
+def sondar_banco() -> None:
+    """
+    SELECT 1 direto na engine (usado pelo monitor de saúde)
+
+    Raises:
+        a exceção original, para quem precisa classificá-la (transitória ou não)
+    """
+    with engine.connect() as conexao:
+        conexao.execute(text('SELECT 1'))
+
+
 def verificar_conexao_banco() -> bool:
-    """Verifica se a conexão com o banco está ok"""
+    """Verifica se a conexão com o banco está ok (SELECT 1 direto na engine)"""
     try:
-        db = SessionLocal()
-        db.execute('SELECT 1')
-        db.close()
+        sondar_banco()
         return True
     except Exception as e:
         import logging
@@ -199,26 +473,6 @@ def verificar_conexao_banco() -> bool:
         return False
 
 
-def executar_com_retry(funcao, max_tentativas=3):
-    """Executa uma função com retry em caso de erro de conexão"""
-    import time
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    for tentativa in range(max_tentativas):
-        try:
-            return funcao()
-        except Exception as e:
-            if tentativa < max_tentativas - 1:
-                tempo_espera = 2 ** tentativa  # Exponential backoff
-                logger.warning(f"Erro na tentativa {tentativa + 1}/{max_tentativas}: {e}. Tentando novamente em {tempo_espera}s...")
-                time.sleep(tempo_espera)
-            else:
-                logger.error(f"Falha após {max_tentativas} tentativas: {e}")
-                raise
-        db.close()
-
-
 def init_db():
     """Inicializar banco de dados (criar tabelas se não existirem)"""
     Base.metadata.create_all(bind=engine)
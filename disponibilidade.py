@@ -0,0 +1,94 @@
+"""
+Motor de Horários Disponíveis
+Representa o dia como lista ordenada de intervalos ocupados (em minutos)
+"""
+from datetime import time
+from typing import Iterable, List, Optional, Tuple
+
+# Granularidade da grade de horários oferecidos
+PASSO_MINUTOS = 30
+
+# Rótulos HH:MM pré-calculados (evita strftime a cada passo)
+ROTULOS = [f'{m // 60:02d}:{m % 60:02d}' for m in range(24 * 60)]
+
+Intervalo = Tuple[int, int]
+
+
+def para_minutos(hora: time) -> int:
+    """Converte time em minutos desde 00:00"""
+    return hora.hour * 60 + hora.minute
+
+
+def para_time(minutos: int) -> time:
+    """Converte minutos desde 00:00 em time"""
+    return time(minutos // 60, minutos % 60)
+
+
+def rotulo(minutos: int) -> str:
+    """Formata minutos como HH:MM"""
+    return ROTULOS[minutos]
+
+
+def mesclar_intervalos(intervalos: Iterable[Intervalo]) -> List[Intervalo]:
+    """Ordena e funde intervalos [inicio, fim) sobrepostos ou encostados"""
+    mesclados: List[Intervalo] = []
+    for inicio, fim in sorted(intervalos):
+        if mesclados and inicio <= mesclados[-1][1]:
+            if fim > mesclados[-1][1]:
+                mesclados[-1] = (mesclados[-1][0], fim)
+        else:
+            mesclados.append((inicio, fim))
+    return mesclados
+
+
+def bloqueios_do_dia(ocupados: Iterable[Intervalo], intervalo_entre_clientes: int) -> List[Intervalo]:
+    """Expande cada agendamento com o intervalo de limpeza antes e depois"""
+    return mesclar_intervalos(
+        (inicio - intervalo_entre_clientes, fim + intervalo_entre_clientes)
+        for inicio, fim in ocupados
+    )
+
+
+def horarios_livres(abertura: int, fechamento: int, ocupados: Iterable[Intervalo],
+                    duracao: int, intervalo_entre_clientes: int = 0,
+                    passo: int = PASSO_MINUTOS, a_partir_de: Optional[int] = None) -> List[int]:
+    """
+    Retorna os inícios (em minutos) onde o procedimento cabe sem conflito
+
+    Args:
+        abertura, fechamento: Horário de funcionamento em minutos
+        ocupados: Intervalos [inicio, fim) dos agendamentos confirmados
+        duracao: Duração do procedimento em minutos
+        intervalo_entre_clientes: Buffer exigido entre dois atendimentos
+        passo: Granularidade da grade a partir da abertura
+        a_partir_de: Descarta inícios anteriores a este minuto (ex.: hoje)
+    """
+    bloqueios = bloqueios_do_dia(ocupados, intervalo_entre_clientes)
+
+    primeiro = abertura
+    if a_partir_de is not None and a_partir_de > abertura:
+        primeiro = abertura + -(-(a_partir_de - abertura) // passo) * passo
+
+    livres = []
+    i = 0
+    for inicio in range(primeiro, fechamento - duracao + 1, passo):
+        fim = inicio + duracao
+        # Bloqueios que terminam antes deste início nunca mais importam (grade é crescente)
+        while i < len(bloqueios) and bloqueios[i][1] <= inicio:
+            i += 1
+        if i < len(bloqueios) and bloqueios[i][0] < fim:
+            continue
+        livres.append(inicio)
+    return livres
+
+
+def cabe_no_dia(abertura: int, fechamento: int, ocupados: Iterable[Intervalo],
+                inicio: int, duracao: int, intervalo_entre_clientes: int = 0) -> bool:
+    """Verifica se um início específico cabe no expediente sem conflitar com os agendamentos"""
+    fim = inicio + duracao
+    if inicio < abertura or fim > fechamento:
+        return False
+    return all(
+        fim <= b_inicio or inicio >= b_fim
+        for b_inicio, b_fim in bloqueios_do_dia(ocupados, intervalo_entre_clientes)
+    )
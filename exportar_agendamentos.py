@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Exporta agendamentos em NDJSON ou CSV (conciliação de fim de mês)
+
+Uso:
+    python exportar_agendamentos.py --formato csv --inicio 01/02/2026 --fim 28/02/2026 -o fevereiro.csv
+    python exportar_agendamentos.py --profissional 1 --status confirmado,concluido > agenda.ndjson
+
+Lê com cursor do servidor, então a memória fica constante independente do volume.
+Certifique-se que DATABASE_URL está configurada no .env
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente antes de importar o acesso ao banco
+load_dotenv()
+
+from agenda_manager_db import AgendaManagerDB, FORMATOS_EXPORTACAO
+
+
+def ler_data(valor):
+    try:
+        return datetime.strptime(valor, '%d/%m/%Y').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError('use o formato DD/MM/YYYY')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta agendamentos em fluxo")
+    parser.add_argument('--formato', choices=FORMATOS_EXPORTACAO, default='ndjson')
+    parser.add_argument('--profissional', type=int, help='ID da profissional (padrão: todas)')
+    parser.add_argument('--inicio', type=ler_data, help='Data inicial DD/MM/YYYY (inclusiva)')
+    parser.add_argument('--fim', type=ler_data, help='Data final DD/MM/YYYY (inclusiva)')
+    parser.add_argument('--status', help='Status separados por vírgula (ex.: confirmado,concluido)')
+    parser.add_argument('-o', '--saida', help='Arquivo de saída (padrão: stdout)')
+    args = parser.parse_args()
+
+    status = [s.strip() for s in (args.status or '').split(',') if s.strip()] or None
+
+    try:
+        blocos = AgendaManagerDB().exportar_agendamentos(
+            args.formato,
+            prof_id=args.profissional,
+            data_inicio=args.inicio,
+            data_fim=args.fim,
+            status=status
+        )
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+
+    saida = open(args.saida, 'w', encoding='utf-8', newline='') if args.saida else sys.stdout
+    try:
+        for bloco in blocos:
+            saida.write(bloco)
+    finally:
+        if args.saida:
+            saida.close()
+            print(f"✅ Exportação salva em {args.saida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+Manutenção das partições mensais de agendamentos
+
+Uso:
+    python manutencao_particoes.py            # executa tudo
+    python manutencao_particoes.py --simular  # só mostra o que faria
+
+Rode diariamente (cron, agendador da plataforma ou release do Procfile):
+    1. cria as partições dos próximos PARTICOES_MESES_FUTUROS meses
+    2. move cancelados com mais de ARQUIVAR_CANCELADOS_APOS_DIAS dias para arquivo.agendamentos_cancelados
+    3. desanexa as partições mais antigas que PARTICOES_RETENCAO_MESES e as move para o schema arquivo
+
+Idempotente. Enquanto a migração 002 (manual) não foi aplicada a tabela não é
+particionada: o script avisa e sai sem erro, para não quebrar o release.
+
+Certifique-se que DATABASE_URL está configurada no .env
+"""
+
+import argparse
+import os
+import re
+import sys
+from datetime import date
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente antes de importar o acesso ao banco
+load_dotenv()
+
+from sqlalchemy import text
+from database import engine
+
+PARTICOES_MESES_FUTUROS = int(os.getenv('PARTICOES_MESES_FUTUROS', '3'))
+PARTICOES_RETENCAO_MESES = int(os.getenv('PARTICOES_RETENCAO_MESES', '24'))
+ARQUIVAR_CANCELADOS_APOS_DIAS = int(os.getenv('ARQUIVAR_CANCELADOS_APOS_DIAS', '30'))
+
+# Chave do advisory lock: duas execuções simultâneas não disputam o mesmo DDL
+CHAVE_LOCK_MANUTENCAO = 7_202_402
+
+PADRAO_PARTICAO = re.compile(r'^agendamentos_(\d{4})_(\d{2})$')
+
+SQL_PARTICIONADA = text("""
+    SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('agendamentos')
+""")
+
+SQL_PARTICOES = text("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'agendamentos'::regclass
+""")
+
+
+def somar_meses(mes: date, meses: int) -> date:
+    """Primeiro dia do mês deslocado (meses pode ser negativo)"""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def esta_particionada(conn) -> bool:
+    """True se agendamentos já é a tabela particionada da migração 002"""
+    return bool(conn.execute(SQL_PARTICIONADA).scalar())
+
+
+def listar_particoes(conn) -> List[Tuple[date, str]]:
+    """[(primeiro dia do mês, nome)] das partições mensais anexadas, em ordem"""
+    particoes = []
+    for (nome,) in conn.execute(SQL_PARTICOES):
+        encontrado = PADRAO_PARTICAO.match(nome)
+        if encontrado:
+            particoes.append((date(int(encontrado.group(1)), int(encontrado.group(2)), 1), nome))
+    return sorted(particoes)
+
+
+def criar_particoes_futuras(conn, hoje: date, meses: int = PARTICOES_MESES_FUTUROS,
+                            simular: bool = False) -> List[str]:
+    """Garante partições do mês atual até `meses` à frente; retorna as criadas"""
+    existentes = {mes for mes, _ in listar_particoes(conn)}
+    criadas = []
+    for deslocamento in range(meses + 1):
+        mes = somar_meses(hoje.replace(day=1), deslocamento)
+        if mes in existentes:
+            continue
+        if not simular:
+            conn.execute(text("SELECT criar_particao_agendamentos(:mes)"), {'mes': mes})
+        criadas.append(f"agendamentos_{mes:%Y_%m}")
+    return criadas
+
+
+def arquivar_cancelados(conn, hoje: date, dias: int = ARQUIVAR_CANCELADOS_APOS_DIAS,
+                        simular: bool = False) -> int:
+    """Move cancelados antigos para arquivo.agendamentos_cancelados; retorna quantos"""
+    parametros = {'limite': date.fromordinal(hoje.toordinal() - dias)}
+    if simular:
+        return conn.execute(text(
+            "SELECT count(*) FROM agendamentos WHERE status = 'cancelado' AND data_agendamento < :limite"
+        ), parametros).scalar()
+    return conn.execute(text("""
+        WITH movidos AS (
+            DELETE FROM agendamentos
+            WHERE status = 'cancelado' AND data_agendamento < :limite
+            RETURNING *
+        )
+        INSERT INTO arquivo.agendamentos_cancelados SELECT * FROM movidos
+    """), parametros).rowcount
+
+
+def desanexar_particoes_antigas(conn, hoje: date, retencao_meses: int = PARTICOES_RETENCAO_MESES,
+                                simular: bool = False) -> List[str]:
+    """
+    Desanexa partições que terminaram antes da janela de retenção
+
+    A partição vira uma tabela comum no schema arquivo (dados preservados, fora das
+    consultas da aplicação). DETACH ... CONCURRENTLY não é usado porque a tabela tem
+    partição padrão; o bloqueio é curto (só catálogo).
+    """
+    inicio_janela = somar_meses(hoje.replace(day=1), -retencao_meses)
+    desanexadas = []
+    for mes, nome in listar_particoes(conn):
+        if somar_meses(mes, 1) > inicio_janela:
+            break
+        if not simular:
+            conn.execute(text(f'ALTER TABLE agendamentos DETACH PARTITION "{nome}"'))
+            conn.execute(text(f'ALTER TABLE "{nome}" SET SCHEMA arquivo'))
+        desanexadas.append(nome)
+    return desanexadas
+
+
+def executar_manutencao(hoje: date = None, simular: bool = False) -> Optional[dict]:
+    """Roda as três etapas numa transação; retorna o resumo (None se a tabela não é particionada)"""
+    hoje = hoje or date.today()
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {'chave': CHAVE_LOCK_MANUTENCAO})
+        if not esta_particionada(conn):
+            return None
+        return {
+            'particoes_criadas': criar_particoes_futuras(conn, hoje, simular=simular),
+            'cancelados_arquivados': arquivar_cancelados(conn, hoje, simular=simular),
+            'particoes_desanexadas': desanexar_particoes_antigas(conn, hoje, simular=simular),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção das partições de agendamentos")
+    parser.add_argument('--simular', action='store_true', help='Só mostra o que seria feito')
+    args = parser.parse_args()
+
+    try:
+        resumo = executar_manutencao(simular=args.simular)
+    except Exception as e:
+        print(f"❌ Erro na manutenção das partições: {e}")
+        sys.exit(1)
+
+    if resumo is None:
+        print("⏸️  agendamentos ainda não é particionada: nada a fazer")
+        print("   Para particionar, aplique a migração 002: python migrar.py --incluir-manuais")
+        return
+
+    prefixo = "🔎 (simulação) " if args.simular else "✅ "
+    print(f"{prefixo}Partições criadas: {', '.join(resumo['particoes_criadas']) or 'nenhuma'}")
+    print(f"{prefixo}Cancelados arquivados: {resumo['cancelados_arquivados']}")
+    print(f"{prefixo}Partições desanexadas: {', '.join(resumo['particoes_desanexadas']) or 'nenhuma'}")
+
+
+if __name__ == "__main__":
+    main()
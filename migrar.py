@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Aplica as migrações versionadas de migrations/ no PostgreSQL
+
+Uso:
+    python migrar.py                     # aplica as pendentes, em ordem
+    python migrar.py --status            # lista aplicadas e pendentes
+    python migrar.py --incluir-manuais   # também aplica as manuais (janela de manutenção)
+
+Arquivos seguem o padrão NNN_descricao.sql e cada um roda uma única vez
+(registrado em schema_migracoes). Um arquivo com a linha "-- migrar: sem-transacao"
+roda em autocommit, um comando por vez: é o caso de CREATE INDEX CONCURRENTLY,
+que não pode rodar dentro de transação.
+
+Um arquivo com a linha "-- migrar: manual" (reescrita de tabela, bloqueio longo)
+só roda com --incluir-manuais; sem a opção o migrar.py para antes dele, avisa e
+não aplica as seguintes (a ordem das versões é mantida).
+
+Certifique-se que DATABASE_URL está configurada no .env
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente antes de importar o acesso ao banco
+load_dotenv()
+
+from sqlalchemy import text
+from database import engine
+
+PASTA_MIGRACOES = Path(__file__).resolve().parent / 'migrations'
+PADRAO_ARQUIVO = re.compile(r'^(\d{3})_[a-z0-9_]+\.sql$')
+MARCA_SEM_TRANSACAO = '-- migrar: sem-transacao'
+MARCA_MANUAL = '-- migrar: manual'
+
+# Chave do advisory lock: dois deploys simultâneos não aplicam a mesma migração
+CHAVE_LOCK_MIGRACOES = 7_202_401
+
+SQL_TABELA_MIGRACOES = text("""
+    CREATE TABLE IF NOT EXISTS schema_migracoes (
+        versao INTEGER PRIMARY KEY,
+        nome VARCHAR(255) NOT NULL,
+        aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+""")
+
+
+def listar_migracoes():
+    """[(versao, caminho)] ordenado; falha se houver versão repetida"""
+    migracoes = {}
+    for caminho in sorted(PASTA_MIGRACOES.glob('*.sql')):
+        encontrado = PADRAO_ARQUIVO.match(caminho.name)
+        if not encontrado:
+            raise ValueError(f"Nome de migração fora do padrão NNN_descricao.sql: {caminho.name}")
+        versao = int(encontrado.group(1))
+        if versao in migracoes:
+            raise ValueError(f"Versão {versao:03d} repetida: {migracoes[versao].name} e {caminho.name}")
+        migracoes[versao] = caminho
+    return sorted(migracoes.items())
+
+
+def dividir_comandos(sql):
+    """Separa comandos terminados em ';' no fim da linha (sem blocos DO $$ nos arquivos sem transação)"""
+    comandos, atual = [], []
+    for linha in sql.splitlines():
+        if not atual and (not linha.strip() or linha.strip().startswith('--')):
+            continue
+        atual.append(linha)
+        if linha.rstrip().endswith(';'):
+            comandos.append('\n'.join(atual))
+            atual = []
+    if any(l.strip() and not l.strip().startswith('--') for l in atual):
+        comandos.append('\n'.join(atual))
+    return comandos
+
+
+def aplicar(caminho, versao):
+    """Roda o arquivo e registra a versão (na mesma transação, quando há transação)"""
+    sql = caminho.read_text(encoding='utf-8')
+    # no_parameters: o SQL vai cru ao driver, sem interpretar '%' (format() do plpgsql)
+    if MARCA_SEM_TRANSACAO in sql:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for comando in dividir_comandos(sql):
+                conn.execution_options(no_parameters=True).exec_driver_sql(comando)
+            registrar(conn, versao, caminho.name)
+    else:
+        with engine.begin() as conn:
+            conn.execution_options(no_parameters=True).exec_driver_sql(sql)
+            registrar(conn, versao, caminho.name)
+
+
+def registrar(conn, versao, nome):
+    conn.execute(
+        text("INSERT INTO schema_migracoes (versao, nome) VALUES (:versao, :nome)"),
+        {'versao': versao, 'nome': nome}
+    )
+
+
+def eh_manual(caminho):
+    return MARCA_MANUAL in caminho.read_text(encoding='utf-8')
+
+
+def aplicar_pendentes(somente_status=False, incluir_manuais=False):
+    """
+    Aplica as migrações pendentes em ordem (também chamado pelo setup_db.py)
+
+    Args:
+        incluir_manuais: aplica também as marcadas "-- migrar: manual"; sem isso
+            para antes da primeira delas
+
+    Returns:
+        False se alguma migração falhou (ou, em --status, se há pendentes)
+    """
+    migracoes = listar_migracoes()
+
+    # Conexão só para o lock (de sessão): cada migração usa a sua
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(SQL_TABELA_MIGRACOES)
+        conn.execute(text("SELECT pg_advisory_lock(:chave)"), {'chave': CHAVE_LOCK_MIGRACOES})
+        try:
+            aplicadas = {v for (v,) in conn.execute(text("SELECT versao FROM schema_migracoes"))}
+            pendentes = [(v, c) for v, c in migracoes if v not in aplicadas]
+
+            if somente_status:
+                for versao, caminho in migracoes:
+                    manual = " (manual)" if versao not in aplicadas and eh_manual(caminho) else ""
+                    print(f"{'✅' if versao in aplicadas else '⏳'} {caminho.name}{manual}")
+                return not pendentes
+
+            if not pendentes:
+                print("✅ Banco atualizado, nenhuma migração pendente")
+                return True
+
+            for versao, caminho in pendentes:
+                if not incluir_manuais and eh_manual(caminho):
+                    print(f"⏸️  {caminho.name} é manual e não foi aplicada (nem as seguintes)")
+                    print("   Aplique numa janela de manutenção: python migrar.py --incluir-manuais")
+                    return True
+                print(f"🔄 Aplicando {caminho.name}...")
+                try:
+                    aplicar(caminho, versao)
+                except Exception as e:
+                    print(f"❌ Falha em {caminho.name}: {e}")
+                    print("   Índices CONCURRENTLY interrompidos ficam INVALID: remova-os antes de rodar de novo")
+                    return False
+                print(f"✅ {caminho.name}")
+            return True
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {'chave': CHAVE_LOCK_MIGRACOES})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrações do banco da Agenda App")
+    parser.add_argument('--status', action='store_true', help='Só lista aplicadas e pendentes')
+    parser.add_argument('--incluir-manuais', action='store_true',
+                        help='Aplica também as migrações manuais (bloqueiam tabelas)')
+    args = parser.parse_args()
+
+    try:
+        atualizado = aplicar_pendentes(somente_status=args.status, incluir_manuais=args.incluir_manuais)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if not atualizado and not args.status:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+-- Impede agendamentos confirmados sobrepostos para a mesma profissional
+-- (o intervalo entre clientes é validado pela aplicação sob advisory lock; esta é a rede
+-- de segurança no banco). Antes vivia só no schema.sql; bancos criados por setup_db.py
+-- (create_all) ficavam sem ela.
+--
+-- Sobreposições já gravadas impediriam a constraint: o agendamento confirmado mais
+-- recente de cada conflito vai para arquivo.agendamentos_sobrepostos (para conferência
+-- manual) e o mais antigo permanece.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE SCHEMA IF NOT EXISTS arquivo;
+CREATE TABLE IF NOT EXISTS arquivo.agendamentos_sobrepostos (LIKE agendamentos);
+
+DO $$
+DECLARE
+    movidos INTEGER;
+BEGIN
+    -- Tabela já particionada (migração 002) ou constraint criada pelo schema.sql: nada a fazer
+    IF (SELECT relkind FROM pg_class WHERE oid = 'agendamentos'::regclass) <> 'r'
+       OR EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'agendamentos_sem_sobreposicao') THEN
+        RETURN;
+    END IF;
+
+    WITH sobrepostos AS (
+        DELETE FROM agendamentos a
+        WHERE a.status = 'confirmado'
+        AND EXISTS (
+            SELECT 1 FROM agendamentos b
+            WHERE b.profissional_id = a.profissional_id
+            AND b.data_agendamento = a.data_agendamento
+            AND b.status = 'confirmado'
+            AND b.id < a.id
+            AND tsrange(b.data_agendamento + b.hora_inicio,
+                        b.data_agendamento + COALESCE(b.hora_fim, b.hora_inicio + INTERVAL '30 minutes'))
+             && tsrange(a.data_agendamento + a.hora_inicio,
+                        a.data_agendamento + COALESCE(a.hora_fim, a.hora_inicio + INTERVAL '30 minutes'))
+        )
+        RETURNING a.*
+    )
+    INSERT INTO arquivo.agendamentos_sobrepostos SELECT * FROM sobrepostos;
+    GET DIAGNOSTICS movidos = ROW_COUNT;
+    IF movidos > 0 THEN
+        RAISE WARNING '% agendamento(s) confirmado(s) sobreposto(s) movido(s) para arquivo.agendamentos_sobrepostos', movidos;
+    END IF;
+
+    ALTER TABLE agendamentos ADD CONSTRAINT agendamentos_sem_sobreposicao EXCLUDE USING gist (
+        profissional_id WITH =,
+        tsrange(
+            data_agendamento + hora_inicio,
+            data_agendamento + COALESCE(hora_fim, hora_inicio + INTERVAL '30 minutes')
+        ) WITH &&
+    ) WHERE (status = 'confirmado');
+END $$;
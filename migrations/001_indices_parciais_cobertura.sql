@@ -0,0 +1,31 @@
+-- migrar: sem-transacao
+-- Índices parciais e de cobertura para as consultas quentes de agendamentos
+-- CONCURRENTLY não bloqueia reservas durante a criação (por isso roda fora de transação)
+
+-- Horários livres do dia, checagem de conflito na reserva e mapa de calor do mês:
+-- só confirmados, e as colunas lidas (hora_inicio, hora_fim, procedimento_id) ficam no
+-- próprio índice, permitindo index-only scan
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamentos_confirmados_dia
+    ON agendamentos (profissional_id, data_agendamento)
+    INCLUDE (hora_inicio, hora_fim, procedimento_id)
+    WHERE status = 'confirmado';
+
+-- Listagem paginada por chave: WHERE profissional_id = ? AND (data, hora, id) > cursor
+-- ORDER BY data, hora, id LIMIT n sai na ordem do índice, sem sort
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamentos_profissional_keyset
+    ON agendamentos (profissional_id, data_agendamento, hora_inicio, id);
+
+-- Agendamentos de um cliente pelo telefone (atendimento e WhatsApp), mais recentes primeiro
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamentos_cliente_telefone
+    ON agendamentos (cliente_telefone, data_agendamento DESC);
+
+-- Dashboard (contagem por profissional e status). Está no schema.sql, mas bancos
+-- criados antes dele podem não ter: garante o índice antes de remover os substituídos
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamentos_profissional_status
+    ON agendamentos (profissional_id, status);
+
+-- Substituídos: status sozinho tem três valores e o planejador nunca o escolhe (só
+-- custa nas escritas); (profissional_id, data_agendamento) é prefixo do índice de keyset.
+-- O dashboard continua em idx_agendamentos_profissional_status, que já cobre o GROUP BY.
+DROP INDEX CONCURRENTLY IF EXISTS idx_agendamentos_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_agendamentos_profissional_data;
@@ -0,0 +1,210 @@
+-- migrar: manual
+-- Particiona agendamentos por mês de data_agendamento
+-- Roda numa única transação: a tabela fica bloqueada durante a cópia. Por isso é
+-- manual: o python migrar.py do dia a dia para antes dela; aplique numa janela de
+-- pouco movimento com python migrar.py --incluir-manuais (ver DEPLOYMENT_CHECKLIST.md).
+-- Depois, python manutencao_particoes.py mantém as partições futuras e arquiva as antigas.
+--
+-- Consequências do particionamento no PostgreSQL:
+--   * a chave de partição entra na PK e no UNIQUE do código: (id, data_agendamento) e
+--     (codigo_agendamento, data_agendamento). O código continua praticamente único
+--     (tempo + aleatório); a sequência de id é a mesma de antes
+--   * mensagens_whatsapp.agendamento_id deixa de ter FK no banco (uma FK exigiria a data)
+--   * a constraint de exclusão existe em cada partição; todas levam o prefixo
+--     agendamentos_sem_sobreposicao, que é o que a aplicação procura no erro
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE SCHEMA IF NOT EXISTS arquivo;
+
+ALTER TABLE mensagens_whatsapp DROP CONSTRAINT IF EXISTS mensagens_whatsapp_agendamento_id_fkey;
+DROP VIEW IF EXISTS v_agendamentos_proximos;
+DROP VIEW IF EXISTS v_disponibilidade_profissionais;
+
+ALTER TABLE agendamentos RENAME TO agendamentos_legado;
+ALTER SEQUENCE agendamentos_id_seq OWNED BY NONE;
+
+CREATE TABLE agendamentos (
+    id INTEGER NOT NULL DEFAULT nextval('agendamentos_id_seq'),
+    codigo_agendamento VARCHAR(20) NOT NULL,
+    profissional_id INTEGER NOT NULL REFERENCES profissionais(id) ON DELETE CASCADE,
+    procedimento_id INTEGER NOT NULL REFERENCES procedimentos(id) ON DELETE CASCADE,
+    cliente_nome VARCHAR(255) NOT NULL,
+    cliente_telefone VARCHAR(20) NOT NULL,
+    cliente_email VARCHAR(255),
+    data_agendamento DATE NOT NULL,
+    hora_inicio TIME NOT NULL,
+    hora_fim TIME,
+    status VARCHAR(50) DEFAULT 'confirmado',
+    notas TEXT,
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (data_agendamento);
+
+ALTER SEQUENCE agendamentos_id_seq OWNED BY agendamentos.id;
+
+-- Datas sem partição mensal (muito à frente, por exemplo) caem aqui
+CREATE TABLE agendamentos_padrao PARTITION OF agendamentos DEFAULT;
+ALTER TABLE agendamentos_padrao ADD CONSTRAINT agendamentos_sem_sobreposicao_padrao EXCLUDE USING gist (
+    profissional_id WITH =,
+    tsrange(
+        data_agendamento + hora_inicio,
+        data_agendamento + COALESCE(hora_fim, hora_inicio + INTERVAL '30 minutes')
+    ) WITH &&
+) WHERE (status = 'confirmado');
+
+-- Cria a partição do mês (idempotente). Linhas do mês que estejam na partição padrão
+-- são movidas para a nova antes do ATTACH, que do contrário falharia.
+CREATE OR REPLACE FUNCTION criar_particao_agendamentos(mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes)::date;
+    fim DATE := (date_trunc('month', mes) + INTERVAL '1 month')::date;
+    nome TEXT := 'agendamentos_' || to_char(mes, 'YYYY_MM');
+BEGIN
+    IF to_regclass(nome) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE agendamentos INCLUDING DEFAULTS)', nome);
+    EXECUTE format(
+        'WITH movidos AS (DELETE FROM agendamentos_padrao '
+        'WHERE data_agendamento >= %L AND data_agendamento < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM movidos',
+        inicio, fim, nome
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist ('
+        'profissional_id WITH =, '
+        'tsrange(data_agendamento + hora_inicio, '
+        'data_agendamento + COALESCE(hora_fim, hora_inicio + INTERVAL ''30 minutes'')) WITH &&'
+        ') WHERE (status = ''confirmado'')',
+        nome, 'agendamentos_sem_sobreposicao_' || to_char(mes, 'YYYY_MM')
+    );
+    -- O CHECK igual ao intervalo evita que o ATTACH varra a partição; depois ele sobra
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I CHECK (data_agendamento >= %L AND data_agendamento < %L)',
+        nome, nome || '_intervalo', inicio, fim
+    );
+    EXECUTE format('ALTER TABLE agendamentos ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', nome, inicio, fim);
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', nome, nome || '_intervalo');
+    RETURN nome;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Janela quente: 24 meses para trás até 3 meses à frente
+-- (os mesmos padrões de PARTICOES_RETENCAO_MESES e PARTICOES_MESES_FUTUROS)
+DO $$
+DECLARE
+    mes DATE;
+BEGIN
+    FOR mes IN
+        SELECT generate_series(
+            GREATEST(
+                date_trunc('month', CURRENT_DATE) - INTERVAL '24 months',
+                date_trunc('month', COALESCE((SELECT min(data_agendamento) FROM agendamentos_legado), CURRENT_DATE))
+            ),
+            date_trunc('month', CURRENT_DATE) + INTERVAL '3 months',
+            INTERVAL '1 month'
+        )::date
+    LOOP
+        PERFORM criar_particao_agendamentos(mes);
+    END LOOP;
+END $$;
+
+-- As partições têm a constraint de exclusão: sobreposições gravadas antes dela (banco
+-- em que a migração 000 não rodou) abortariam a cópia. Como na 000, o confirmado mais
+-- recente de cada conflito vai para arquivo.agendamentos_sobrepostos
+CREATE TABLE IF NOT EXISTS arquivo.agendamentos_sobrepostos (LIKE agendamentos_legado);
+
+DO $$
+DECLARE
+    movidos INTEGER;
+BEGIN
+    WITH sobrepostos AS (
+        DELETE FROM agendamentos_legado a
+        WHERE a.status = 'confirmado'
+        AND EXISTS (
+            SELECT 1 FROM agendamentos_legado b
+            WHERE b.profissional_id = a.profissional_id
+            AND b.data_agendamento = a.data_agendamento
+            AND b.status = 'confirmado'
+            AND b.id < a.id
+            AND tsrange(b.data_agendamento + b.hora_inicio,
+                        b.data_agendamento + COALESCE(b.hora_fim, b.hora_inicio + INTERVAL '30 minutes'))
+             && tsrange(a.data_agendamento + a.hora_inicio,
+                        a.data_agendamento + COALESCE(a.hora_fim, a.hora_inicio + INTERVAL '30 minutes'))
+        )
+        RETURNING a.*
+    )
+    INSERT INTO arquivo.agendamentos_sobrepostos SELECT * FROM sobrepostos;
+    GET DIAGNOSTICS movidos = ROW_COUNT;
+    IF movidos > 0 THEN
+        RAISE WARNING '% agendamento(s) confirmado(s) sobreposto(s) movido(s) para arquivo.agendamentos_sobrepostos', movidos;
+    END IF;
+END $$;
+
+-- Histórico anterior à janela vai direto para o arquivo
+CREATE TABLE arquivo.agendamentos_historico (LIKE agendamentos_legado);
+INSERT INTO arquivo.agendamentos_historico
+SELECT * FROM agendamentos_legado
+WHERE data_agendamento < date_trunc('month', CURRENT_DATE) - INTERVAL '24 months';
+
+INSERT INTO agendamentos (
+    id, codigo_agendamento, profissional_id, procedimento_id, cliente_nome, cliente_telefone,
+    cliente_email, data_agendamento, hora_inicio, hora_fim, status, notas, criado_em, atualizado_em
+)
+SELECT
+    id, codigo_agendamento, profissional_id, procedimento_id, cliente_nome, cliente_telefone,
+    cliente_email, data_agendamento, hora_inicio, hora_fim, status, notas, criado_em, atualizado_em
+FROM agendamentos_legado
+WHERE data_agendamento >= date_trunc('month', CURRENT_DATE) - INTERVAL '24 months';
+
+-- Sem CASCADE: qualquer dependência não prevista aborta a migração inteira
+DROP TABLE agendamentos_legado;
+
+-- Chaves e índices no pai valem para todas as partições (atuais e futuras)
+ALTER TABLE agendamentos ADD CONSTRAINT agendamentos_pkey PRIMARY KEY (id, data_agendamento);
+ALTER TABLE agendamentos ADD CONSTRAINT agendamentos_codigo_agendamento_key UNIQUE (codigo_agendamento, data_agendamento);
+CREATE INDEX idx_agendamentos_profissional_status ON agendamentos (profissional_id, status);
+CREATE INDEX idx_agendamentos_confirmados_dia
+    ON agendamentos (profissional_id, data_agendamento)
+    INCLUDE (hora_inicio, hora_fim, procedimento_id)
+    WHERE status = 'confirmado';
+CREATE INDEX idx_agendamentos_profissional_keyset
+    ON agendamentos (profissional_id, data_agendamento, hora_inicio, id);
+CREATE INDEX idx_agendamentos_cliente_telefone
+    ON agendamentos (cliente_telefone, data_agendamento DESC);
+
+-- Cancelados antigos saem da tabela quente (manutencao_particoes.py)
+CREATE TABLE arquivo.agendamentos_cancelados (LIKE agendamentos);
+ALTER TABLE arquivo.agendamentos_cancelados ADD COLUMN arquivado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Views recriadas sobre a tabela nova; o filtro por intervalo de datas permite poda de partições
+CREATE VIEW v_agendamentos_proximos AS
+SELECT
+    a.id,
+    a.codigo_agendamento,
+    p.nome as profissional,
+    pr.nome as procedimento,
+    a.cliente_nome,
+    a.cliente_telefone,
+    a.data_agendamento,
+    a.hora_inicio,
+    a.status
+FROM agendamentos a
+JOIN profissionais p ON a.profissional_id = p.id
+JOIN procedimentos pr ON a.procedimento_id = pr.id
+WHERE a.data_agendamento >= CURRENT_DATE
+AND a.status = 'confirmado'
+ORDER BY a.data_agendamento, a.hora_inicio;
+
+CREATE VIEW v_disponibilidade_profissionais AS
+SELECT
+    p.id,
+    p.nome,
+    COUNT(a.id) as total_agendamentos_mes,
+    COUNT(CASE WHEN a.status = 'confirmado' THEN 1 END) as agendamentos_confirmados
+FROM profissionais p
+LEFT JOIN agendamentos a ON p.id = a.profissional_id
+AND a.data_agendamento >= date_trunc('month', CURRENT_DATE)
+AND a.data_agendamento < date_trunc('month', CURRENT_DATE) + INTERVAL '1 month'
+GROUP BY p.id, p.nome;
@@ -0,0 +1,137 @@
+"""
+Monitor de Saúde do Banco
+Uma thread por processo verifica o banco em intervalo fixo; o health check só lê o último resultado
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Optional
+
+from database import estatisticas_pool, sondar_banco
+from resiliencia import disjuntor, eh_transitorio
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre verificações (o load balancer pode sondar bem mais vezes que isso)
+INTERVALO_VERIFICACAO_SEGUNDOS = float(os.getenv('HEALTH_INTERVALO_SEGUNDOS', '5'))
+
+# Resultado mais velho que N intervalos indica que o monitor travou: não está pronto
+INTERVALOS_ATE_OBSOLETO = 3
+
+# Fração do pool (base + overflow) em uso a partir da qual a instância não aceita tráfego novo
+LIMITE_SATURACAO_POOL = float(os.getenv('HEALTH_LIMITE_SATURACAO_POOL', '0.9'))
+
+
+@dataclass(frozen=True)
+class ResultadoSaude:
+    """Última verificação do banco (imutável: trocada inteira a cada ciclo)"""
+
+    banco_ok: bool
+    latencia_ms: float
+    saturacao_pool: float
+    timeouts_pool: int
+    verificado_em: float      # epoch
+    erro: Optional[str] = None
+
+    def idade_segundos(self) -> float:
+        return time.time() - self.verificado_em
+
+    def para_dict(self) -> dict:
+        dados = asdict(self)
+        dados['verificado_em'] = datetime.fromtimestamp(self.verificado_em).isoformat()
+        dados['idade_segundos'] = round(self.idade_segundos(), 3)
+        return dados
+
+
+class MonitorBanco:
+    """Verifica liveness do banco e saturação do pool em segundo plano"""
+
+    def __init__(self, intervalo: float = INTERVALO_VERIFICACAO_SEGUNDOS):
+        self.intervalo = intervalo
+        self._resultado: Optional[ResultadoSaude] = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def iniciar(self) -> None:
+        """Inicia a thread (idempotente; reinicia após fork do gunicorn, que não copia threads)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, name='monitor-banco', daemon=True)
+            self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+
+    def ultimo(self) -> ResultadoSaude:
+        """Último resultado; só bloqueia na primeira chamada, antes da primeira verificação"""
+        resultado = self._resultado
+        if resultado is None:
+            resultado = self.verificar()
+        return resultado
+
+    def pronto(self, resultado: ResultadoSaude) -> bool:
+        """Readiness: banco respondeu, resultado recente e pool com folga"""
+        return (
+            resultado.banco_ok
+            and resultado.idade_segundos() < self.intervalo * INTERVALOS_ATE_OBSOLETO
+            and resultado.saturacao_pool < LIMITE_SATURACAO_POOL
+        )
+
+    def verificar(self) -> ResultadoSaude:
+        """Executa uma verificação agora e publica o resultado"""
+        inicio = time.perf_counter()
+        falha = None
+        try:
+            sondar_banco()
+        except Exception as e:
+            falha = e
+        latencia = (time.perf_counter() - inicio) * 1000
+        banco_ok = falha is None
+
+        pool = estatisticas_pool()['primario']
+        capacidade = pool.get('tamanho', 0) + pool.get('max_overflow', 0)
+        saturacao = pool.get('em_uso', 0) / capacidade if capacidade else 0.0
+
+        resultado = ResultadoSaude(
+            banco_ok=banco_ok,
+            latencia_ms=round(latencia, 2),
+            saturacao_pool=round(saturacao, 3),
+            timeouts_pool=pool['timeouts'],
+            verificado_em=time.time(),
+            erro=None if banco_ok else f"{type(falha).__name__}: {falha}",
+        )
+        # Alimenta o circuit breaker com a mesma classificação do retry: o monitor fecha
+        # o circuito assim que o banco volta, mas só abre por falha transitória do banco.
+        # Timeout do pool (instância saturada) não diz nada sobre o banco.
+        if banco_ok:
+            disjuntor.registrar_sucesso()
+        elif eh_transitorio(falha):
+            disjuntor.registrar_falha()
+        else:
+            logger.error(f"Verificação do banco falhou: {resultado.erro}")
+
+        if self._resultado is not None and self._resultado.banco_ok != banco_ok:
+            logger.warning(f"Banco de dados {'voltou' if banco_ok else 'ficou indisponível'} "
+                           f"(latência {resultado.latencia_ms}ms)")
+        self._resultado = resultado
+        return resultado
+
+    def _executar(self) -> None:
+        while not self._parar.is_set():
+            try:
+                self.verificar()
+            except Exception as e:
+                logger.error(f"Erro no monitor do banco: {e}")
+            self._parar.wait(self.intervalo)
+
+
+# Instância única por processo
+monitor_banco = MonitorBanco()
@@ -0,0 +1,263 @@
+"""
+Política de Retry e Circuit Breaker para o Banco
+Só repete erros transitórios, com backoff com jitter limitado pelo prazo da requisição
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from sqlalchemy import exc
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 3
+
+# Backoff exponencial com jitter total: espera sorteada em [0, min(TETO, BASE * 2^n)]
+BACKOFF_BASE_SEGUNDOS = 0.1
+BACKOFF_TETO_SEGUNDOS = 1.0
+
+# Orçamento de tempo de uma requisição HTTP (retries não passam disso)
+PRAZO_REQUISICAO_SEGUNDOS = float(os.getenv('PRAZO_REQUISICAO_SEGUNDOS', '8'))
+
+# Circuit breaker: abre após N falhas transitórias seguidas e testa de novo após o resfriamento
+FALHAS_PARA_ABRIR = int(os.getenv('DISJUNTOR_FALHAS_PARA_ABRIR', '5'))
+RESFRIAMENTO_SEGUNDOS = float(os.getenv('DISJUNTOR_RESFRIAMENTO_SEGUNDOS', '10'))
+
+# SQLSTATEs do PostgreSQL que valem nova tentativa
+#   40001 serialization_failure, 40P01 deadlock_detected,
+#   57P01 admin_shutdown, 57P02 crash_shutdown, 57P03 cannot_connect_now (cold start do Neon),
+#   53300 too_many_connections, classe 08 (connection_exception)
+SQLSTATES_TRANSITORIOS = {'40001', '40P01', '57P01', '57P02', '57P03', '53300'}
+
+
+class BancoIndisponivel(Exception):
+    """Circuito aberto: o banco está fora e a chamada falha sem tentar"""
+
+    def __init__(self, tentar_em: float):
+        super().__init__("Banco de dados temporariamente indisponível")
+        self.tentar_em = tentar_em
+
+    @property
+    def retry_after(self) -> int:
+        """Segundos até o circuito aceitar nova tentativa (para o header Retry-After)"""
+        return max(1, int(self.tentar_em - time.monotonic()) + 1)
+
+
+def eh_transitorio(erro: BaseException) -> bool:
+    """
+    Classifica o erro: conexão perdida, timeout de rede, failover ou conflito de serialização
+
+    Erros de validação, IntegrityError e erros de SQL nunca são transitórios.
+    Timeout do pool (todas as conexões em uso) também não: repetir só aumenta a fila.
+    """
+    if isinstance(erro, exc.TimeoutError):
+        return False
+    if isinstance(erro, exc.DBAPIError):
+        if erro.connection_invalidated:
+            return True
+        codigo = getattr(erro.orig, 'pgcode', None)
+        if codigo:
+            return codigo in SQLSTATES_TRANSITORIOS or codigo.startswith('08')
+        # Sem SQLSTATE: o driver falhou antes de falar com o servidor (rede, DNS, conexão recusada)
+        return isinstance(erro, (exc.OperationalError, exc.InterfaceError))
+    return isinstance(erro, exc.DisconnectionError)
+
+
+# ============================================================
+# PRAZO DA REQUISIÇÃO
+# ============================================================
+
+# Instante (monotonic) em que a requisição atual estoura o orçamento; None = sem prazo
+_prazo: ContextVar[Optional[float]] = ContextVar('prazo_requisicao', default=None)
+
+
+def iniciar_prazo(segundos: Optional[float] = PRAZO_REQUISICAO_SEGUNDOS) -> None:
+    """Define o prazo da requisição atual (chamado no before_request)"""
+    _prazo.set(time.monotonic() + segundos if segundos else None)
+
+
+def tempo_restante() -> Optional[float]:
+    """Segundos até o prazo da requisição (None se não há prazo)"""
+    prazo = _prazo.get()
+    return None if prazo is None else prazo - time.monotonic()
+
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+
+class Disjuntor:
+    """
+    Circuit breaker do banco (um por processo)
+
+    fechado: chamadas passam; falhas transitórias seguidas são contadas
+    aberto: chamadas falham na hora com BancoIndisponivel até o resfriamento
+    meio-aberto: após o resfriamento uma única chamada de teste passa;
+                 sucesso fecha o circuito, falha reabre
+    """
+
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    MEIO_ABERTO = 'meio_aberto'
+
+    def __init__(self, falhas_para_abrir: int = FALHAS_PARA_ABRIR,
+                 resfriamento: float = RESFRIAMENTO_SEGUNDOS):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.resfriamento = resfriamento
+        self._lock = threading.Lock()
+        self._estado = self.FECHADO
+        self._falhas_seguidas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_andamento = False
+        self.aberturas = 0
+        self.rejeicoes = 0
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._estado == self.ABERTO and time.monotonic() >= self._aberto_ate:
+                return self.MEIO_ABERTO
+            return self._estado
+
+    def esta_aberto(self) -> bool:
+        """True enquanto chamadas estão sendo rejeitadas (usado pelo modo degradado do cache)"""
+        return self.estado == self.ABERTO
+
+    def permitir(self) -> None:
+        """
+        Autoriza uma chamada ao banco
+
+        Raises:
+            BancoIndisponivel: circuito aberto (ou já há uma chamada de teste em andamento)
+        """
+        with self._lock:
+            if self._estado == self.FECHADO:
+                return
+            agora = time.monotonic()
+            if self._estado == self.ABERTO and agora >= self._aberto_ate:
+                self._estado = self.MEIO_ABERTO
+                self._teste_em_andamento = False
+            if self._estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return
+            self.rejeicoes += 1
+            raise BancoIndisponivel(max(self._aberto_ate, agora + 1))
+
+    def registrar_sucesso(self) -> None:
+        with self._lock:
+            if self._estado != self.FECHADO:
+                logger.info("Circuito do banco fechado: banco respondeu")
+            self._estado = self.FECHADO
+            self._falhas_seguidas = 0
+            self._teste_em_andamento = False
+
+    def liberar_teste(self) -> None:
+        """Devolve a vaga de teste do meio-aberto sem concluir nada sobre o banco"""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def registrar_falha(self) -> None:
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._estado == self.MEIO_ABERTO or self._falhas_seguidas >= self.falhas_para_abrir:
+                if self._estado != self.ABERTO:
+                    self.aberturas += 1
+                    logger.error(f"Circuito do banco aberto após {self._falhas_seguidas} falhas; "
+                                 f"novas chamadas falham por {self.resfriamento:.0f}s")
+                self._estado = self.ABERTO
+                self._aberto_ate = time.monotonic() + self.resfriamento
+                self._teste_em_andamento = False
+
+    def estatisticas(self) -> dict:
+        estado = self.estado
+        with self._lock:
+            return {
+                'estado': estado,
+                'falhas_seguidas': self._falhas_seguidas,
+                'aberturas': self.aberturas,
+                'rejeicoes': self.rejeicoes,
+            }
+
+
+# Instância única por processo
+disjuntor = Disjuntor()
+
+
+# ============================================================
+# RETRY
+# ============================================================
+
+# Já há um executar_com_retry ativo neste contexto: chamadas aninhadas (método com
+# @com_retry chamando outro) não repetem nem passam de novo pelo disjuntor
+_em_execucao: ContextVar[bool] = ContextVar('retry_em_execucao', default=False)
+
+def espera_backoff(tentativa: int) -> float:
+    """Jitter total: sorteio uniforme até o teto exponencial da tentativa"""
+    return random.uniform(0, min(BACKOFF_TETO_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * (2 ** tentativa)))
+
+
+def executar_com_retry(funcao: Callable[[], Any], max_tentativas: int = MAX_TENTATIVAS,
+                       descricao: Optional[str] = None) -> Any:
+    """
+    Executa funcao() repetindo apenas erros transitórios
+
+    Cada tentativa passa pelo circuit breaker. Não espera além do prazo da
+    requisição: se o backoff não cabe no tempo restante, o erro sobe na hora.
+    Só a chamada mais externa aplica retry e disjuntor (no meio-aberto, uma
+    chamada aninhada pediria uma segunda vaga de teste e seria rejeitada).
+
+    Raises:
+        BancoIndisponivel: circuito aberto
+    """
+    if _em_execucao.get():
+        return funcao()
+
+    token = _em_execucao.set(True)
+    try:
+        return _executar_tentativas(funcao, max_tentativas, descricao or getattr(funcao, '__name__', 'operação'))
+    finally:
+        _em_execucao.reset(token)
+
+
+def _executar_tentativas(funcao: Callable[[], Any], max_tentativas: int, descricao: str) -> Any:
+    for tentativa in range(max_tentativas):
+        disjuntor.permitir()
+        try:
+            resultado = funcao()
+        except Exception as e:
+            if not eh_transitorio(e):
+                if isinstance(e, exc.DBAPIError):
+                    # Erro permanente do banco (integridade, SQL): ele respondeu
+                    disjuntor.registrar_sucesso()
+                else:
+                    # Validação ou regra de negócio: nada se aprendeu sobre o banco
+                    disjuntor.liberar_teste()
+                raise
+            disjuntor.registrar_falha()
+
+            espera = espera_backoff(tentativa)
+            restante = tempo_restante()
+            sem_tempo = restante is not None and restante <= espera
+            if tentativa == max_tentativas - 1 or sem_tempo or disjuntor.esta_aberto():
+                logger.error(f"Falha transitória em {descricao} sem nova tentativa "
+                             f"({tentativa + 1}/{max_tentativas}): {e}")
+                raise
+            logger.warning(f"Falha transitória em {descricao} (tentativa {tentativa + 1}/{max_tentativas}): "
+                           f"{e}. Nova tentativa em {espera * 1000:.0f}ms")
+            time.sleep(espera)
+        else:
+            disjuntor.registrar_sucesso()
+            return resultado
+
+
+def com_retry(funcao):
+    """Decorator: aplica executar_com_retry ao método"""
+    @wraps(funcao)
+    def wrapper(*args, **kwargs):
+        return executar_com_retry(lambda: funcao(*args, **kwargs), descricao=funcao.__name__)
+    return wrapper
@@ -0,0 +1,51 @@
+"""
+Respostas JSON Pré-Serializadas
+Corpo codificado uma única vez (JSON + gzip + brotli) com ETag forte, pronto para cache
+"""
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+try:
+    import brotli  # dependência do Flask-Compress
+except ImportError:  # pragma: no cover - brotli é opcional
+    brotli = None
+
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+
+
+@dataclass(frozen=True)
+class RespostaPronta:
+    """Bytes finais de uma resposta JSON e suas variantes comprimidas"""
+
+    corpo: bytes
+    gzip: bytes
+    br: Optional[bytes]
+    etag: str
+
+    @classmethod
+    def de_dados(cls, dados: Any) -> 'RespostaPronta':
+        """Serializa e comprime uma vez; o ETag é o hash do JSON (forte: muda a cada byte)"""
+        corpo = json.dumps(dados, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        return cls(
+            corpo=corpo,
+            gzip=gzip.compress(corpo, compresslevel=NIVEL_GZIP, mtime=0),
+            br=brotli.compress(corpo, quality=QUALIDADE_BROTLI) if brotli else None,
+            etag=hashlib.sha256(corpo).hexdigest()[:32],
+        )
+
+    def escolher_codificacao(self, accept_encodings) -> Tuple[bytes, Optional[str]]:
+        """
+        Escolhe a variante de acordo com Accept-Encoding
+
+        Args:
+            accept_encodings: request.accept_encodings do Werkzeug (qualidade por codificação)
+        """
+        if self.br is not None and accept_encodings['br'] > 0:
+            return self.br, 'br'
+        if accept_encodings['gzip'] > 0:
+            return self.gzip, 'gzip'
+        return self.corpo, None
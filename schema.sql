@@ -32,7 +32,7 @@ CREATE TABLE IF NOT EXISTS procedimentos (
 -- Criar tabela de agendamentos
 CREATE TABLE IF NOT EXISTS agendamentos (
     id SERIAL PRIMARY KEY,
-    codigo_agendamento VARCHAR(20) UNIQUE NOT NULL, -- AG1120260210185855
+    codigo_agendamento VARCHAR(20) UNIQUE NOT NULL, -- AG0MVBKN8CL2RRLN524K (tempo base36 + aleatório)
     profissional_id INTEGER NOT NULL REFERENCES profissionais(id) ON DELETE CASCADE,
     procedimento_id INTEGER NOT NULL REFERENCES procedimentos(id) ON DELETE CASCADE,
     cliente_nome VARCHAR(255) NOT NULL,
@@ -126,8 +126,16 @@ ON CONFLICT DO NOTHING;
 -- Criar índices para melhor performance
 CREATE INDEX IF NOT EXISTS idx_agendamentos_profissional_data ON agendamentos(profissional_id, data_agendamento);
 CREATE INDEX IF NOT EXISTS idx_agendamentos_status ON agendamentos(status);
+-- Contagem do dashboard (GROUP BY profissional_id, status) por index-only scan
+CREATE INDEX IF NOT EXISTS idx_agendamentos_profissional_status ON agendamentos(profissional_id, status);
 CREATE INDEX IF NOT EXISTS idx_procedimentos_profissional ON procedimentos(profissional_id);
 CREATE INDEX IF NOT EXISTS idx_mensagens_whatsapp_data ON mensagens_whatsapp(criado_em);
+-- Índices seguintes (parciais/de cobertura) e o particionamento mensal de agendamentos
+-- estão em migrations/: rode python migrar.py
+
+-- A constraint que impede agendamentos confirmados sobrepostos (btree_gist + EXCLUDE)
+-- fica em migrations/000_restricao_sem_sobreposicao.sql: vale também para bancos
+-- criados por setup_db.py, que não executa este arquivo
 
 -- Views úteis
 CREATE OR REPLACE VIEW v_agendamentos_proximos AS
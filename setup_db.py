@@ -137,6 +137,12 @@ def main():
     # Criar tabelas
     if not criar_tabelas():
         sys.exit(1)
+
+    # Constraints e índices versionados (create_all não cria a constraint de sobreposição)
+    from migrar import aplicar_pendentes
+    print("\n🔄 Aplicando migrações...")
+    if not aplicar_pendentes():
+        sys.exit(1)
     
     # Inserir dados iniciais
     if not inserir_dados_iniciais():
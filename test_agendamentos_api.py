@@ -0,0 +1,110 @@
+"""
+Testes da listagem paginada GET /api/profissionais/<id>/agendamentos
+Execute: python -m pytest -q test_agendamentos_api.py
+
+Roda o app Flask (test client) sobre um SQLite temporário: nunca toca o DATABASE_URL do .env
+"""
+import os
+import tempfile
+from datetime import date, time
+
+import pytest
+
+CAMINHO_BANCO = os.path.join(tempfile.mkdtemp(prefix='agenda_teste_'), 'agenda.sqlite3')
+os.environ['DATABASE_URL'] = f'sqlite:///{CAMINHO_BANCO}'
+
+from database import Agendamento, Base, Procedimento, SessionLocal, engine  # noqa: E402
+
+PROFISSIONAL = 1
+TOTAL = 7                                  # três dias; dois agendamentos às 09:00 do dia 11
+
+
+@pytest.fixture(scope='module')
+def cliente():
+    Base.metadata.create_all(engine, tables=[Procedimento.__table__, Agendamento.__table__])
+    db = SessionLocal()
+    db.add(Procedimento(id=1, profissional_id=PROFISSIONAL, codigo='101', nome='Manicure'))
+    horarios = [
+        (date(2030, 3, 11), time(9, 0)), (date(2030, 3, 11), time(9, 0)), (date(2030, 3, 11), time(10, 0)),
+        (date(2030, 3, 12), time(9, 0)), (date(2030, 3, 12), time(14, 30)),
+        (date(2030, 3, 10), time(16, 0)), (date(2030, 3, 13), time(8, 0)),
+    ]
+    for i, (dia, hora) in enumerate(horarios, start=1):
+        db.add(Agendamento(
+            id=i, codigo_agendamento=f'AGTESTE{i}', profissional_id=PROFISSIONAL, procedimento_id=1,
+            cliente_nome=f'Cliente {i}', cliente_telefone='11999990000', data_agendamento=dia,
+            hora_inicio=hora, status='cancelado' if i == 5 else 'confirmado'
+        ))
+    # Outra profissional não aparece na listagem
+    db.add(Agendamento(
+        id=99, codigo_agendamento='AGTESTE99', profissional_id=2, procedimento_id=1, cliente_nome='Outra',
+        cliente_telefone='11999990000', data_agendamento=date(2030, 3, 11), hora_inicio=time(9, 0)
+    ))
+    db.commit()
+    db.close()
+
+    from app import app
+    yield app.test_client()
+    engine.dispose()
+
+
+def listar(cliente, **params):
+    resposta = cliente.get(f'/api/profissionais/{PROFISSIONAL}/agendamentos', query_string=params)
+    return resposta.status_code, resposta.get_json()
+
+
+def test_sem_limite_nem_cursor_mantem_o_formato_antigo(cliente):
+    status, corpo = listar(cliente)
+    assert status == 200
+    assert list(corpo) == ['agendamentos']
+    assert len(corpo['agendamentos']) == TOTAL
+
+
+def test_cursor_percorre_todas_as_paginas_em_ordem(cliente):
+    vistos, paginas, cursor = [], 0, None
+    while True:
+        params = {'limite': 3}
+        if cursor:
+            params['cursor'] = cursor
+        status, corpo = listar(cliente, **params)
+        assert status == 200
+        assert len(corpo['agendamentos']) <= 3
+        vistos += [a['id'] for a in corpo['agendamentos']]
+        paginas += 1
+        cursor = corpo['proximo_cursor']
+        if cursor is None:
+            break
+
+    # (data, hora, id): empate às 09:00 do dia 11 desempata pelo id, sem repetir nem pular
+    assert vistos == [6, 1, 2, 3, 4, 5, 7]
+    assert paginas == 3
+
+
+def test_proximo_cursor_so_quando_ha_mais_itens(cliente):
+    # LIMIT+1: com exatamente TOTAL itens na página não há próxima
+    _, corpo = listar(cliente, limite=TOTAL)
+    assert len(corpo['agendamentos']) == TOTAL
+    assert corpo['proximo_cursor'] is None
+
+    _, corpo = listar(cliente, limite=TOTAL - 1)
+    assert len(corpo['agendamentos']) == TOTAL - 1
+    assert corpo['proximo_cursor'] is not None
+    _, resto = listar(cliente, limite=TOTAL - 1, cursor=corpo['proximo_cursor'])
+    assert [a['id'] for a in resto['agendamentos']] == [7]
+    assert resto['proximo_cursor'] is None
+
+
+def test_filtros_valem_com_paginacao(cliente):
+    _, corpo = listar(cliente, data_inicio='11/03/2030', data_fim='12/03/2030', status='confirmado', limite=2)
+    assert [a['id'] for a in corpo['agendamentos']] == [1, 2]
+    _, resto = listar(cliente, data_inicio='11/03/2030', data_fim='12/03/2030', status='confirmado',
+                      limite=2, cursor=corpo['proximo_cursor'])
+    assert [a['id'] for a in resto['agendamentos']] == [3, 4]
+    assert resto['proximo_cursor'] is None
+
+
+@pytest.mark.parametrize('params', [{'cursor': 'nao-e-cursor'}, {'limite': 'abc'}, {'status': 'pendente'}])
+def test_parametros_invalidos_retornam_400(cliente, params):
+    status, corpo = listar(cliente, **params)
+    assert status == 400
+    assert 'erro' in corpo
@@ -0,0 +1,165 @@
+"""
+Testes unitários do cache (LRU em memória e SQLite compartilhado)
+Execute: python -m pytest -q test_cache.py
+"""
+from datetime import date
+
+import pytest
+
+import cache_manager
+from cache_manager import ACERTO, FALHA, CacheLRU, CacheSQLite, invalidar_agendamento, tag_dia
+
+
+class RelogioFalso:
+    """Substitui o módulo time dentro do cache_manager: o teste avança o tempo à mão"""
+
+    def __init__(self):
+        self.agora = 1_000_000.0
+
+    def monotonic(self):
+        return self.agora
+
+    def time(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = RelogioFalso()
+    monkeypatch.setattr(cache_manager, 'time', relogio)
+    return relogio
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def criar(request, tmp_path):
+    """Fábrica de cache do backend parametrizado"""
+    def criar(**kwargs):
+        kwargs.setdefault('nome', 'teste')
+        if request.param == 'sqlite':
+            return CacheSQLite(str(tmp_path / 'cache.sqlite3'), **kwargs)
+        return CacheLRU(**kwargs)
+    return criar
+
+
+def test_despeja_o_menos_usado_ao_passar_do_limite(relogio, criar, monkeypatch):
+    # O SQLite só varre o excedente a cada INTERVALO_VARREDURA_ESCRITAS gravações
+    monkeypatch.setattr(cache_manager, 'INTERVALO_VARREDURA_ESCRITAS', 1)
+    cache = criar(ttl_segundos=60, max_itens=2)
+    cache.definir('a', 1)
+    relogio.avancar(10)
+    cache.definir('b', 2)
+    relogio.avancar(10)
+    assert cache.obter('a') == 1          # 'a' passa a ser o mais recente
+    relogio.avancar(10)
+    cache.definir('c', 3)
+
+    assert cache.obter('b') is None
+    assert cache.obter('a') == 1
+    assert cache.obter('c') == 3
+    assert cache.estatisticas()['despejos'] == 1
+    assert cache.estatisticas()['itens'] == 2
+
+
+def test_expira_depois_do_ttl(relogio, criar):
+    cache = criar(ttl_segundos=60, max_itens=10)
+    cache.definir('a', 1)
+
+    relogio.avancar(59)
+    assert cache.obter('a') == 1
+    relogio.avancar(1)
+    assert cache.obter('a') is None
+    assert cache.estatisticas()['expiracoes'] == 1
+
+
+def test_entrada_vencida_fica_guardada_durante_a_graca(relogio, criar):
+    cache = criar(ttl_segundos=60, max_itens=10, graca_segundos=300)
+    cache.definir('a', 1)
+
+    relogio.avancar(61)
+    assert cache.obter('a') is None       # leitura normal não vê a entrada vencida
+    assert cache._consultar_vencido('a') == 1
+    relogio.avancar(300)
+    assert cache._consultar_vencido('a') is None
+
+
+def test_estatisticas_contam_uma_falha_por_consulta(relogio, criar):
+    cache = criar(ttl_segundos=60, max_itens=10)
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        return 'valor'
+
+    assert cache.obter_ou_calcular_com_estado('a', calcular) == ('valor', FALHA)
+    assert cache.obter_ou_calcular_com_estado('a', calcular) == ('valor', ACERTO)
+    assert cache.obter_ou_calcular_com_estado('a', calcular) == ('valor', ACERTO)
+
+    estatisticas = cache.estatisticas()
+    assert len(chamadas) == 1
+    assert estatisticas['falhas'] == 1
+    assert estatisticas['acertos'] == 2
+    assert estatisticas['taxa_acerto'] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_valor_none_nao_e_guardado(relogio, criar):
+    cache = criar(ttl_segundos=60, max_itens=10)
+    assert cache.obter_ou_calcular('a', lambda: None) is None
+    assert cache.obter_ou_calcular('a', lambda: 'depois') == 'depois'
+
+
+def test_invalidar_tag_remove_so_as_marcadas(relogio, criar):
+    cache = criar(ttl_segundos=60, max_itens=10)
+    cache.definir('a', 1, tags=['dia'])
+    cache.definir('b', 2, tags=['dia', 'mes'])
+    cache.definir('c', 3, tags=['mes'])
+
+    assert cache.invalidar_tag('dia') == 2
+    assert cache.obter('a') is None
+    assert cache.obter('b') is None
+    assert cache.obter('c') == 3
+
+
+def test_ttl_por_entrada_vale_so_para_ela(relogio, criar):
+    cache = criar(ttl_segundos=60, max_itens=10)
+    assert cache.definir_se_ausente('reserva', 'em_andamento', ttl=10)
+    assert not cache.definir_se_ausente('reserva', 'outra', ttl=10)
+    cache.definir('registro', 'concluido')
+
+    relogio.avancar(10)
+    assert cache.obter('reserva') is None
+    assert cache.definir_se_ausente('reserva', 'outra', ttl=10)
+    relogio.avancar(49)
+    assert cache.obter('registro') == 'concluido'
+
+
+def test_idempotencia_compartilhada_entre_workers():
+    assert isinstance(cache_manager.cache_idempotencia, CacheSQLite)
+
+
+def test_invalidacao_se_repete_apos_a_janela_da_replica(relogio, criar, monkeypatch):
+    cache = criar(ttl_segundos=60, max_itens=10)
+    monkeypatch.setattr(cache_manager, 'CACHES', [cache])
+    agendadas = []
+    monkeypatch.setattr(cache_manager, '_agendar_repeticao', lambda atraso, funcao: agendadas.append((atraso, funcao)))
+    dia = date(2030, 1, 15)
+
+    cache.definir('horarios', ['09:00'], tags=[tag_dia(1, dia)])
+    invalidar_agendamento(1, dia, repetir_apos=5)
+    assert cache.obter('horarios') is None
+
+    # Leitura da réplica atrasada devolve o estado antigo ao cache
+    cache.definir('horarios', ['09:00'], tags=[tag_dia(1, dia)])
+    assert [atraso for atraso, _ in agendadas] == [5]
+    agendadas[0][1]()
+    assert cache.obter('horarios') is None
+
+
+def test_sem_replica_a_invalidacao_nao_se_repete(relogio, criar, monkeypatch):
+    monkeypatch.setattr(cache_manager, 'CACHES', [criar(ttl_segundos=60, max_itens=10)])
+    agendadas = []
+    monkeypatch.setattr(cache_manager, '_agendar_repeticao', lambda atraso, funcao: agendadas.append(atraso))
+    invalidar_agendamento(1, date(2030, 1, 15))
+    assert agendadas == []
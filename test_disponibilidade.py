@@ -0,0 +1,85 @@
+"""
+Testes unitários do motor de horários disponíveis
+Execute: python -m pytest -q test_disponibilidade.py
+"""
+from datetime import time
+
+from disponibilidade import (
+    bloqueios_do_dia, cabe_no_dia, horarios_livres, mesclar_intervalos, para_minutos, para_time, rotulo
+)
+
+ABERTURA = 9 * 60        # 09:00
+FECHAMENTO = 18 * 60     # 18:00
+
+
+def m(hhmm: str) -> int:
+    """'10:30' -> minutos desde 00:00"""
+    horas, minutos = hhmm.split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+def rotulos(inicios):
+    return [rotulo(inicio) for inicio in inicios]
+
+
+def test_procedimento_longo_nao_sobrepoe_agendamento():
+    # Agendamento 10:00-11:30; procedimento de 90 min, sem intervalo entre clientes
+    livres = rotulos(horarios_livres(ABERTURA, m('13:00'), [(m('10:00'), m('11:30'))], duracao=90))
+    assert livres == ['11:30']
+    for inicio in ('09:00', '09:30', '10:00', '10:30', '11:00'):
+        assert not cabe_no_dia(ABERTURA, FECHAMENTO, [(m('10:00'), m('11:30'))], m(inicio), 90)
+
+
+def test_intervalo_entre_clientes_vale_antes_e_depois():
+    ocupados = [(m('10:00'), m('11:30'))]
+    livres = rotulos(horarios_livres(ABERTURA, m('13:00'), ocupados, duracao=30, intervalo_entre_clientes=10))
+    # 09:30-10:00 encostaria no início (faltam 10 min); 11:30 encostaria no fim: primeiro depois é 12:00
+    assert livres == ['09:00', '12:00', '12:30']
+
+    assert cabe_no_dia(ABERTURA, FECHAMENTO, ocupados, m('09:20'), 30, 10)
+    assert not cabe_no_dia(ABERTURA, FECHAMENTO, ocupados, m('09:21'), 30, 10)
+    assert cabe_no_dia(ABERTURA, FECHAMENTO, ocupados, m('11:40'), 30, 10)
+    assert not cabe_no_dia(ABERTURA, FECHAMENTO, ocupados, m('11:39'), 30, 10)
+
+
+def test_agendamento_de_90_minutos_com_intervalo_oferece_meio_dia():
+    livres = horarios_livres(ABERTURA, FECHAMENTO, [(m('10:00'), m('11:30'))], duracao=90,
+                             intervalo_entre_clientes=10)
+    assert rotulos(livres)[:2] == ['12:00', '12:30']
+
+
+def test_intervalos_sobrepostos_e_encostados_sao_mesclados():
+    assert mesclar_intervalos([(m('14:00'), m('15:00')), (m('09:00'), m('10:00')),
+                               (m('09:30'), m('10:30')), (m('10:30'), m('11:00'))]) == [
+        (m('09:00'), m('11:00')), (m('14:00'), m('15:00'))
+    ]
+    # Intervalo contido em outro não encurta o bloqueio
+    assert mesclar_intervalos([(m('09:00'), m('12:00')), (m('10:00'), m('11:00'))]) == [(m('09:00'), m('12:00'))]
+    # Com o buffer, atendimentos separados por menos de 2x o intervalo viram um bloqueio só
+    assert bloqueios_do_dia([(m('10:00'), m('11:00')), (m('11:15'), m('12:00'))], 10) == [
+        (m('09:50'), m('12:10'))
+    ]
+
+
+def test_procedimento_nao_passa_do_fechamento():
+    livres = rotulos(horarios_livres(ABERTURA, FECHAMENTO, [], duracao=60))
+    assert livres[-1] == '17:00'
+    assert '17:30' not in livres
+    assert cabe_no_dia(ABERTURA, FECHAMENTO, [], m('17:00'), 60)
+    assert not cabe_no_dia(ABERTURA, FECHAMENTO, [], m('17:30'), 60)
+    assert not cabe_no_dia(ABERTURA, FECHAMENTO, [], m('08:30'), 60)
+
+
+def test_a_partir_de_arredonda_para_a_grade():
+    livres = rotulos(horarios_livres(ABERTURA, m('12:00'), [], duracao=30, a_partir_de=m('10:01')))
+    assert livres == ['10:30', '11:00', '11:30']
+    # Já em cima da grade, mantém
+    assert rotulos(horarios_livres(ABERTURA, m('12:00'), [], duracao=30, a_partir_de=m('11:00'))) == ['11:00', '11:30']
+    # Antes da abertura não muda nada
+    assert rotulos(horarios_livres(ABERTURA, m('10:00'), [], duracao=30, a_partir_de=m('07:00'))) == ['09:00', '09:30']
+
+
+def test_conversoes():
+    assert para_minutos(time(13, 45)) == m('13:45')
+    assert para_time(m('08:05')) == time(8, 5)
+    assert rotulo(m('00:00')) == '00:00'
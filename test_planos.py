@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Testa os planos de execução das consultas quentes de agendamentos
+Execute: python test_planos.py [--linhas 100000]
+
+Semeia agendamentos sintéticos (código 'PLANO...', de profissionais sintéticas
+'PLANO n', removidos ao final) no DATABASE_URL local, captura o SQL que o
+AgendaManagerDB realmente envia e roda EXPLAIN (FORMAT JSON) em cada consulta.
+Falha se alguma fizer Seq Scan em agendamentos (sinal de índice ausente ou
+consulta que deixou de usá-lo), se o dashboard não usar o índice que a migração
+001 cria para ele ou, nas consultas por dia/mês, se o planejador não podar as
+partições mensais.
+Rode depois de python migrar.py. A verificação de poda só roda com a tabela
+particionada (migração manual 002, python migrar.py --incluir-manuais).
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente antes de importar o acesso ao banco
+load_dotenv()
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from agenda_manager_db import AgendaManagerDB
+from calendario import calendario
+from database import engine, sessao_requisicao
+from manutencao_particoes import PARTICOES_MESES_FUTUROS, criar_particoes_futuras, esta_particionada, somar_meses
+
+# A carga vai do mês atual até o último mês com partição criada pela manutenção: as
+# consultas por dia/mês caem numa partição mensal de verdade, não na padrão. Como as
+# profissionais são sintéticas, não há conflito com reservas reais.
+INICIO_CARGA = date.today().replace(day=1)
+FIM_CARGA = somar_meses(INICIO_CARGA, PARTICOES_MESES_FUTUROS + 1)
+HORARIOS_POR_DIA = 20   # 08:00 a 17:30, de 30 em 30 minutos
+DIAS_UTEIS = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo']
+
+
+class TestPlanos:
+    """Verifica que as consultas quentes usam índice"""
+
+    def __init__(self, linhas=100_000):
+        self.linhas = linhas
+        self.passed = 0
+        self.failed = 0
+        self.warnings = 0
+        self.particionada = False
+        self.start_time = time.time()
+
+    def print_header(self, msg):
+        print(f"\n{'='*60}")
+        print(f"  {msg}")
+        print(f"{'='*60}")
+
+    def test(self, descricao, condicao, detalhes=""):
+        """Registra resultado de teste"""
+        if condicao:
+            print(f"✅ {descricao}")
+            self.passed += 1
+        else:
+            print(f"❌ {descricao}")
+            if detalhes:
+                print(f"   {detalhes}")
+            self.failed += 1
+
+    def warning(self, descricao, condicao, detalhes=""):
+        """Registra warning"""
+        if condicao:
+            print(f"⚠️  {descricao}")
+            if detalhes:
+                print(f"   {detalhes}")
+            self.warnings += 1
+
+    # --------------------------------------------------------
+    # Carga sintética
+    # --------------------------------------------------------
+
+    @staticmethod
+    def remover_carga(conn):
+        conn.execute(text("DELETE FROM agendamentos WHERE codigo_agendamento LIKE 'PLANO%'"))
+        # procedimentos saem em cascata
+        conn.execute(text("DELETE FROM profissionais WHERE nome LIKE 'PLANO %'"))
+
+    def semear(self):
+        """Insere a carga (um horário de 30 min por linha, sem sobreposição) e atualiza estatísticas"""
+        self.print_header(f"🌱 Semeando {self.linhas} agendamentos sintéticos")
+        dias = (FIM_CARGA - INICIO_CARGA).days
+        # Profissionais suficientes para a carga caber na janela de partições mensais
+        qtd = -(-self.linhas // (dias * HORARIOS_POR_DIA))
+        with engine.begin() as conn:
+            self.particionada = esta_particionada(conn)
+            self.remover_carga(conn)
+            if self.particionada:
+                criar_particoes_futuras(conn, INICIO_CARGA)
+            else:
+                self.warning(
+                    "agendamentos não é particionada: verificações de poda de partições puladas", True,
+                    "Para particionar: python migrar.py --incluir-manuais"
+                )
+
+            pares = []
+            for n in range(1, qtd + 1):
+                prof = conn.execute(text(
+                    "INSERT INTO profissionais (nome, especialidade, dias_uteis) "
+                    "VALUES (:nome, 'Carga sintética', :dias) RETURNING id"
+                ), {'nome': f"PLANO {n}", 'dias': DIAS_UTEIS}).scalar()
+                proc = conn.execute(text(
+                    "INSERT INTO procedimentos (profissional_id, codigo, nome, duracao_minutos) "
+                    "VALUES (:prof, 'PLANO', 'Carga sintética', 30) RETURNING id"
+                ), {'prof': prof}).scalar()
+                pares.append((prof, proc))
+
+            # i = (dia * HORARIOS_POR_DIA + horario) * qtd + profissional: cada trio é único
+            conn.execute(text("""
+                INSERT INTO agendamentos (codigo_agendamento, profissional_id, procedimento_id, cliente_nome,
+                                          cliente_telefone, data_agendamento, hora_inicio, hora_fim, status)
+                SELECT 'PLANO' || i,
+                       (:profs)[1 + i % :qtd],
+                       (:procs)[1 + i % :qtd],
+                       'Carga ' || i,
+                       lpad((i % 5000)::text, 11, '0'),
+                       CAST(:inicio AS DATE) + i / (:qtd * :horarios),
+                       TIME '08:00' + ((i / :qtd) % :horarios) * INTERVAL '30 minutes',
+                       TIME '08:30' + ((i / :qtd) % :horarios) * INTERVAL '30 minutes',
+                       (ARRAY['confirmado', 'confirmado', 'concluido', 'cancelado'])[1 + (i / :qtd) % 4]
+                FROM generate_series(0, :n - 1) AS i
+            """), {
+                'profs': [p for p, _ in pares],
+                'procs': [proc for _, proc in pares],
+                'qtd': len(pares),
+                'horarios': HORARIOS_POR_DIA,
+                'inicio': INICIO_CARGA,
+                'n': self.linhas,
+            })
+
+        # VACUUM marca as páginas como visíveis (index-only scan) e não roda em transação
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text("VACUUM (ANALYZE) agendamentos"))
+        print(f"✅ {self.linhas} linhas inseridas para {len(pares)} profissionais")
+        return pares[0][0]
+
+    def limpar(self):
+        with engine.begin() as conn:
+            self.remover_carga(conn)
+        print("🧹 Carga sintética removida")
+
+    # --------------------------------------------------------
+    # Planos
+    # --------------------------------------------------------
+
+    @staticmethod
+    def capturar(funcao):
+        """Executa funcao() e devolve [(sql, parametros)] dos SELECTs enviados ao banco"""
+        capturadas = []
+
+        def ouvir(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'agendamentos' in statement:
+                capturadas.append((statement, parameters))
+
+        event.listen(Engine, 'before_cursor_execute', ouvir)
+        try:
+            funcao()
+        finally:
+            event.remove(Engine, 'before_cursor_execute', ouvir)
+        return capturadas
+
+    @staticmethod
+    def explicar(statement, parameters):
+        with engine.connect() as conn:
+            plano = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        return json.loads(plano) if isinstance(plano, str) else plano
+
+    @staticmethod
+    def indice_raiz(nome):
+        """Índice do pai particionado de que o índice da partição deriva (ele mesmo se não houver)"""
+        with engine.connect() as conn:
+            while True:
+                pai = conn.execute(text("""
+                    SELECT p.relname FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhparent
+                    WHERE i.inhrelid = to_regclass(:nome)
+                """), {'nome': nome}).scalar()
+                if pai is None:
+                    return nome
+                nome = pai
+
+    @staticmethod
+    def nos(plano):
+        """Percorre todos os nós do plano"""
+        pendentes = [plano[0]['Plan']]
+        while pendentes:
+            no = pendentes.pop()
+            yield no
+            pendentes.extend(no.get('Plans', []))
+
+    def verificar(self, descricao, funcao, indice=None, max_particoes=None):
+        """
+        Falha quando há Seq Scan em agendamentos
+
+        indice: índice que a consulta deve usar (nas partições, os derivados dele)
+        max_particoes: quantas partições de agendamentos a consulta pode tocar (poda);
+                       ignorado com a tabela não particionada
+        """
+        consultas = self.capturar(funcao)
+        if not consultas:
+            self.test(f"{descricao}: consulta capturada", False, "Nenhum SELECT em agendamentos foi executado")
+            return
+
+        for statement, parameters in consultas:
+            plano = self.explicar(statement, parameters)
+            sequenciais = [
+                no['Relation Name'] for no in self.nos(plano)
+                if no['Node Type'] == 'Seq Scan' and no.get('Relation Name', '').startswith('agendamentos')
+            ]
+            acessos = sorted({
+                f"{no['Node Type']} ({no.get('Index Name') or no.get('Relation Name')})"
+                for no in self.nos(plano) if 'Scan' in no['Node Type']
+            })
+            detalhes = ', '.join(acessos)
+            if indice is not None:
+                usados = {self.indice_raiz(no['Index Name']) for no in self.nos(plano) if 'Index Name' in no}
+                self.test(f"{descricao} usa {indice}", indice in usados, detalhes)
+            if max_particoes is not None and self.particionada:
+                particoes = {
+                    no['Relation Name'] for no in self.nos(plano)
+                    if no.get('Relation Name', '').startswith('agendamentos')
+                }
+                self.test(
+                    f"{descricao} toca no máximo {max_particoes} partição(ões)",
+                    len(particoes) <= max_particoes,
+                    ', '.join(sorted(particoes))
+                )
+            self.test(f"{descricao} sem Seq Scan", not sequenciais, detalhes)
+
+    @staticmethod
+    def _intervalos(agenda, prof_id, dia):
+        with sessao_requisicao(leitura=True) as db:
+            return agenda._intervalos_ocupados(db, prof_id, dia)
+
+    def run_all(self):
+        print("\n" + "="*60)
+        print("  🧪 Testes de Plano de Execução - Agenda App")
+        print("="*60)
+
+        agenda = AgendaManagerDB()
+        try:
+            prof_id = self.semear()
+            snapshot = calendario.obter()
+            dia = INICIO_CARGA.replace(day=15)
+
+            self.print_header("🔍 Consultas Quentes")
+            self.verificar(
+                "Intervalos ocupados do dia (horários livres e reserva)",
+                lambda: self._intervalos(agenda, prof_id, dia),
+                max_particoes=1
+            )
+            self.verificar(
+                "Mapa de calor do mês",
+                lambda: agenda._calcular_disponibilidade_mes(snapshot, prof_id, dia.month, dia.year),
+                max_particoes=1
+            )
+            primeira = {}
+            self.verificar(
+                "Listagem paginada (primeira página)",
+                lambda: primeira.update(agenda.obter_agendamentos_profissional(prof_id, limite=50))
+            )
+            self.verificar(
+                "Listagem paginada (página seguinte, por cursor)",
+                lambda: agenda.obter_agendamentos_profissional(prof_id, limite=50, cursor=primeira['proximo_cursor'])
+            )
+            self.verificar(
+                "Listagem de um período",
+                lambda: agenda.obter_agendamentos_profissional(prof_id, data_inicio=dia, data_fim=dia),
+                max_particoes=1
+            )
+            self.verificar("Dashboard", agenda.obter_dashboard, indice='idx_agendamentos_profissional_status')
+        except KeyboardInterrupt:
+            print("\n\n⚠️  Testes interrompidos")
+            return
+        finally:
+            self.limpar()
+
+        # Resumo
+        tempo_total = time.time() - self.start_time
+        self.print_header("📊 Resumo de Testes")
+        print(f"✅ Passaram: {self.passed}")
+        print(f"❌ Falharam: {self.failed}")
+        print(f"⚠️  Warnings: {self.warnings}")
+        print(f"⏱️  Tempo Total: {tempo_total:.1f}s")
+        print("\n" + "="*60 + "\n")
+
+        if self.failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN das consultas quentes")
+    parser.add_argument('--linhas', type=int, default=100_000, help='Agendamentos sintéticos a semear')
+    args = parser.parse_args()
+    TestPlanos(args.linhas).run_all()
@@ -0,0 +1,191 @@
+"""
+Testes unitários do retry e do circuit breaker do banco
+Execute: python -m pytest -q test_resiliencia.py
+"""
+import pytest
+from sqlalchemy import exc
+
+import resiliencia
+from resiliencia import BancoIndisponivel, Disjuntor, com_retry, eh_transitorio, executar_com_retry, iniciar_prazo
+
+
+class RelogioFalso:
+    """Substitui o módulo time dentro do resiliencia: sleep só avança o relógio"""
+
+    def __init__(self):
+        self.agora = 1_000.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.agora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.agora += segundos
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+
+class ErroDriver(Exception):
+    """Exceção do driver com SQLSTATE, como as do psycopg2"""
+
+    def __init__(self, pgcode=None):
+        super().__init__(f"erro {pgcode}")
+        self.pgcode = pgcode
+
+
+def erro_banco(classe=exc.OperationalError, pgcode=None, **kwargs):
+    return classe('SELECT 1', {}, ErroDriver(pgcode), **kwargs)
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = RelogioFalso()
+    monkeypatch.setattr(resiliencia, 'time', relogio)
+    return relogio
+
+
+@pytest.fixture
+def disjuntor(monkeypatch, relogio):
+    """Disjuntor novo no lugar da instância do processo; prazo da requisição zerado"""
+    novo = Disjuntor(falhas_para_abrir=2, resfriamento=10)
+    monkeypatch.setattr(resiliencia, 'disjuntor', novo)
+    iniciar_prazo(None)
+    yield novo
+    iniciar_prazo(None)
+
+
+# ============================================================
+# CLASSIFICAÇÃO
+# ============================================================
+
+@pytest.mark.parametrize('erro, esperado', [
+    (exc.TimeoutError('pool esgotado'), False),
+    (erro_banco(pgcode='40001'), True),
+    (erro_banco(pgcode='40P01'), True),
+    (erro_banco(pgcode='57P03'), True),
+    (erro_banco(pgcode='08006'), True),
+    (erro_banco(pgcode='08001'), True),
+    (erro_banco(), True),
+    (erro_banco(exc.IntegrityError, pgcode='23505'), False),
+    (erro_banco(exc.IntegrityError, pgcode='23P01'), False),
+    (erro_banco(exc.ProgrammingError, pgcode='42P01'), False),
+    (erro_banco(exc.ProgrammingError, pgcode='42P01', connection_invalidated=True), True),
+    (exc.DisconnectionError(), True),
+    (ValueError('data inválida'), False),
+])
+def test_eh_transitorio(erro, esperado):
+    assert eh_transitorio(erro) is esperado
+
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+
+def test_disjuntor_abre_testa_e_fecha(relogio, disjuntor):
+    assert disjuntor.estado == Disjuntor.FECHADO
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == Disjuntor.FECHADO
+
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == Disjuntor.ABERTO
+    with pytest.raises(BancoIndisponivel) as erro:
+        disjuntor.permitir()
+    assert erro.value.retry_after == 11
+
+    relogio.avancar(10)
+    assert disjuntor.estado == Disjuntor.MEIO_ABERTO
+    disjuntor.permitir()                   # a única vaga de teste
+    with pytest.raises(BancoIndisponivel):
+        disjuntor.permitir()
+
+    disjuntor.registrar_sucesso()
+    assert disjuntor.estado == Disjuntor.FECHADO
+    disjuntor.permitir()
+    assert disjuntor.estatisticas()['aberturas'] == 1
+    assert disjuntor.estatisticas()['rejeicoes'] == 2
+
+
+def test_disjuntor_reabre_se_o_teste_falha(relogio, disjuntor):
+    disjuntor.registrar_falha()
+    disjuntor.registrar_falha()
+    relogio.avancar(10)
+    disjuntor.permitir()
+
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == Disjuntor.ABERTO
+    relogio.avancar(9)
+    with pytest.raises(BancoIndisponivel):
+        disjuntor.permitir()
+
+
+def test_retry_aninhado_usa_uma_vaga_de_teste(relogio, disjuntor):
+    disjuntor.registrar_falha()
+    disjuntor.registrar_falha()
+    relogio.avancar(10)
+
+    @com_retry
+    def interna():
+        return 'ok'
+
+    @com_retry
+    def externa():
+        return interna()
+
+    assert externa() == 'ok'
+    assert disjuntor.estado == Disjuntor.FECHADO
+
+
+def test_erro_permanente_do_banco_nao_conta_como_falha(relogio, disjuntor):
+    def violar():
+        raise erro_banco(exc.IntegrityError, pgcode='23505')
+
+    for _ in range(3):
+        with pytest.raises(exc.IntegrityError):
+            executar_com_retry(violar)
+    assert disjuntor.estado == Disjuntor.FECHADO
+
+
+# ============================================================
+# RETRY COM PRAZO
+# ============================================================
+
+def test_repete_falha_transitoria_ate_conseguir(relogio, disjuntor, monkeypatch):
+    monkeypatch.setattr(resiliencia, 'espera_backoff', lambda tentativa: 0.1)
+    disjuntor.falhas_para_abrir = 5
+    tentativas = []
+
+    def instavel():
+        tentativas.append(1)
+        if len(tentativas) < 3:
+            raise erro_banco(pgcode='40001')
+        return 'ok'
+
+    assert executar_com_retry(instavel) == 'ok'
+    assert len(tentativas) == 3
+    assert relogio.esperas == [0.1, 0.1]
+
+
+def test_backoff_nao_passa_do_prazo(relogio, disjuntor, monkeypatch):
+    monkeypatch.setattr(resiliencia, 'espera_backoff', lambda tentativa: 0.5)
+    disjuntor.falhas_para_abrir = 5
+    iniciar_prazo(0.7)
+    tentativas = []
+
+    def fora():
+        tentativas.append(1)
+        raise erro_banco(pgcode='08006')
+
+    with pytest.raises(exc.OperationalError):
+        executar_com_retry(fora, max_tentativas=5)
+    # Primeira espera cabe (0.5 < 0.7); a segunda estouraria o prazo e não acontece
+    assert len(tentativas) == 2
+    assert relogio.esperas == [0.5]
+
+
+def test_espera_backoff_respeita_o_teto():
+    for tentativa in range(10):
+        espera = resiliencia.espera_backoff(tentativa)
+        limite = min(resiliencia.BACKOFF_TETO_SEGUNDOS, resiliencia.BACKOFF_BASE_SEGUNDOS * 2 ** tentativa)
+        assert 0 <= espera <= limite
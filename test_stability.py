@@ -2,6 +2,9 @@
 """
 Script de teste para validar correções de estabilidade
 Execute: python test_stability.py
+
+Usa o servidor em BASE_URL; o teste do modo degradado do cache roda no próprio
+processo (test client do Flask) com o DATABASE_URL do .env
 """
 
 import requests
@@ -137,9 +140,79 @@ class CoreTestStability:
                 response1.json() == response2.json()
             )
             
+            self.cache_com_banco_fora()
+            
         except Exception as e:
             self.test("Cache funcionando", False, str(e))
     
+    def cache_com_banco_fora(self):
+        """
+        Modo degradado com o circuito do banco aberto (stale-if-error)
+        
+        Roda no próprio processo com o test client do Flask: o circuito de um servidor
+        remoto não pode ser aberto daqui. O relógio do cache é adiantado para vencer a
+        entrada (dentro da graça) e depois para passar da graça.
+        """
+        import cache_manager
+        from app import app
+        from cache_manager import cache_profissionais
+        from monitor_banco import monitor_banco
+        from resiliencia import disjuntor
+        
+        class RelogioAdiantado:
+            """Substitui o módulo time dentro do cache_manager"""
+            deslocamento = 0
+            
+            def time(self):
+                return time.time() + self.deslocamento
+            
+            def monotonic(self):
+                return time.monotonic() + self.deslocamento
+            
+            def __getattr__(self, nome):
+                return getattr(time, nome)
+        
+        relogio = RelogioAdiantado()
+        cliente = app.test_client()
+        # O monitor fecharia o circuito na próxima verificação bem-sucedida; os testes
+        # seguintes usam o servidor via HTTP e não dependem dele neste processo
+        monitor_banco.parar()
+        try:
+            cache_profissionais.limpar('lista_profissionais')
+            resposta = cliente.get('/api/profissionais')
+            self.test(
+                "Banco no ar: resposta calculada e guardada no cache",
+                resposta.status_code == 200,
+                f"Status: {resposta.status_code}"
+            )
+            
+            cache_manager.time = relogio
+            for _ in range(disjuntor.falhas_para_abrir):
+                disjuntor.registrar_falha()
+            
+            relogio.deslocamento = cache_profissionais.ttl + 1
+            resposta = cliente.get('/api/profissionais')
+            self.test(
+                "Circuito aberto e entrada vencida dentro da graça: 200 com X-Cache: STALE",
+                resposta.status_code == 200 and resposta.headers.get('X-Cache') == 'STALE',
+                f"Status: {resposta.status_code}, X-Cache: {resposta.headers.get('X-Cache')}"
+            )
+            self.test(
+                "Cópia vencida não fica em caches HTTP (Cache-Control: no-store)",
+                resposta.headers.get('Cache-Control') == 'no-store'
+            )
+            
+            relogio.deslocamento = cache_profissionais.ttl + cache_profissionais.graca + 1
+            resposta = cliente.get('/api/profissionais')
+            self.test(
+                "Circuito aberto e entrada além da graça: 503 com Retry-After",
+                resposta.status_code == 503 and 'Retry-After' in resposta.headers,
+                f"Status: {resposta.status_code}"
+            )
+        finally:
+            cache_manager.time = time
+            disjuntor.registrar_sucesso()
+    
     def test_error_handling(self):
         """Testa tratamento de erro"""
         self.print_header("4️⃣ Tratamento de Erro")